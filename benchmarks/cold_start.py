@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+"""Measures the cold start of a console process: importing models,
+then counting the Places and showing one, which loads the store, with
+the JSON file read in full and with it mapped in memory with its
+offset index (HBNB_FILE_MAPPED=1).
+
+Usage: ./benchmarks/cold_start.py [number of objects ...]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+from reload_memory import make_store  # noqa: E402
+
+
+def child():
+    """Starts like the console, then counts the Places and shows the
+    last one, and prints the seconds each step took."""
+    start = time.perf_counter()
+    from models import storage
+    loaded = time.perf_counter()
+    count = storage.count("Place")
+    place = storage.get("Place", "{:036d}".format(count - 1))
+    assert place is not None
+    print(count, loaded - start, time.perf_counter() - loaded)
+
+
+def run(tmp, mapped):
+    """Returns the output of a child process and its wall-clock time."""
+    env = dict(os.environ, HBNB_FILE_MAPPED="1" if mapped else "0")
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, __file__, "--child"], cwd=tmp,
+                         env=env, check=True, capture_output=True,
+                         text=True)
+    return out.stdout.split(), time.perf_counter() - start
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]]
+    counts = counts or [10000, 1000000, 10000000]
+    for count in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            make_store(os.path.join(tmp, "file.json"), count)
+            # a first mapped start reads the file and writes its index
+            subprocess.run([sys.executable, "-c",
+                            "from models import storage; storage.save()"],
+                           cwd=tmp, check=True, env=dict(
+                               os.environ, HBNB_FILE_MAPPED="1",
+                               PYTHONPATH=sys.path[0]))
+            print("{} objects, {:.1f} MiB on disk".format(
+                count, os.path.getsize(os.path.join(tmp, "file.json")) /
+                2 ** 20))
+            for mapped in (False, True):
+                (found, load, query), wall = run(tmp, mapped)
+                assert int(found) == count
+                print("{:>8}: import {:.3f} s, count and show {:.3f} s, "
+                      "process {:.3f} s".format(
+                          "mapped" if mapped else "read", float(load),
+                          float(query), wall))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--child"]:
+        child()
+    else:
+        main()
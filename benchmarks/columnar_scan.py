@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+"""Compares the average price_by_night of every Place computed over
+the objects of a JSON file and over the columns of a columnar
+snapshot, memory-mapped and scanned without building the objects.
+
+Usage: ./benchmarks/columnar_scan.py [number of objects]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+from reload_memory import make_store  # noqa: E402
+from models.engine.file_storage import FileStorage  # noqa: E402
+from models.engine.query import Query  # noqa: E402
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    query = Query.parse("Place", '().avg("price_by_night")')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "store.json")
+        make_store(path, count)
+        print("{} objects".format(count))
+        for name, options in (("json", {}),
+                              ("json lazy", {"lazy": True}),
+                              ("columnar", {"lazy": True,
+                                            "format": "columnar"})):
+            storage = FileStorage(path=path, **options)
+            if name == "columnar":
+                storage.reload()
+                storage.convert("columnar")
+            storage.reload()
+            start = time.perf_counter()
+            average = query.run(storage)
+            scan = time.perf_counter() - start
+            start = time.perf_counter()
+            average = query.run(storage)
+            again = time.perf_counter() - start
+            print("{:>10}: avg {:.2f}, first {:.3f} s, then {:.3f} s".format(
+                name, average, scan, again))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+"""Replays a command script through the console's argument parsing,
+without running the commands, with the shlex-based parse_line() and
+default() dispatch the console used to have and with the current
+ones.
+
+Usage: ./benchmarks/console_parse.py [number of lines]
+"""
+import os
+import random
+import re
+import sys
+import time
+from shlex import split
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+from console import HBNBCommand, parse_call, parse_line  # noqa: E402
+
+
+def legacy_parse_line(line):
+    """The former parse_line()."""
+    curly_braces = re.search(r"\{(.*?)\}", line)
+    sq_brkts = re.search(r"\[(.*?)\]", line)
+    if curly_braces is None:
+        if sq_brkts is None:
+            return [i.strip(",") for i in split(line)]
+        else:
+            tokens = split(line[:sq_brkts.span()[0]])
+            item = [i.strip(",") for i in tokens]
+            item.append(sq_brkts.group())
+            return item
+    else:
+        tokens = split(line[:curly_braces.span()[0]])
+        item = [i.strip(",") for i in tokens]
+        item.append(curly_braces.group())
+        return item
+
+
+def legacy_default(line):
+    """The parsing done by the former default(), followed by
+    parse_line() of the arguments it dispatches."""
+    argdict = {
+        "all": None,
+        "show": None,
+        "destroy": None,
+        "count": None,
+        "update": None
+    }
+    match = re.search(r"\.", line)
+    if match is not None:
+        argl = [line[:match.span()[0]], line[match.span()[1]:]]
+        match = re.search(r"\((.*?)\)", argl[1])
+        if match is not None:
+            command = [argl[1][:match.span()[0]], match.group()[1:-1]]
+            if command[0] in argdict.keys():
+                call = "{} {}".format(argl[0], command[1])
+                return legacy_parse_line(call)
+    return None
+
+
+def current_default(line):
+    """The parsing done by default(), followed by parse_line() of
+    the arguments it dispatches."""
+    call = parse_call(line)
+    if call is None:
+        return None
+    return parse_line("{} {}".format(call[0], call[2]))
+
+
+def make_script(count):
+    """Returns count lines of plain and dot-syntax commands on a
+    thousand ids."""
+    rng = random.Random(0)
+    ids = ["{:08x}-0000-4000-8000-{:012x}".format(i, i) for i in range(1000)]
+    shapes = [
+        'show User {}',
+        'User.show("{}")',
+        'update User {} first_name "Betty Holberton"',
+        'User.update("{}", "age", 89)',
+        'User.update("{}", {{"first_name": "Betty", "age": 89}})',
+        'Place.update("{}", "amenity_ids", ["a", "b"])',
+        'count Place',
+        'Place.count()',
+        'all City',
+        'destroy Review {}'
+    ]
+    return [rng.choice(shapes).format(rng.choice(ids))
+            for i in range(count)]
+
+
+def replay(lines, default, parse):
+    """Returns the seconds taken to parse every line."""
+    console = HBNBCommand()
+    start = time.perf_counter()
+    for line in lines:
+        command, args, line = console.parseline(line)
+        if hasattr(console, "do_" + command):
+            parse(args)
+        else:
+            default(line)
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    lines = make_script(count)
+    before = replay(lines, legacy_default, legacy_parse_line)
+    after = replay(lines, current_default, parse_line)
+    print("{} lines".format(count))
+    for name, seconds in (("before", before), ("after", after)):
+        print("{:>8}: {:.2f} s, {:.2f} us per line".format(
+            name, seconds, seconds / count * 1e6))
+    print("{:.1f}x faster".format(before / after))
+
+
+if __name__ == "__main__":
+    main()
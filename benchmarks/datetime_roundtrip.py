@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+"""Times 1M datetime round trips through isoformat() and back with
+datetime.strptime() against datetime.fromisoformat(), and 1M
+BaseModel.to_dict() / BaseModel(**kwargs) round trips.
+
+Usage: ./benchmarks/datetime_roundtrip.py [number of round trips]
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+from models.base_model import BaseModel  # noqa: E402
+
+DATE_FMT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+def timed(name, func, count):
+    start = time.perf_counter()
+    func(count)
+    seconds = time.perf_counter() - start
+    print("{:>14}: {:.2f} s, {:.2f} us per round trip".format(
+        name, seconds, seconds / count * 1e6))
+
+
+def strptime(count):
+    dt = datetime.now()
+    for _ in range(count):
+        datetime.strptime(dt.isoformat(), DATE_FMT)
+
+
+def fromisoformat(count):
+    dt = datetime.now()
+    for _ in range(count):
+        datetime.fromisoformat(dt.isoformat())
+
+
+def model(count):
+    kwargs = BaseModel().to_dict()
+    for _ in range(count):
+        BaseModel(**kwargs).to_dict()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    timed("strptime", strptime, count)
+    timed("fromisoformat", fromisoformat, count)
+    timed("BaseModel", model, count)
+
+
+if __name__ == "__main__":
+    main()
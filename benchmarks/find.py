@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+"""Times FileStorage.find() on an indexed foreign key against a scan
+of every object.
+
+Usage: ./benchmarks/find.py [number of reviews]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+from models import storage  # noqa: E402
+from models.review import Review  # noqa: E402
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    for i in range(count):
+        Review().place_id = "place-{}".format(i % 50000)
+
+    def scan():
+        return [obj for obj in storage.all().values()
+                if getattr(obj, "place_id", None) == "place-42"]
+
+    def find():
+        return storage.find(Review, place_id="place-42")
+
+    assert len(scan()) == len(find())
+    for name, func, number in (("scan", scan, 3), ("find", find, 1000)):
+        seconds = timeit.timeit(func, number=number) / number
+        print("{:>5}: {:.3f} ms per lookup over {} objects".format(
+            name, seconds * 1000, storage.count()))
+
+
+if __name__ == "__main__":
+    main()
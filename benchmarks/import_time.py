@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+"""Measures the import of the models package in a new process, which
+no longer reads the store, against the store sizes: then the time
+models.init(eager=True) takes to load it, as the import used to.
+
+Usage: ./benchmarks/import_time.py [number of objects ...]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+from reload_memory import make_store  # noqa: E402
+
+
+def child():
+    """Imports models then loads the store, and prints the seconds
+    each step took."""
+    start = time.perf_counter()
+    import models
+    imported = time.perf_counter()
+    models.init(eager=True)
+    print(imported - start, time.perf_counter() - imported)
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [0, 10000, 1000000]
+    for count in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            if count:
+                make_store(os.path.join(tmp, "file.json"), count)
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, __file__, "--child"],
+                                 cwd=tmp, check=True, capture_output=True,
+                                 text=True)
+            wall = time.perf_counter() - start
+            imported, loaded = map(float, out.stdout.split())
+            print("{:>8} objects: import {:.3f} s, eager load {:.3f} s, "
+                  "process {:.3f} s".format(count, imported, loaded, wall))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--child"]:
+        child()
+    else:
+        main()
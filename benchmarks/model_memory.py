@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+"""Compares the memory held by Places and Reviews built as regular
+instances against compact(), slots-backed ones.
+
+Usage: ./benchmarks/model_memory.py [number of objects]
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+from models.base_model import compact  # noqa: E402
+from models.place import Place  # noqa: E402
+from models.review import Review  # noqa: E402
+
+
+def build(cls, variant, count):
+    """Returns count instances of variant, a regular or compact cls,
+    with every class attribute of cls set, built the way reload() does."""
+    objects = []
+    for i in range(count):
+        kwargs = {"id": "{:036d}".format(i),
+                  "created_at": "2023-01-01T00:00:00.000001",
+                  "updated_at": "2023-01-01T00:00:00.000001",
+                  "__class__": cls.__name__}
+        for name, value in vars(cls).items():
+            if not name.startswith("_"):
+                kwargs[name] = value
+        obj = variant(**kwargs)
+        obj.to_dict()
+        objects.append(obj)
+    return objects
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    for cls in (Place, Review):
+        for variant in (cls, compact(cls)):
+            tracemalloc.start()
+            objects = build(cls, variant, count)
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print("{:>8} {:>7}: {:.1f} MiB, {:.0f} bytes per object".format(
+                cls.__name__, "compact" if variant is not cls else "regular",
+                size / 2 ** 20, size / count))
+            del objects
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+"""Compares the wall-clock startup of a process that reloads a large
+JSON file with FileStorage(workers=n), for 1, 4 and 8 workers.
+
+Usage: ./benchmarks/parallel_reload.py [number of objects]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+from reload_memory import make_store  # noqa: E402
+
+
+def child(workers, path):
+    """Reloads path in this process and prints the seconds taken."""
+    from models.engine.file_storage import FileStorage
+
+    storage = FileStorage(path=path, workers=workers)
+    start = time.perf_counter()
+    storage.reload()
+    seconds = time.perf_counter() - start
+    print(storage.count(), seconds)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print("{} cores available".format(os.cpu_count()))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "store.json")
+        make_store(path, count)
+        print("{} objects, {:.1f} MiB on disk".format(
+            count, os.path.getsize(path) / 2 ** 20))
+        for workers in (1, 4, 8):
+            start = time.perf_counter()
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", str(workers), path],
+                cwd=tmp, check=True, capture_output=True, text=True)
+            startup = time.perf_counter() - start
+            loaded, seconds = out.stdout.split()
+            print("{:>2} workers: {} objects, reload {:.2f} s, "
+                  "startup {:.2f} s".format(workers, loaded,
+                                            float(seconds), startup))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        child(int(sys.argv[2]), sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+"""Compares peak RSS of FileStorage.reload() against a json.load()
+of the whole file followed by building every object.
+
+Usage: ./benchmarks/reload_memory.py [number of objects]
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+
+def make_store(path, count):
+    """Writes count Places to path the way FileStorage.save() does."""
+    with open(path, "w") as f:
+        f.write("{\n")
+        for i in range(count):
+            key = "Place.{:036d}".format(i)
+            value = {"id": key[6:], "created_at": "2023-01-01T00:00:00.000001",
+                     "updated_at": "2023-01-01T00:00:00.000001",
+                     "name": "place {}".format(i), "city_id": "c",
+                     "user_id": "u", "price_by_night": i % 300,
+                     "__class__": "Place"}
+            f.write("{}: {}{}\n".format(json.dumps(key), json.dumps(value),
+                                        "," if i < count - 1 else ""))
+        f.write("}\n")
+
+
+def child(mode, path):
+    """Loads path in this process and prints the peak RSS in KiB."""
+    from models.engine.file_storage import FileStorage
+    from models.place import Place
+
+    if mode == "json.load":
+        with open(path, "r") as f:
+            data = json.load(f)
+        objects = {k: Place(**v) for k, v in data.items()}
+    else:
+        storage = FileStorage(path=path)
+        storage.reload()
+        objects = storage.all()
+    print(len(objects), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "store.json")
+        make_store(path, count)
+        print("{} objects, {:.1f} MiB on disk".format(
+            count, os.path.getsize(path) / 2 ** 20))
+        for mode in ("json.load", "stream"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", mode, path],
+                cwd=tmp, check=True, capture_output=True, text=True)
+            loaded, rss = out.stdout.split()
+            print("{:>10}: {} objects, peak RSS {:.1f} MiB".format(
+                mode, loaded, int(rss) / 1024))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+"""Compares the size on disk, the save() time and the reload() time of
+FileStorage in JSON and in each format of SERIALIZERS.
+
+Usage: ./benchmarks/serializers.py [number of objects]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+from reload_memory import make_store  # noqa: E402
+from models.engine.file_storage import FileStorage  # noqa: E402
+from models.engine.serializers import SERIALIZERS  # noqa: E402
+
+
+def timed(function):
+    """Returns the seconds taken by function()."""
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "store.json")
+        make_store(path, count)
+        print("{} objects".format(count))
+        for fmt in ["json"] + list(SERIALIZERS):
+            storage = FileStorage(path=path, format=fmt)
+            storage.reload()
+            # a full rewrite, without the JSON fragments of a previous save
+            storage._FileStorage__fragments.clear()
+            save = timed(storage.compact)
+            size = os.path.getsize(path)
+            reload = timed(storage.reload)
+            assert storage.count() == count
+            print("{:>8}: {:6.1f} MiB, save {:.2f} s, reload {:.2f} s".format(
+                fmt, size / 2 ** 20, save, reload))
+
+
+if __name__ == "__main__":
+    main()
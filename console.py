@@ -3,51 +3,148 @@
    for the HBNB console.
 """
 import cmd
+import csv
+import json
 import sys
 import os
 import re
-from shlex import split
+import time
+from ast import literal_eval
+from copy import deepcopy
+from itertools import islice
+from functools import lru_cache
 from models import storage
-from models.base_model import BaseModel
-from models.user import User
-from models.state import State
-from models.city import City
-from models.amenity import Amenity
-from models.place import Place
-from models.review import Review
+from models.engine.query import Query
+from models.engine.serializers import SERIALIZERS
+from models.base_model import registry
 
 
+_WORD = re.compile(r"""(?:[^\s"'\\]+|\\.|"(?:[^"\\]|\\.)*"|'[^']*')+|(\S)""",
+                   re.DOTALL)
+_QUOTED = re.compile(r"""\\(.)|"((?:[^"\\]|\\.)*)"|'([^']*)'""", re.DOTALL)
+_ESCAPED = re.compile(r'\\([\\"])')
+_TRAILER = re.compile(r"\{.*?\}|\[.*?\]")
+_CALL = re.compile(r"([^.]*)\.(\w+)(\((.*?)\).*)", re.DOTALL)
+
+
+def _unquote(match):
+    """Returns the text of a quoted or escaped part of a word."""
+    if match.group(1) is not None:
+        return match.group(1)
+    if match.group(2) is not None:
+        return _ESCAPED.sub(r"\1", match.group(2))
+    return match.group(3)
+
+
+def split_words(line):
+    """Splits line into words the way shlex.split() does, in a single
+       pass of a precompiled pattern.
+       Raises ValueError on an unclosed quotation."""
+    words = []
+    for match in _WORD.finditer(line):
+        if match.group(1) is not None:
+            raise ValueError("No closing quotation")
+        word = match.group()
+        if '"' in word or "'" in word or "\\" in word:
+            word = _QUOTED.sub(_unquote, word)
+        words.append(word)
+    return words
+
+
+@lru_cache(maxsize=4096)
 def parse_line(line):
-    curly_braces = re.search(r"\{(.*?)\}", line)
-    sq_brkts = re.search(r"\[(.*?)\]", line)
-    if curly_braces is None:
-        if sq_brkts is None:
-            return [i.strip(",") for i in split(line)]
-        else:
-            tokens = split(line[:sq_brkts.span()[0]])
-            item = [i.strip(",") for i in tokens]
-            item.append(sq_brkts.group())
-            return item
+    """Returns the words of the arguments of a command, without their
+       trailing commas, followed by the first {dictionary} or [list]
+       of the line, if any, as it was written. The words of recent
+       lines are cached."""
+    trailer = _TRAILER.search(line)
+    if trailer is None:
+        return tuple(i.strip(",") for i in split_words(line))
+    return tuple(i.strip(",") for i in split_words(line[:trailer.start()])) \
+        + (trailer.group(),)
+
+
+@lru_cache(maxsize=4096)
+def parse_call(line):
+    """Returns the (class, method, arguments) of a <class>.<method>(...)
+       line, or None. The arguments of where are the whole chain after
+       the class, those of other methods what is between the first
+       parentheses. The shapes of recent lines are cached."""
+    match = _CALL.match(line)
+    if match is None:
+        return None
+    cls_name, method, chain, args = match.groups()
+    return cls_name, method, chain if method == "where" else args
+
+
+@lru_cache(maxsize=1024)
+def _literal(text):
+    """Returns the value of a JSON or Python literal."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return literal_eval(text)
+    except (ValueError, TypeError, SyntaxError, MemoryError,
+            RecursionError):
+        raise ValueError("not a literal: {}".format(text)) from None
+
+
+def parse_literal(text):
+    """Returns the value of a JSON or Python literal without running
+       any code, reusing the parse of recent texts. Lists and
+       dictionaries are copied so values are never shared.
+       Raises ValueError if text is not a literal."""
+    value = _literal(text)
+    if type(value) is dict:
+        return {k: deepcopy(v) if type(v) in (list, dict) else v
+                for k, v in value.items()}
+    if type(value) is list:
+        return deepcopy(value)
+    return value
+
+
+def read_records(f, fmt):
+    """Yields the attribute dictionaries of a JSON Lines or CSV file,
+       one line at a time."""
+    if fmt == "csv":
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if type(record) is not dict:
+                    raise ValueError("record is not an object: {}".format(
+                        line.strip()))
+                yield record
+
+
+def write_records(f, records, fmt, fields=None):
+    """Writes dictionaries to f as JSON Lines or CSV, one line at a
+       time, keeping only fields when given. CSV columns are fields,
+       which is then required, and lists are written as JSON."""
+    if fmt == "csv":
+        writer = csv.DictWriter(f, fields, extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            writer.writerow({name: json.dumps(value)
+                             if type(value) in (list, dict) else value
+                             for name, value in record.items()})
     else:
-        tokens = split(line[:curly_braces.span()[0]])
-        item = [i.strip(",") for i in tokens]
-        item.append(curly_braces.group())
-        return item
+        for record in records:
+            if fields is not None:
+                record = {name: record[name]
+                          for name in fields if name in record}
+            f.write(json.dumps(record) + "\n")
 
 
 class HBNBCommand(cmd.Cmd):
     """Represents the HBNB console."""
 
     prompt = "(hbnb) "
-    __classes = {
-        "BaseModel",
-        "User",
-        "State",
-        "City",
-        "Amenity",
-        "Place",
-        "Review"
-    }
+    __classes = registry
+    __methods = ("all", "show", "destroy", "count", "update", "where")
 
     def emptyline(self):
         """Skips to the prompt when an empty line is encountered."""
@@ -57,22 +154,10 @@ class HBNBCommand(cmd.Cmd):
         """Overrides the default behaviour of the cmd module
            when an invalid input is encountered.
         """
-        argdict = {
-            "all": self.do_all,
-            "show": self.do_show,
-            "destroy": self.do_destroy,
-            "count": self.do_count,
-            "update": self.do_update
-        }
-        match = re.search(r"\.", line)
-        if match is not None:
-            argl = [line[:match.span()[0]], line[match.span()[1]:]]
-            match = re.search(r"\((.*?)\)", argl[1])
-            if match is not None:
-                command = [argl[1][:match.span()[0]], match.group()[1:-1]]
-                if command[0] in argdict.keys():
-                    call = "{} {}".format(argl[0], command[1])
-                    return argdict[command[0]](call)
+        call = parse_call(line)
+        if call is not None and call[1] in HBNBCommand.__methods:
+            return getattr(self, "do_" + call[1])(
+                "{} {}".format(call[0], call[2]))
         print("*** Unknown syntax: {}".format(line))
         return False
 
@@ -87,7 +172,7 @@ class HBNBCommand(cmd.Cmd):
         elif parsed_line[0] not in HBNBCommand.__classes:
             print("** class doesn't exist **")
         else:
-            print(eval(parsed_line[0])().id)
+            print(HBNBCommand.__classes[parsed_line[0]]().id)
             storage.save()
 
     def do_show(self, line):
@@ -96,17 +181,16 @@ class HBNBCommand(cmd.Cmd):
            Usage: show <class> <id> or <class>.show(<id>)
         """
         line_parsed = parse_line(line)
-        objdict = storage.all()
         if len(line_parsed) == 0:
             print("** class name missing **")
         elif line_parsed[0] not in HBNBCommand.__classes:
             print("** class doesn't exist **")
         elif len(line_parsed) == 1:
             print("** instance id missing **")
-        elif "{}.{}".format(line_parsed[0], line_parsed[1]) not in objdict:
+        elif storage.get(line_parsed[0], line_parsed[1]) is None:
             print("** no instance found **")
         else:
-            print(objdict["{}.{}".format(line_parsed[0], line_parsed[1])])
+            print(storage.get(line_parsed[0], line_parsed[1]))
 
     def do_destroy(self, line):
         """Deletes an instance based on the class name and id
@@ -114,38 +198,107 @@ class HBNBCommand(cmd.Cmd):
            Usage: destroy <class> <id> or <class>.destroy(<id>)
         """
         line_parsed = parse_line(line)
-        objdict = storage.all()
         if len(line_parsed) == 0:
             print("** class name missing **")
         elif line_parsed[0] not in HBNBCommand.__classes:
             print("** class doesn't exist **")
         elif len(line_parsed) == 1:
             print("** instance id missing **")
-        elif "{}.{}".format(line_parsed[0], line_parsed[1]) \
-                not in objdict.keys():
+        elif storage.get(line_parsed[0], line_parsed[1]) is None:
             print("** no instance found **")
         else:
-            del objdict["{}.{}".format(line_parsed[0], line_parsed[1])]
+            storage.delete(storage.get(line_parsed[0], line_parsed[1]))
             storage.save()
 
     def do_all(self, line):
         """Prints all string representation of all instances
-           based or not on the class name.
-           Usage: all or all <class> or <class>.all()
+           based or not on the class name. --limit and --offset print
+           one page of them, --after starts after the instance with
+           the given <class>.<id> key and --stream prints them one per
+           line as they are read. <class>.all(<limit>[, <key>]) prints
+           one page followed by the key to continue from, if any.
+           Usage: all or all <class> or <class>.all() or
+           all [<class>] [--limit <n>] [--offset <n>] [--after <key>]
+           [--stream] or <class>.all(<limit>[, <key>])
         """
-        line_parsed = parse_line(line)
+        args = iter(split_words(line.replace(",", " ")))
+        line_parsed, options = [], {}
+        for arg in args:
+            if arg in ("--limit", "--offset", "--after"):
+                options[arg] = next(args, "")
+            elif arg == "--stream":
+                options[arg] = True
+            elif arg.startswith("--"):
+                print("** unknown option {} **".format(arg))
+                return False
+            else:
+                line_parsed.append(arg)
         if len(line_parsed) > 0 and line_parsed[0] \
                 not in HBNBCommand.__classes:
             print("** class doesn't exist **")
+            return False
+        cls_name = line_parsed[0] if len(line_parsed) > 0 else None
+        cursor = len(line_parsed) > 1
+        if cursor:
+            options["--limit"] = line_parsed[1]
+            if len(line_parsed) > 2:
+                options["--after"] = line_parsed[2]
+        try:
+            limit = int(options.get("--limit", -1))
+            offset = int(options.get("--offset", 0))
+            if "--limit" in options and limit < (1 if cursor else 0):
+                raise ValueError(limit)
+        except ValueError:
+            print("** limit and offset must be integers **")
+            return False
+        if not options:
+            objects = storage.all(cls_name).values()
+        else:
+            objects = islice(storage.objects(cls_name,
+                                             options.get("--after")),
+                             max(offset, 0), None)
+        if limit >= 0:
+            objects = islice(objects, limit + cursor)
+        if "--stream" in options:
+            for obj in objects:
+                print(obj)
+            return False
+        page = list(objects)
+        last = None
+        if cursor and len(page) > limit:
+            page.pop()
+            last = page[-1] if page else None
+        print([obj.__str__() for obj in page])
+        if last is not None:
+            print("** next: {}.{} **".format(
+                last.__class__.__name__, last.id))
+
+    def do_where(self, line):
+        """Prints the string representation of the instances of a class
+           meeting conditions on their attributes (=, !=, <, <=, > or
+           >= a value), optionally sorted and paged, or an aggregate of
+           them: count(), sum(), avg(), min() or max() of an attribute.
+           Usage: where <class> <attribute><operator><value>, ... or
+           <class>.where(<conditions>)[.order_by("[-]<attribute>")]
+           [.limit(<n>)][.offset(<n>)][.<aggregate>("<attribute>")]
+        """
+        cls_name, _, text = line.strip().partition(" ")
+        if not cls_name:
+            print("** class name missing **")
+            return False
+        if cls_name not in HBNBCommand.__classes:
+            print("** class doesn't exist **")
+            return False
+        try:
+            query = Query.parse(cls_name, text)
+            result = query.run(storage)
+        except (ValueError, TypeError, SyntaxError) as e:
+            print("** invalid query: {} **".format(e))
+            return False
+        if query.aggregate is None:
+            print([obj.__str__() for obj in result])
         else:
-            obj_list = []
-            for obj in storage.all().values():
-                if len(line_parsed) > 0 and line_parsed[0] \
-                        == obj.__class__.__name__:
-                    obj_list.append(obj.__str__())
-                elif len(line_parsed) == 0:
-                    obj_list.append(obj.__str__())
-            print(obj_list)
+            print(result)
 
     def do_update(self, line):
         """
@@ -156,7 +309,6 @@ class HBNBCommand(cmd.Cmd):
        <class>.update(<id>, <dictionary>)
         """
         parsed_line = parse_line(line)
-        objdict = storage.all()
 
         if len(parsed_line) == 0:
             print("** class name missing **")
@@ -167,8 +319,8 @@ class HBNBCommand(cmd.Cmd):
         if len(parsed_line) == 1:
             print("** instance id missing **")
             return False
-        if "{}.{}".format(parsed_line[0], parsed_line[1]) \
-                not in objdict.keys():
+        obj = storage.get(parsed_line[0], parsed_line[1])
+        if obj is None:
             print("** no instance found **")
             return False
         if len(parsed_line) == 2:
@@ -176,26 +328,27 @@ class HBNBCommand(cmd.Cmd):
             return False
         if len(parsed_line) == 3:
             try:
-                type(eval(parsed_line[2])) != dict
-            except NameError:
+                attributes = parse_literal(parsed_line[2])
+            except ValueError:
+                attributes = None
+            if type(attributes) is not dict:
                 print("** value missing **")
                 return False
-        if len(parsed_line) == 4:
-            obj = objdict["{}.{}".format(parsed_line[0], parsed_line[1])]
-            if parsed_line[2] in obj.__class__.__dict__.keys():
-                valtype = type(obj.__class__.__dict__[parsed_line[2]])
-                obj.__dict__[parsed_line[2]] = valtype(parsed_line[3])
-            else:
-                obj.__dict__[parsed_line[2]] = parsed_line[3]
-        elif type(eval(parsed_line[2])) == dict:
-            obj = objdict["{}.{}".format(parsed_line[0], parsed_line[1])]
-            for k, v in eval(parsed_line[2]).items():
-                if (k in obj.__class__.__dict__.keys() and
-                        type(obj.__class__.__dict__[k]) in {str, int, float}):
-                    valtype = type(obj.__class__.__dict__[k])
-                    obj.__dict__[k] = valtype(v)
-                else:
-                    obj.__dict__[k] = v
+        else:
+            # arguments after the first name and value are ignored
+            attributes = {parsed_line[2]: parsed_line[3]}
+        if any(type(k) is not str for k in attributes):
+            print("** invalid value **")
+            return False
+        schema = HBNBCommand.__classes[parsed_line[0]]._schema
+        try:
+            attributes = {k: schema.coerce(k, v)
+                          for k, v in attributes.items()}
+        except (ValueError, TypeError):
+            print("** invalid value **")
+            return False
+        for k, v in attributes.items():
+            setattr(obj, k, v)
         storage.save()
 
     def do_count(self, line):
@@ -203,11 +356,152 @@ class HBNBCommand(cmd.Cmd):
            Usage: count <class> or <class>.count()
         """
         line_parsed = parse_line(line)
-        count = 0
-        for obj in storage.all().values():
-            if line_parsed[0] == obj.__class__.__name__:
-                count += 1
-        print(count)
+        if len(line_parsed) == 0:
+            print("** class name missing **")
+        else:
+            print(storage.count(line_parsed[0]))
+
+    def do_begin(self, line):
+        """Opens a transaction: changes are kept in memory until commit.
+           Usage: begin
+        """
+        try:
+            storage.begin()
+        except ValueError:
+            print("** transaction already open **")
+
+    def do_commit(self, line):
+        """Saves the changes made since begin (to the JSON file).
+           Usage: commit
+        """
+        try:
+            storage.commit()
+        except ValueError:
+            print("** no transaction open **")
+
+    def do_rollback(self, line):
+        """Undoes the changes made since begin.
+           Usage: rollback
+        """
+        try:
+            storage.rollback()
+        except ValueError:
+            print("** no transaction open **")
+
+    def do_export(self, line):
+        """Writes the to_dict() of all instances, or of the instances of
+           a class, to a file or to the standard output (-), one per
+           line as JSON Lines (the default) or CSV.
+           Usage: export [<class>] [--fields <a,b>] [--format jsonl|csv]
+           <path|->
+        """
+        args = iter(split_words(line))
+        line_parsed, options = [], {}
+        for arg in args:
+            if arg in ("--fields", "--format"):
+                options[arg] = next(args, "")
+            elif arg.startswith("--"):
+                print("** unknown option {} **".format(arg))
+                return False
+            else:
+                line_parsed.append(arg)
+        if len(line_parsed) == 0 or (len(line_parsed) == 1 and
+                                     line_parsed[0] in HBNBCommand.__classes):
+            print("** file path missing **")
+            return False
+        cls_name = line_parsed[0] if len(line_parsed) > 1 else None
+        if cls_name is not None and cls_name not in HBNBCommand.__classes:
+            print("** class doesn't exist **")
+            return False
+        fmt = options.get("--format", "jsonl")
+        if fmt not in ("jsonl", "csv"):
+            print("** unknown file format **")
+            return False
+        fields = None
+        if "--fields" in options:
+            fields = [name for name in options["--fields"].split(",")
+                      if name]
+        elif fmt == "csv":
+            fields = ["__class__", "id", "created_at", "updated_at"]
+            for name, cls in HBNBCommand.__classes.items():
+                if cls_name in (None, name):
+                    fields += [attr for attr in cls._schema.defaults
+                               if attr not in fields]
+        records = storage.records(cls_name)
+        if line_parsed[-1] == "-":
+            write_records(sys.stdout, records, fmt, fields)
+            return False
+        try:
+            with open(line_parsed[-1], "w", newline="") as f:
+                write_records(f, records, fmt, fields)
+        except OSError as e:
+            print("** cannot write file: {} **".format(e.strerror))
+
+    def do_import(self, line):
+        """Creates instances of a class from a JSON Lines (.jsonl) or
+           CSV (.csv) file of attributes, saves them once and prints
+           the throughput. Nothing is kept if a record is invalid.
+           Usage: import <class> <path>
+        """
+        line_parsed = parse_line(line)
+        if len(line_parsed) == 0:
+            print("** class name missing **")
+            return False
+        if line_parsed[0] not in HBNBCommand.__classes:
+            print("** class doesn't exist **")
+            return False
+        if len(line_parsed) == 1:
+            print("** file path missing **")
+            return False
+        fmt = os.path.splitext(line_parsed[1])[1].lower()
+        if fmt not in (".jsonl", ".ndjson", ".csv"):
+            print("** unknown file format **")
+            return False
+        try:
+            storage.begin()
+            own_transaction = True
+        except ValueError:
+            own_transaction = False
+        start = time.perf_counter()
+        try:
+            with open(line_parsed[1], "r", newline="") as f:
+                count = storage.bulk_load(line_parsed[0],
+                                          read_records(f, fmt[1:]))
+        except BaseException as e:
+            if own_transaction:
+                storage.rollback()
+            if isinstance(e, FileNotFoundError):
+                print("** file doesn't exist **")
+            elif isinstance(e, (OSError, ValueError, TypeError)):
+                print("** invalid file: {} **".format(e))
+            else:
+                raise
+            return False
+        if own_transaction:
+            storage.commit()
+        seconds = time.perf_counter() - start
+        print("{} objects imported in {:.2f} s ({:.0f} objects/s)".format(
+            count, seconds, count / seconds if seconds else count))
+
+    def do_convert(self, line):
+        """Rewrites the storage files in a format (json, binary or
+           columnar), which later saves keep using.
+           Usage: convert <format>
+        """
+        line_parsed = parse_line(line)
+        if len(line_parsed) == 0:
+            print("** format missing **")
+            return False
+        if not hasattr(storage, "convert"):
+            print("** storage can't convert **")
+            return False
+        if line_parsed[0] != "json" and line_parsed[0] not in SERIALIZERS:
+            print("** unknown file format **")
+            return False
+        try:
+            storage.convert(line_parsed[0])
+        except ValueError:
+            print("** transaction open **")
 
     def do_quit(self, line):
         """Ends the console session."""
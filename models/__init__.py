@@ -2,9 +2,55 @@
 """Module package for models. Contained here are modules
    for classes BaseModel, User, State, City, Amenity, Place and Review.
 """
+from contextlib import contextmanager
+from contextvars import ContextVar
+from os import getenv
+# defining the model classes adds them to base_model.registry
+from models import user, state, city, amenity, place, review  # noqa: F401
 
-from models.engine.file_storage import FileStorage
+if getenv("HBNB_TYPE_STORAGE") == "db":
+    from models.engine.db_storage import DBStorage
+    storage = DBStorage(path=getenv("HBNB_DB_PATH", "hbnb.db"))
+else:
+    from models.engine.file_storage import FileStorage
+    storage = FileStorage(path=getenv("HBNB_FILE_PATH", "file.json"),
+                          journal=getenv("HBNB_FILE_JOURNAL") == "1",
+                          lazy=getenv("HBNB_FILE_LAZY") == "1",
+                          compact=getenv("HBNB_COMPACT_MODELS") == "1",
+                          workers=int(getenv("HBNB_FILE_WORKERS", "1")),
+                          shards=int(getenv("HBNB_FILE_SHARDS", "0")) or None,
+                          format=getenv("HBNB_FILE_FORMAT", "json"),
+                          mapped=getenv("HBNB_FILE_MAPPED") == "1")
 
+_using = ContextVar("storage", default=None)
 
-storage = FileStorage()
-storage.reload()
+
+def current_storage():
+    """Returns the storage that the models created, changed or saved
+    here use: the one of the innermost using(), or else storage."""
+    return _using.get() or storage
+
+
+@contextmanager
+def using(store):
+    """Makes the models created, changed or saved in the body of a with
+    statement use store instead of storage, in the current thread or
+    task only, so that several stores can be served side by side."""
+    token = _using.set(store)
+    try:
+        yield store
+    finally:
+        _using.reset(token)
+
+
+def init(path=None, eager=False):
+    """Points storage at path (the JSON file, or the database file with
+    HBNB_TYPE_STORAGE=db) if given and forgets the objects used so far.
+    The stored objects are loaded now if eager, or else by the first
+    storage method that uses them."""
+    storage.defer(path)
+    if eager:
+        storage.reload()
+
+
+init()
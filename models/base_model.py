@@ -3,43 +3,161 @@
 This is a module containing the baseclass defination for the AirBnB project
 """
 
+import json
+from ast import literal_eval
 from datetime import datetime
 from uuid import uuid4
 import models
 
-date_fmt = "%Y-%m-%dT%H:%M:%S.%f"
+registry = {}
+
+
+def _to_list(value):
+    """
+    returns value if it is a list, or the list written as a JSON or
+    Python literal in the string value
+    """
+    if type(value) is str:
+        try:
+            value = json.loads(value)
+        except ValueError:
+            try:
+                value = literal_eval(value)
+            except (ValueError, TypeError, SyntaxError, MemoryError,
+                    RecursionError):
+                pass
+    if type(value) is not list:
+        raise ValueError("not a list: {!r}".format(value))
+    return value
+
+
+_COERCERS = {str: str, int: int, float: float, list: _to_list}
+
+
+class Schema:
+    """
+    describes the fields of a model class, computed once when the
+    class is defined:
+    name: the class name
+    defaults: the class default of each public attribute, by name
+    types: the type of id, created_at, updated_at and of each public
+        attribute, by name
+    datetimes: the names of the fields holding a datetime
+    coercers: the function converting a value, such as a string read
+        by the console or from a CSV file, to the type of each str,
+        int, float or list field, by name
+    """
+
+    def __init__(self, cls):
+        self.name = cls.__name__
+        self.defaults = {}
+        for klass in reversed(cls.__mro__):
+            for name, value in vars(klass).items():
+                if not name.startswith("_") and not callable(value):
+                    self.defaults[name] = value
+        self.types = {"id": str, "created_at": datetime,
+                      "updated_at": datetime}
+        for name, value in self.defaults.items():
+            self.types[name] = type(value)
+        self.datetimes = tuple(name for name, kind in self.types.items()
+                               if kind is datetime)
+        self.coercers = {name: _COERCERS[kind]
+                         for name, kind in self.types.items()
+                         if kind in _COERCERS}
+
+    def coerce(self, name, value):
+        """
+        returns value converted to the type of field name, or as it is
+        for other attributes; raises ValueError if it cannot be
+        """
+        coercer = self.coercers.get(name)
+        if coercer is None:
+            return value
+        return coercer(value)
+
+
+def _register(cls):
+    """
+    adds cls, with its Schema, to the registry of model classes
+    """
+    cls._schema = Schema(cls)
+    registry[cls.__name__] = cls
 
 
 class BaseModel:
     """
      defines all common attributes/methods for other classes:
+     _indexes lists the attributes storage keeps a lookup index on,
+     _schema describes the fields of the class; every subclass is
+     added to registry unless defined with register=False; the _store
+     slot holds the storage the instance was added to, see own()
     """
+    __slots__ = ("_store", "__dict__", "__weakref__")
+    _indexes = ()
+
+    def __init_subclass__(cls, register=True, **kwargs):
+        """
+        registers a new model class
+        """
+        super().__init_subclass__(**kwargs)
+        if register:
+            _register(cls)
+
     def __init__(self, *args, **kwargs):
         if not kwargs:
             self.id = str(uuid4())
             self.created_at = datetime.now()
             self.updated_at = datetime.now()
-            models.storage.new(self)
+            models.current_storage().new(self)
 
         else:
             str_created_at = kwargs["created_at"]
             str_updated_at = kwargs["updated_at"]
 
-            created_at = datetime.strptime(str_created_at, date_fmt)
-            updated_at = datetime.strptime(str_updated_at, date_fmt)
+            created_at = datetime.fromisoformat(str_created_at)
+            updated_at = datetime.fromisoformat(str_updated_at)
 
             kwargs["created_at"] = created_at
             kwargs["updated_at"] = updated_at
+            kwargs.pop("__class__", None)
+
+            # not stored yet, so there is no need to go through
+            # __setattr__ and flag each attribute in storage
+            self._load(kwargs)
+
+    def _load(self, attributes):
+        """
+        sets the attributes of a new instance from a dictionary
+        """
+        self.__dict__.update(attributes)
 
-            for key, value in kwargs.items():
-                if key != "__class__":
-                    setattr(self, key, value)
+    def _attributes(self):
+        """
+        returns the instance attributes by name
+        """
+        return self.__dict__
+
+    def __setattr__(self, name, value):
+        """
+        sets an attribute and flags the instance as changed in storage
+        """
+        storage = _storage_of(self)
+        storage.will_change(self)
+        super().__setattr__(name, value)
+        storage.mark_dirty(self)
+
+    def __getstate__(self):
+        """
+        returns the state pickled or copied: the instance attributes,
+        without the store holding the instance
+        """
+        return self.__dict__
 
     def __str__(self):
         """
         prints a customised representation of the current object
         """
-        return f"[{self.__class__.__name__}] ({self.id}) {self.__dict__}"
+        return f"[{self.__class__.__name__}] ({self.id}) {self._attributes()}"
 
     def save(self):
         """
@@ -48,7 +166,7 @@ class BaseModel:
         """
 
         self.updated_at = datetime.now()
-        models.storage.save()
+        _storage_of(self).save()
 
     def to_dict(self):
         """
@@ -56,14 +174,166 @@ class BaseModel:
         of __dict__ of the instance
         """
 
-        instance_dict = self.__dict__.copy()
+        instance_dict = self._attributes().copy()
 
-        instance_dict.update({
+        for name in self._schema.datetimes:
+            if name in instance_dict:
+                instance_dict[name] = instance_dict[name].isoformat()
+        instance_dict["__class__"] = self._schema.name
 
-            "__class__": self.__class__.__name__,
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat()
+        return instance_dict
 
-            })
 
-        return instance_dict
+_register(BaseModel)
+
+
+def own(obj, storage):
+    """
+    records storage as the store holding obj: the attributes set on obj
+    are flagged as changed there, and obj.save() saves it
+    """
+    object.__setattr__(obj, "_store", storage)
+
+
+def _storage_of(obj):
+    """
+    returns the store holding obj, or the current storage if none does
+    """
+    try:
+        return obj._store
+    except AttributeError:
+        return models.current_storage()
+
+
+def from_records(cls, records, batch_size=1000):
+    """
+    yields instances of cls built from an iterable of attribute
+    dictionaries, batch_size at a time, without adding them to storage.
+    A record without id, created_at or updated_at gets a new id and the
+    time its batch was built; string values of attributes whose class
+    default is a number or a list are converted, and empty ones skipped
+    """
+    schema = cls._schema
+    records = iter(records)
+    while True:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == batch_size:
+                break
+        if not batch:
+            return
+        now = datetime.now()
+        for record in batch:
+            if type(record) is not dict:
+                raise ValueError("record is not a dictionary: {!r}".format(
+                    record))
+            attributes = {"id": record.get("id") or str(uuid4())}
+            for name in ("created_at", "updated_at"):
+                value = record.get(name)
+                attributes[name] = datetime.fromisoformat(value) \
+                    if value else now
+            for name, value in record.items():
+                if name in attributes or name == "__class__" or \
+                        value == "" or value is None:
+                    continue
+                if type(value) is str:
+                    value = schema.coerce(name, value)
+                attributes[name] = value
+            obj = cls.__new__(cls)
+            obj._load(attributes)
+            yield obj
+
+
+class _Compact:
+    """
+    overrides the attribute storage of a compact class, see compact()
+    """
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        """
+        returns the class default of a field that was never set
+        """
+        try:
+            return self._defaults[name]
+        except KeyError:
+            raise AttributeError("'{}' object has no attribute '{}'".format(
+                self.__class__.__name__, name)) from None
+
+    def __setattr__(self, name, value):
+        """
+        notes the use of the overflow __dict__ before setting
+        """
+        if name not in self._defaults and name not in _COMMON_FIELDS:
+            object.__setattr__(self, "_overflow", True)
+        super().__setattr__(name, value)
+
+    def _load(self, attributes):
+        """
+        sets fields in their slot and anything else in __dict__
+        """
+        for name, value in attributes.items():
+            if name in self._defaults or name in _COMMON_FIELDS:
+                object.__setattr__(self, name, value)
+            else:
+                object.__setattr__(self, "_overflow", True)
+                self.__dict__[name] = value
+
+    def _attributes(self):
+        """
+        returns the set fields in slot order followed by __dict__
+        """
+        attributes = {}
+        for name in self._fields:
+            try:
+                attributes[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        try:
+            object.__getattribute__(self, "_overflow")
+        except AttributeError:
+            return attributes
+        attributes.update(self.__dict__)
+        return attributes
+
+    def __reduce__(self):
+        """
+        pickles the instance by its base class and attributes
+        """
+        return _restore, (self._base, self._attributes())
+
+
+def _restore(cls, attributes):
+    """
+    rebuilds a pickled instance of compact(cls)
+    """
+    obj = compact(cls).__new__(compact(cls))
+    obj._load(attributes)
+    return obj
+
+
+_COMMON_FIELDS = ("id", "created_at", "updated_at")
+_compact_classes = {}
+
+
+def compact(cls):
+    """
+    returns a subclass of cls, with the same name, that keeps id,
+    created_at, updated_at and the public class attributes of cls in
+    slots; other attributes go to an instance __dict__ that is only
+    created once one is set
+    """
+    if cls not in _compact_classes:
+        defaults = cls._schema.defaults
+        fields = _COMMON_FIELDS + tuple(defaults)
+        _compact_classes[cls] = type(cls.__name__, (_Compact, cls), {
+            "__slots__": fields + ("_overflow",),
+            "__module__": cls.__module__,
+            "__qualname__": cls.__qualname__,
+            "__doc__": cls.__doc__,
+            "_base": cls,
+            "_defaults": defaults,
+            "_fields": fields
+        }, register=False)
+    return _compact_classes[cls]
@@ -9,5 +9,7 @@ class City(BaseModel):
     """
     Public class attributes
     """
+    _indexes = ("state_id",)
+
     state_id = ""
     name = ""
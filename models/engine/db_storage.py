@@ -0,0 +1,445 @@
+#!/usr/bin/python3
+"""
+This module defines the DBStorage class that implements storage
+in a SQLite database.
+"""
+import heapq
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from models.base_model import from_records, own, registry
+from models.engine.query import matches
+
+
+class DBStorage:
+    """
+    Represents a storage engine that keeps every model class in its own
+    SQLite table, with one column per class attribute, an index on each
+    attribute listed in the class's _indexes and an extra column holding
+    the JSON of any other attribute.
+    Attributes:
+    __path(str): path to the database file.
+    __conn(sqlite3.Connection): connection opened by reload().
+    __deferred(bool): whether the database is opened on first use,
+        after defer().
+    __objects(dict): objects loaded or created so far by <class name>.id
+    __pending(dict): mutations not yet written, by <class name>.id
+    __columns(dict): (attribute, default value) of each class's columns,
+        by class name.
+    __in_transaction(bool): whether save() is deferred until commit().
+    """
+
+    def __init__(self, *, path="hbnb.db"):
+        """Initializes the storage engine.
+        Args:
+            path(str): path to the database file.
+        """
+        self.__path = path
+        self.__conn = None
+        self.__objects = {}
+        self.__pending = {}
+        self.__columns = {}
+        self.__in_transaction = False
+        self.__deferred = False
+        for cls_name, cls in registry.items():
+            self.__columns[cls_name] = [
+                (name, value) for name, value
+                in cls._schema.defaults.items()
+                if type(value) in (str, int, float, list)]
+
+    def reload(self):
+        """Opens the database, creating the tables and indexes that
+        do not exist yet, and forgets every object loaded so far."""
+        self.close()
+        self.__connect()
+        self.__forget()
+
+    def defer(self, path=None):
+        """Closes the database, sets its path if given and forgets every
+        object loaded so far; the database is then opened by the first
+        method that queries it."""
+        self.close()
+        if path is not None:
+            self.__path = path
+        self.__forget()
+        self.__deferred = True
+
+    def __connect(self):
+        """Opens the database and creates its missing tables."""
+        self.__deferred = False
+        self.__conn = sqlite3.connect(self.__path)
+        self.__conn.row_factory = sqlite3.Row
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute("PRAGMA synchronous=NORMAL")
+        types = {str: "TEXT", int: "INTEGER", float: "REAL", list: "TEXT"}
+        with self.__conn:
+            for cls_name, columns in self.__columns.items():
+                self.__conn.execute(
+                    'CREATE TABLE IF NOT EXISTS "{}" (id TEXT PRIMARY KEY, '
+                    'created_at TEXT, updated_at TEXT, {}extra TEXT)'.format(
+                        cls_name, "".join("{} {}, ".format(
+                            name, types[type(value)])
+                            for name, value in columns)))
+                for name in registry[cls_name]._indexes:
+                    self.__conn.execute(
+                        'CREATE INDEX IF NOT EXISTS "ix_{0}_{1}" '
+                        'ON "{0}" ({1})'.format(cls_name, name))
+
+    def __forget(self):
+        """Forgets every object loaded or created so far."""
+        self.__objects = {}
+        self.__pending = {}
+        self.__in_transaction = False
+
+    def __db(self):
+        """Returns the connection, opening the database first if its
+        opening was deferred."""
+        if self.__conn is None and self.__deferred:
+            self.__connect()
+        return self.__conn
+
+    def close(self):
+        """Closes the database."""
+        if self.__conn is not None:
+            self.__conn.close()
+            self.__conn = None
+
+    def all(self, cls=None):
+        """Returns a dictionary of every object, or of the objects of
+        class cls (or class name) only."""
+        if cls is None:
+            names = list(registry)
+        elif type(cls) is str:
+            names = [cls] if cls in registry else []
+        else:
+            names = [cls.__name__]
+        objects = {}
+        for cls_name in names:
+            for row in self.__db().execute(
+                    'SELECT * FROM "{}"'.format(cls_name)):
+                key = "{}.{}".format(cls_name, row["id"])
+                if self.__pending.get(key) != "delete":
+                    objects[key] = self.__load(cls_name, row)
+            for key, obj in self.__objects.items():
+                if key.startswith(cls_name + ".") and \
+                        self.__pending.get(key) != "delete":
+                    objects[key] = obj
+        return objects
+
+    def objects(self, cls=None, after=None):
+        """Yields every object, or the objects of class cls (or class
+        name) only, one at a time by class then id, starting after
+        the object with key after (<class name>.id)."""
+        if cls is None:
+            names = list(registry)
+        elif type(cls) is str:
+            names = [cls] if cls in registry else []
+        else:
+            names = [cls.__name__]
+        after_cls, _, after_id = (after or "").partition(".")
+        if after_cls in names:
+            names = names[names.index(after_cls):]
+        for cls_name in names:
+            start = after_id if cls_name == after_cls else ""
+            rows = self.__db().execute(
+                'SELECT * FROM "{}" WHERE id > ? ORDER BY id'.format(
+                    cls_name), (start,))
+            stored = (self.__load(cls_name, row) for row in rows
+                      if self.__pending.get("{}.{}".format(
+                          cls_name, row["id"])) not in ("new", "delete"))
+            unsaved = sorted(
+                (obj for key, obj in self.__objects.items()
+                 if key.startswith(cls_name + ".") and obj.id > start and
+                 self.__pending.get(key) == "new"),
+                key=lambda obj: obj.id)
+            yield from heapq.merge(stored, unsaved, key=lambda obj: obj.id)
+
+    def records(self, cls=None):
+        """Yields the to_dict() dictionary of every object, or of the
+        objects of class cls (or class name) only, one row at a time.
+        Rows of objects not loaded yet are not built into objects."""
+        if cls is None:
+            names = list(registry)
+        elif type(cls) is str:
+            names = [cls] if cls in registry else []
+        else:
+            names = [cls.__name__]
+        for cls_name in names:
+            for row in self.__db().execute(
+                    'SELECT * FROM "{}"'.format(cls_name)):
+                key = "{}.{}".format(cls_name, row["id"])
+                if key not in self.__objects:
+                    attributes = self.__attributes(cls_name, row)
+                    attributes["__class__"] = cls_name
+                    yield attributes
+            for key, obj in list(self.__objects.items()):
+                if key.startswith(cls_name + ".") and \
+                        self.__pending.get(key) != "delete":
+                    yield obj.to_dict()
+
+    def scan(self, cls, attrs):
+        """Returns the values of the attributes attrs of every object of
+        class cls (or class name), as getattr() would return them or
+        None, by attribute in columns of the same length and order.
+        Rows of objects not loaded yet are not built into objects."""
+        if type(cls) is not str:
+            cls = cls.__name__
+        columns = {attr: [] for attr in attrs}
+        if cls not in registry:
+            return columns
+        schema = registry[cls]._schema
+        for record in self.records(cls):
+            for attr, column in columns.items():
+                value = record.get(attr, schema.defaults.get(attr))
+                if attr in schema.datetimes and value is not None:
+                    value = datetime.fromisoformat(value)
+                column.append(value)
+        return columns
+
+    def count(self, cls=None):
+        """Returns the number of objects, or of objects of class cls
+        (or class name) only."""
+        if cls is None:
+            return sum(self.count(cls_name) for cls_name in registry)
+        if type(cls) is not str:
+            cls = cls.__name__
+        if cls not in registry:
+            return 0
+        count = self.__db().execute(
+            'SELECT COUNT(*) FROM "{}"'.format(cls)).fetchone()[0]
+        for key, op in self.__pending.items():
+            if key.startswith(cls + "."):
+                if op == "new":
+                    count += 1
+                elif op == "delete":
+                    count -= 1
+        return count
+
+    def get(self, cls, id):
+        """Returns the object of class cls (or class name) with id,
+        or None if there is none."""
+        if type(cls) is not str:
+            cls = cls.__name__
+        key = "{}.{}".format(cls, id)
+        if key in self.__objects:
+            if self.__pending.get(key) == "delete":
+                return None
+            return self.__objects[key]
+        if cls not in registry:
+            return None
+        row = self.__db().execute(
+            'SELECT * FROM "{}" WHERE id = ?'.format(cls), (id,)).fetchone()
+        if row is None:
+            return None
+        return self.__load(cls, row)
+
+    def find(self, cls, **equals):
+        """Returns a dictionary of the objects of class cls (or class
+        name) whose attributes equal the given values."""
+        return {"{}.{}".format(obj.__class__.__name__, obj.id): obj
+                for obj in self.select(cls, [(attr, "=", value)
+                                             for attr, value
+                                             in equals.items()])}
+
+    def select(self, cls, conditions=()):
+        """Yields the objects of class cls (or class name) meeting every
+        (attribute, operator, value) condition, see query.matches().
+        Conditions on id and on attributes stored in a column of the
+        value's type are filtered by the database, using the column's
+        index for an equality on text; the others are tested on each
+        object, as are the rows whose attribute was stored in the extra
+        column for holding a value of another type."""
+        if type(cls) is not str:
+            cls = cls.__name__
+        if cls not in registry:
+            return
+        defaults = dict(self.__columns[cls])
+        where, params = [], []
+        for name, op, value in conditions:
+            if name == "id":
+                where.append("id {} ?".format(op))
+                params.append(value)
+            elif name in defaults and type(value) is type(defaults[name]) \
+                    and type(value) is not list:
+                if op == "=" and value != defaults[name]:
+                    test = "{} = ?".format(name)
+                else:
+                    test = "COALESCE({}, ?) {} ?".format(name, op)
+                    params.append(defaults[name])
+                params.append(value)
+                # only an equality on text cannot be met by a value of
+                # another type, held in extra
+                if op != "=" or type(value) is not str:
+                    test = "({} OR ({} IS NULL AND extra IS NOT NULL))" \
+                        .format(test, name)
+                where.append(test)
+        sql = 'SELECT * FROM "{}"'.format(cls)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+
+        def get(attr):
+            return getattr(obj, attr, None)
+        loaded = {key: obj for key, obj in self.__objects.items()
+                  if key.startswith(cls + ".") and
+                  self.__pending.get(key) != "delete"}
+        for row in self.__db().execute(sql, params):
+            key = "{}.{}".format(cls, row["id"])
+            if key not in loaded and key not in self.__pending:
+                obj = self.__load(cls, row)
+                if matches(get, conditions):
+                    yield obj
+        for obj in loaded.values():
+            if matches(get, conditions):
+                yield obj
+
+    def new(self, obj):
+        """Adds obj to the objects to write on the next save()."""
+        key = "{}.{}".format(obj.__class__.__name__, obj.id)
+        if self.__pending.get(key) == "new" or key not in self.__objects:
+            self.__pending[key] = "new"
+        else:
+            self.__pending[key] = "update"
+        self.__objects[key] = obj
+        own(obj, self)
+
+    def bulk_load(self, cls, records, batch_size=1000):
+        """Adds the objects of class cls (or class name) built from an
+        iterable of attribute dictionaries by from_records(), batch_size
+        at a time, then saves once. Returns the number of objects."""
+        if type(cls) is str:
+            cls = registry[cls]
+        count = 0
+        for obj in from_records(cls, records, batch_size):
+            self.new(obj)
+            count += 1
+        self.save()
+        return count
+
+    def will_change(self, obj):
+        """Nothing to record: rollback() reads objects back from the
+        database."""
+
+    def mark_dirty(self, obj):
+        """Flags a stored obj as changed so the next save() writes it."""
+        key = "{}.{}".format(obj.__class__.__name__,
+                             getattr(obj, "id", None))
+        if self.__objects.get(key) is obj and \
+                self.__pending.get(key) not in ("new", "delete"):
+            self.__pending[key] = "update"
+
+    def delete(self, obj=None):
+        """Deletes obj from the database on the next save()."""
+        if obj is None:
+            return
+        key = "{}.{}".format(obj.__class__.__name__, obj.id)
+        if self.__pending.get(key) == "new":
+            del self.__pending[key]
+            del self.__objects[key]
+        else:
+            self.__objects[key] = obj
+            self.__pending[key] = "delete"
+
+    def begin(self):
+        """Writes the pending mutations, then opens a transaction:
+        save() is deferred until commit()."""
+        if self.__in_transaction:
+            raise ValueError("a transaction is already open")
+        self.save()
+        self.__in_transaction = True
+
+    def commit(self):
+        """Closes the open transaction and saves its changes."""
+        if not self.__in_transaction:
+            raise ValueError("no transaction is open")
+        self.__in_transaction = False
+        self.save()
+
+    def rollback(self):
+        """Closes the open transaction and drops its changes, along
+        with every loaded object, which is read again on next access."""
+        if not self.__in_transaction:
+            raise ValueError("no transaction is open")
+        self.__in_transaction = False
+        self.__objects = {}
+        self.__pending = {}
+
+    @contextmanager
+    def transaction(self):
+        """Runs the body of a with statement in a transaction that is
+        committed at its end, or rolled back if it raises."""
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def save(self):
+        """Writes every pending mutation in a single transaction.
+        Does nothing while a transaction is open."""
+        if self.__in_transaction:
+            return
+        deletes, rows = {}, {}
+        for key, op in self.__pending.items():
+            cls_name, _, id = key.partition(".")
+            if op == "delete":
+                deletes.setdefault(cls_name, []).append((id,))
+                del self.__objects[key]
+            else:
+                rows.setdefault(cls_name, []).append(
+                    self.__row(self.__objects[key]))
+        conn = self.__db()
+        with conn:
+            for cls_name, ids in deletes.items():
+                conn.executemany(
+                    'DELETE FROM "{}" WHERE id = ?'.format(cls_name), ids)
+            for cls_name, values in rows.items():
+                conn.executemany(
+                    'INSERT OR REPLACE INTO "{}" VALUES ({})'.format(
+                        cls_name, ", ".join("?" * len(values[0]))), values)
+        self.__pending.clear()
+
+    def __row(self, obj):
+        """Returns the column values of obj, in table order."""
+        attrs = obj.to_dict()
+        del attrs["__class__"]
+        row = [attrs.pop("id"), attrs.pop("created_at"),
+               attrs.pop("updated_at")]
+        for name, default in self.__columns[obj.__class__.__name__]:
+            value = attrs.get(name)
+            if type(value) is type(default):
+                del attrs[name]
+                if type(value) is list:
+                    value = json.dumps(value)
+            else:
+                value = None
+            row.append(value)
+        row.append(json.dumps(attrs) if attrs else None)
+        return row
+
+    def __attributes(self, cls_name, row):
+        """Returns the attribute dictionary stored in row."""
+        attributes = {"id": row["id"], "created_at": row["created_at"],
+                      "updated_at": row["updated_at"]}
+        for name, default in self.__columns[cls_name]:
+            value = row[name]
+            if value is not None:
+                if type(default) is list:
+                    value = json.loads(value)
+                attributes[name] = value
+        if row["extra"] is not None:
+            attributes.update(json.loads(row["extra"]))
+        return attributes
+
+    def __load(self, cls_name, row):
+        """Returns the object stored in row, building it unless it
+        was loaded before."""
+        key = "{}.{}".format(cls_name, row["id"])
+        if key in self.__objects:
+            return self.__objects[key]
+        obj = registry[cls_name](**self.__attributes(cls_name, row))
+        own(obj, self)
+        self.__objects[key] = obj
+        return obj
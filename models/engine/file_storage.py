@@ -2,66 +2,1110 @@
 """
 This module defines the FileStorage class that implements file storage.
 """
+import atexit
+import io
 import json
-from models.base_model import BaseModel
-from models.user import User
-from models.state import State
-from models.city import City
-from models.amenity import Amenity
-from models.place import Place
-from models.review import Review
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import os
+import threading
+import zlib
+from datetime import datetime
+from models.engine.json_stream import iter_items
+from models.engine.query import matches
+from models.engine.serializers import SERIALIZERS
+from models.engine.snapshot import MappedSnapshot, write_index
+from models.base_model import compact, from_records, own, registry
+
+
+def _create_temporary(path):
+    """Returns the descriptor and path of a new file next to path,
+    opened for writing with the permissions of the umask."""
+    while True:
+        tmp_path = "{}.{}".format(path, os.urandom(6).hex())
+        try:
+            fd = os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY,
+                         0o666)
+        except FileExistsError:
+            continue
+        return fd, tmp_path
+
+
+def _record(line):
+    """Returns the journal record written on line, or None if line is
+    not a whole record."""
+    if not line.endswith(b"\n"):
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def _fsync_path(path):
+    """Flushes the file or directory at path to disk."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _split(path, parts):
+    """Returns the (start, end) byte offsets of about parts ranges of
+    the file at path, each ending after a newline."""
+    size = os.path.getsize(path)
+    offsets = [0]
+    with open(path, "rb") as f:
+        for i in range(1, parts):
+            f.seek(max(size * i // parts, offsets[-1]))
+            f.readline()
+            if f.tell() >= size:
+                break
+            offsets.append(f.tell())
+    offsets.append(size)
+    return list(zip(offsets, offsets[1:]))
+
+
+def _one_per_line(f):
+    """Returns whether the JSON file f, read from its start, begins as
+    compact() writes it: one entry per line."""
+    if f.readline() != b"{\n":
+        return False
+    line = f.readline().strip().rstrip(b",")
+    if line == b"}":
+        return True
+    try:
+        json.loads(b"{" + line + b"}")
+    except ValueError:
+        return False
+    return True
+
+
+def _load_range(path, start, end, lazy=False, compact_models=False):
+    """Returns the (key, object) pairs of the entries written one per
+    line, as compact() does, between the byte offsets start and end of
+    the JSON file at path. Dictionaries are returned instead of objects
+    if lazy. Raises ValueError on an entry that is not a known class
+    stored under its own <class name>.id key."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    items = []
+    for line in data.split(b"\n"):
+        line = line.strip().rstrip(b",")
+        if line in (b"", b"{", b"}", b"{}"):
+            continue
+        (key, value), = json.loads(b"{" + line + b"}").items()
+        cls_name, _, id = key.partition(".")
+        if cls_name not in registry or type(value) is not dict or \
+                value.get("__class__") != cls_name or value.get("id") != id:
+            raise ValueError("invalid entry {} in {}".format(key, path))
+        if not lazy:
+            cls = registry[cls_name]
+            if compact_models:
+                cls = compact(cls)
+            value = cls(**value)
+        items.append((key, value))
+    return items
 
 
 class FileStorage:
     """
     Represents a file storage class that serializes instances
     to a JSON file and deserializes
-    JSON file to instances.
+    JSON file to instances. Each instance is a separate store, with
+    its own objects, caches and indexes.
     Attributes:
     __file_path(str): path to the JSON file.
-    __objects(dict): stores all objects by <class name>.id
+    __objects(dict): stores all objects by <class name>.id; in lazy
+        mode an object not accessed yet is held as its dictionary.
+    __pending(dict): mutations not yet persisted, by <class name>.id
+    __journal_size(int): records appended to the journal since the
+        last compaction.
+    __fragments(dict): serialized JSON of every clean object,
+        by <class name>.id
+    __by_class(dict): the objects of __objects by class name, then id.
+    __attr_index(dict): ids of the objects by (class name, attribute),
+        then attribute value, for the attributes a class lists in
+        its _indexes.
+    __indexed(dict): the indexed attribute values of each object,
+        by <class name>.id
+    __undo(dict): while a transaction is open, the state of every
+        object it changed as of begin(), by <class name>.id
+    __pending_before(dict): __pending as of begin().
+    __dirty(set): in a sharded layout, the (class name, partition)
+        shards with journal records not folded into their file yet.
+    __loaded(set): in a sharded layout, the names of the classes
+        read from their files.
+    __snapshots(dict): the memory-mapped Columns of each file last
+        read or written by a serializer that can open it, by path.
+    __view(MappedSnapshot): in mapped mode, the JSON file mapped in
+        memory with its index, until the objects not accessed yet are
+        read from it; None otherwise.
+    __tombstones(set): the keys of the objects of __view deleted by a
+        record already appended to the journal.
+    __deferred(bool): whether reload() is left by defer() to the
+        first method that uses the objects.
     """
 
-    __file_path = "file.json"
-    __objects = {}
+    def __init__(self, *, path="file.json", journal=False,
+                 compact_every=1000, chunk_size=1 << 16, lazy=False,
+                 compact=False, fsync="always", workers=1, shards=None,
+                 format="json", mapped=False):
+        """Initializes the storage engine, with no objects.
+        Args:
+            path(str): path to the JSON file.
+            journal(bool): when True, save() appends one record per
+                mutation to <__file_path>.journal instead of rewriting
+                the whole JSON file.
+            compact_every(int): number of journal records after which
+                the journal is folded back into the JSON file.
+            chunk_size(int): characters read at a time by reload().
+            lazy(bool): when True, reload() keeps each object as its
+                dictionary until it is first accessed.
+            compact(bool): when True, objects are built from the file
+                as slots-backed instances of compact(<class>).
+            fsync(str or int): when written files reach the disk:
+                "always" before save() returns, "never" when the
+                operating system decides, or a number of milliseconds
+                after which a background thread syncs them, until
+                close().
+            workers(int): number of processes reload() splits the
+                JSON file across, when it was written by compact();
+                1 reads it in this process.
+            shards(int): when set, each class is stored in its own
+                <root>.<class name><ext> file next to __file_path, or
+                split by a hash of the ids into that many
+                <root>.<class name>.<n><ext> files. Only the files of
+                changed objects are rewritten.
+            format(str): the format compact() writes the files in,
+                "json" or the name of a serializer in SERIALIZERS.
+                reload() reads either; the journal is always JSON.
+            mapped(bool): when True, compact() also writes the offset
+                of each object in the JSON file to <__file_path>.index,
+                and reload() maps the file in memory instead of reading
+                it: get() and count() decode only the objects they need,
+                and the others are read when a method needs them all.
+        """
+        self.__journal = journal
+        self.__compact_every = compact_every
+        self.__chunk_size = chunk_size
+        self.__lazy = lazy
+        self.__compact = compact
+        self.__workers = workers
+        if shards is not None and (type(shards) is not int or shards < 1):
+            raise ValueError("shards must be a positive number")
+        self.__shards = shards
+        if format != "json" and format not in SERIALIZERS:
+            raise ValueError("unknown format {!r}".format(format))
+        self.__format = format
+        if mapped and (shards is not None or format != "json"):
+            raise ValueError("mapped needs a single JSON file")
+        self.__mapped = mapped
+        if fsync not in ("always", "never") and \
+                (type(fsync) is not int or fsync <= 0):
+            raise ValueError("fsync must be 'always', 'never' or a "
+                             "positive number of milliseconds")
+        self.__fsync = fsync
+        self.__unsynced = set()
+        self.__sync_lock = threading.Lock()
+        self.__syncer = None
+        self.__stop = None
+        self.__file_path = path
+        self.__forget()
+
+    def __forget(self):
+        """Empties the objects and every view and cache of them."""
+        self.__objects = {}
+        self.__pending = {}
+        self.__journal_size = 0
+        self.__fragments = {}
+        self.__by_class = {}
+        self.__attr_index = {}
+        self.__indexed = {}
+        self.__undo = None
+        self.__pending_before = {}
+        self.__dirty = set()
+        self.__loaded = set()
+        self.__snapshots = {}
+        self.__view = None
+        self.__tombstones = set()
+        self.__deferred = False
+
+    def defer(self, path=None):
+        """Forgets every object and sets __file_path to path if given;
+        the objects are then reloaded by the first method that uses
+        them."""
+        if path is not None:
+            self.__file_path = path
+        self.__forget()
+        self.__deferred = True
+
+    def __load(self):
+        """Runs the reload() left by defer(), if any."""
+        if self.__deferred:
+            self.reload()
+
+    def all(self, cls=None):
+        """Returns the dictionary __objects, or a dictionary of the
+        objects of class cls (or class name) only."""
+        self.__thaw()
+        if cls is None:
+            for key, value in self.__objects.items():
+                if type(value) is dict:
+                    self.__materialize(key, value)
+            return self.__objects
+        if type(cls) is not str:
+            cls = cls.__name__
+        objects = {}
+        for id, value in self.__by_class.get(cls, {}).items():
+            key = "{}.{}".format(cls, id)
+            if type(value) is dict:
+                value = self.__materialize(key, value)
+            objects[key] = value
+        return objects
+
+    def objects(self, cls=None, after=None):
+        """Yields every object, or the objects of class cls (or class
+        name) only, one at a time in the order they were added,
+        starting after the object with key after (<class name>.id).
+        Objects not accessed yet in lazy mode are built as they are
+        yielded."""
+        self.__thaw()
+        if cls is None:
+            items = self.__objects.items()
+            prefix = ""
+        else:
+            if type(cls) is not str:
+                cls = cls.__name__
+            items = self.__by_class.get(cls, {}).items()
+            prefix = cls + "."
+        skipping = after is not None
+        for key, value in items:
+            key = prefix + key
+            if skipping:
+                skipping = key != after
+                continue
+            if type(value) is dict:
+                value = self.__materialize(key, value)
+            yield value
 
-    def all(self):
-        """Returns the dictionary __objects."""
-        return FileStorage.__objects
+    def records(self, cls=None):
+        """Yields the to_dict() dictionary of every object, or of the
+        objects of class cls (or class name) only, one at a time.
+        Objects not accessed yet in lazy mode are not built."""
+        self.__thaw()
+        if cls is None:
+            values = self.__objects.values()
+        else:
+            if type(cls) is not str:
+                cls = cls.__name__
+            values = self.__by_class.get(cls, {}).values()
+        for value in values:
+            yield value if type(value) is dict else value.to_dict()
+
+    def count(self, cls=None):
+        """Returns the number of objects, or of objects of class cls
+        (or class name) only. In mapped mode, the objects not accessed
+        yet are counted by the index."""
+        self.__load()
+        if cls is not None and type(cls) is not str:
+            cls = cls.__name__
+        view = self.__view
+        if view is not None:
+            prefix = "" if cls is None else cls + "."
+            deleted = self.__tombstones.union(
+                key for key, op in self.__pending.items() if op == "delete")
+            return view.count(cls) + sum(
+                1 for key in self.__objects
+                if key.startswith(prefix) and key not in view) - sum(
+                1 for key in deleted if key.startswith(prefix) and
+                key in view)
+        if cls is None:
+            return len(self.__objects)
+        return len(self.__by_class.get(cls, ()))
+
+    def find(self, cls, **equals):
+        """Returns a dictionary of the objects of class cls (or class
+        name) whose attributes equal the given values."""
+        return {"{}.{}".format(obj.__class__.__name__, obj.id): obj
+                for obj in self.select(cls, [(attr, "=", value)
+                                             for attr, value
+                                             in equals.items()])}
+
+    def select(self, cls, conditions=()):
+        """Yields the objects of class cls (or class name) meeting every
+        (attribute, operator, value) condition, see query.matches().
+        Equalities on attributes listed in the class's _indexes are
+        looked up in their index; otherwise the class is scanned once.
+        Objects not accessed yet in lazy mode are only built if their
+        dictionary meets the conditions."""
+        self.__thaw()
+        if type(cls) is not str:
+            cls = cls.__name__
+        objects = self.__by_class.get(cls, {})
+        ids = None
+        for attr, op, value in conditions:
+            index = self.__attr_index.get((cls, attr))
+            if op == "=" and index is not None:
+                try:
+                    found = index.get(value, set())
+                except TypeError:
+                    continue
+                ids = found if ids is None else ids & found
+        ids = objects if ids is None else list(ids)
+
+        for id in ids:
+            value = objects[id]
+            if type(value) is dict:
+                def get(attr):
+                    if attr in ("created_at", "updated_at"):
+                        return datetime.fromisoformat(value[attr])
+                    return value.get(attr,
+                                     registry[cls]._schema.defaults.get(attr))
+                if not matches(get, conditions):
+                    continue
+                value = self.__materialize("{}.{}".format(cls, id), value)
+            elif not matches(lambda attr: getattr(value, attr, None),
+                             conditions):
+                continue
+            yield value
+
+    def scan(self, cls, attrs):
+        """Returns the values of the attributes attrs of every object of
+        class cls (or class name), as getattr() would return them or
+        None, by attribute in columns of the same length and order.
+        When the objects of the class are those of its columnar files,
+        the columns are read from the memory-mapped files without
+        building the objects, and numbers are arrays over the files."""
+        self.__thaw()
+        if type(cls) is not str:
+            cls = cls.__name__
+        if self.__shards is None:
+            paths = [self.__file_path]
+        else:
+            paths = [self.__path((cls, partition))
+                     for partition in range(self.__shards)]
+        snapshots = [self.__snapshots.get(path) for path in paths]
+        if None not in snapshots and self.__journal_size == 0 and \
+                (self.__shards is None or cls in self.__loaded) and \
+                not any(key.partition(".")[0] == cls
+                        for key in self.__pending):
+            if len(snapshots) == 1:
+                return {attr: snapshots[0].column(cls, attr)
+                        for attr in attrs}
+            return {attr: [value for snapshot in snapshots
+                           for value in snapshot.column(cls, attr)]
+                    for attr in attrs}
+
+        schema = registry[cls]._schema if cls in registry else None
+        columns = {attr: [] for attr in attrs}
+        for value in self.__by_class.get(cls, {}).values():
+            for attr, column in columns.items():
+                if type(value) is not dict:
+                    column.append(getattr(value, attr, None))
+                elif attr in schema.datetimes and attr in value:
+                    column.append(datetime.fromisoformat(value[attr]))
+                else:
+                    column.append(value.get(attr,
+                                            schema.defaults.get(attr)))
+        return columns
+
+    def __build(self, value):
+        """Returns the object described by the dictionary value, held
+        by this storage."""
+        cls = registry[value["__class__"]]
+        if self.__compact:
+            cls = compact(cls)
+        obj = cls(**value)
+        own(obj, self)
+        return obj
+
+    def __index(self, cls_name, id, obj):
+        """Moves the object (or its dictionary) with id into the
+        attribute indexes matching its current values."""
+        attrs = registry[cls_name]._indexes
+        if not attrs:
+            return
+        key = "{}.{}".format(cls_name, id)
+        old = self.__indexed.get(key, {})
+        current = {}
+        for attr in attrs:
+            if type(obj) is dict:
+                current[attr] = obj.get(
+                    attr, registry[cls_name]._schema.defaults[attr])
+            else:
+                current[attr] = getattr(obj, attr)
+            if attr in old and old[attr] == current[attr]:
+                continue
+            index = self.__attr_index.setdefault((cls_name, attr), {})
+            if attr in old:
+                self.__discard(index, old[attr], id)
+            try:
+                index.setdefault(current[attr], set()).add(id)
+            except TypeError:
+                # unhashable values are left out of the index
+                del current[attr]
+        self.__indexed[key] = current
+
+    def __unindex(self, cls_name, id):
+        """Removes the object with id from the attribute indexes."""
+        old = self.__indexed.pop("{}.{}".format(cls_name, id), {})
+        for attr, value in old.items():
+            self.__discard(self.__attr_index[(cls_name, attr)],
+                           value, id)
+
+    @staticmethod
+    def __discard(index, value, id):
+        """Removes id from the ids indexed under value."""
+        ids = index.get(value)
+        if ids is not None:
+            ids.discard(id)
+            if not ids:
+                del index[value]
+
+    def get(self, cls, id):
+        """Returns the object of class cls (or class name) with id,
+        or None if there is none."""
+        self.__load()
+        if type(cls) is not str:
+            cls = cls.__name__
+        key = "{}.{}".format(cls, id)
+        value = self.__objects.get(key)
+        if value is None and self.__view is not None:
+            value = self.__touch(key)
+        if type(value) is dict:
+            return self.__materialize(key, value)
+        return value
+
+    def __materialize(self, key, value):
+        """Builds the object held as a dictionary at key."""
+        obj = self.__build(value)
+        self.__objects[key] = obj
+        self.__by_class[value["__class__"]][obj.id] = obj
+        return obj
 
     def new(self, obj):
         """Sets in __objects the obj with key <obj class name>.id."""
+        self.__load()
         obj_cls_name = obj.__class__.__name__
-        FileStorage.__objects["{}.{}".format(obj_cls_name, obj.id)] = obj
+        key = "{}.{}".format(obj_cls_name, obj.id)
+        self.__remember(key)
+        own(obj, self)
+        self.__tombstones.discard(key)
+        if self.__pending.get(key) == "new" or \
+                key not in self.__objects:
+            self.__pending[key] = "new"
+        else:
+            self.__pending[key] = "update"
+        self.__objects[key] = obj
+        self.__by_class.setdefault(obj_cls_name, {})[obj.id] = obj
+        self.__index(obj_cls_name, obj.id, obj)
+        self.__fragments.pop(key, None)
+
+    def bulk_load(self, cls, records, batch_size=1000):
+        """Adds the objects of class cls (or class name) built from an
+        iterable of attribute dictionaries by from_records(), batch_size
+        at a time, then saves once. Returns the number of objects."""
+        if type(cls) is str:
+            cls = registry[cls]
+        if self.__compact:
+            cls = compact(cls)
+        count = 0
+        for obj in from_records(cls, records, batch_size):
+            self.new(obj)
+            count += 1
+        self.save()
+        return count
+
+    def will_change(self, obj):
+        """Records the state of a stored obj before one of its
+        attributes is set, if a transaction is open."""
+        if self.__undo is None:
+            return
+        key = "{}.{}".format(obj.__class__.__name__,
+                             getattr(obj, "id", None))
+        if self.__objects.get(key) is obj:
+            self.__remember(key)
+
+    def mark_dirty(self, obj):
+        """Flags a stored obj as changed so the next save()
+        serializes it again."""
+        key = "{}.{}".format(obj.__class__.__name__,
+                             getattr(obj, "id", None))
+        if self.__objects.get(key) is not obj:
+            return
+        if self.__pending.get(key) != "new":
+            self.__pending[key] = "update"
+        self.__fragments.pop(key, None)
+        self.__index(obj.__class__.__name__, obj.id, obj)
+
+    def delete(self, obj=None):
+        """Deletes obj from __objects if it's inside."""
+        if obj is None:
+            return
+        self.__load()
+        key = "{}.{}".format(obj.__class__.__name__, obj.id)
+        if key in self.__objects:
+            self.__remember(key)
+            del self.__objects[key]
+            del self.__by_class[obj.__class__.__name__][obj.id]
+            self.__unindex(obj.__class__.__name__, obj.id)
+            self.__fragments.pop(key, None)
+            self.__pending[key] = "delete"
 
     def save(self):
-        """Serializes __objects to the JSON file (path: __file_path)."""
-        data = {}
-
-        for key, value in FileStorage.__objects.items():
-            data[key] = value.to_dict()
-
-        with open(FileStorage.__file_path, "w") as f:
-            json.dump(data, f)
-
-    def reload(self):
-        """Deserializes the JSON file to __objects only if
-        __file_path exists."""
-        class_dict = {
-                "BaseModel": BaseModel,
-                "User": User,
-                "State": State,
-                "City": City,
-                "Amenity": Amenity,
-                "Place": Place,
-                "Review": Review
-                }
-        obj = {}
+        """Serializes __objects to the JSON file (path: __file_path),
+        or appends the pending mutations to the journal.
+        Does nothing while a transaction is open."""
+        self.__load()
+        if self.__undo is not None:
+            return
+        if self.__journal:
+            self.__append_journal()
+        else:
+            self.compact()
+
+    def begin(self):
+        """Opens a transaction: save() is deferred until commit() and
+        rollback() restores the objects to their current state."""
+        self.__load()
+        if self.__undo is not None:
+            raise ValueError("a transaction is already open")
+        self.__undo = {}
+        self.__pending_before = dict(self.__pending)
+
+    def commit(self):
+        """Closes the open transaction and saves its changes."""
+        if self.__undo is None:
+            raise ValueError("no transaction is open")
+        self.__undo = None
+        self.__pending_before = {}
+        self.save()
+
+    def rollback(self):
+        """Closes the open transaction and undoes its changes."""
+        if self.__undo is None:
+            raise ValueError("no transaction is open")
+        undo, self.__undo = self.__undo, None
+        for key, before in undo.items():
+            cls_name, _, id = key.partition(".")
+            if key in self.__objects:
+                del self.__objects[key]
+                del self.__by_class[cls_name][id]
+                self.__unindex(cls_name, id)
+            if before is not None:
+                value, attributes = before
+                if attributes is not None:
+                    for name in list(value._attributes()):
+                        object.__delattr__(value, name)
+                    value._load(attributes)
+                self.__objects[key] = value
+                self.__by_class.setdefault(cls_name, {})[id] = value
+                self.__index(cls_name, id, value)
+            self.__fragments.pop(key, None)
+        self.__pending = self.__pending_before
+        self.__pending_before = {}
+
+    @contextmanager
+    def transaction(self):
+        """Runs the body of a with statement in a transaction that is
+        committed at its end, or rolled back if it raises."""
+        self.begin()
         try:
-            with open(FileStorage.__file_path, "r") as f:
-                json_data = json.load(f)
-                for key, value in json_data.items():
-                    obj[key] = class_dict[value["__class__"]](**value)
-                FileStorage.__objects = obj
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def __remember(self, key):
+        """Records the state of the object at key as of begin(), the
+        first time the open transaction changes it."""
+        undo = self.__undo
+        if undo is None or key in undo:
+            return
+        value = self.__objects.get(key)
+        if value is None:
+            undo[key] = None
+        elif type(value) is dict:
+            undo[key] = (value, None)
+        else:
+            attributes = {}
+            for name, attr in value._attributes().items():
+                if type(attr) in (list, dict):
+                    attr = attr.copy()
+                attributes[name] = attr
+            undo[key] = (value, attributes)
+
+    def compact(self):
+        """Rewrites the file from __objects and drops the journal.
+        In a sharded layout, only the files of the shards changed
+        since they were last written are rewritten, after reading the
+        objects of their classes if they were not loaded yet.
+        Raises ValueError while a transaction is open."""
+        if self.__undo is not None:
+            raise ValueError("a transaction is open")
+        self.__thaw()
+        if self.__shards is None:
+            self.__write(self.__file_path, self.__objects)
+        else:
+            shards = self.__dirty | {
+                self.__shard(key) for key in self.__pending}
+            names = {cls_name for cls_name, partition in shards}
+            self.__load_missing(names)
+            keys = {shard: [] for shard in shards}
+            for cls_name in names:
+                for id in self.__by_class.get(cls_name, {}):
+                    key = "{}.{}".format(cls_name, id)
+                    shard = self.__shard(key)
+                    if shard in keys:
+                        keys[shard].append(key)
+            for shard, shard_keys in keys.items():
+                self.__write(self.__path(shard), shard_keys)
+        self.__dirty = set()
+        self.__pending.clear()
+        self.__journal_size = 0
+
+    def __write(self, path, keys):
+        """Replaces the file at path by the objects at keys and drops
+        its journal. In JSON, clean objects are written from their
+        cached fragment, one object per line, followed in mapped mode
+        by the offset index of the file."""
+        if self.__format == "json":
+            entries = self.__replace(path, "w",
+                                     lambda f: self.__write_json(f, keys))
+        else:
+            self.__replace(path, "wb", lambda f: SERIALIZERS[
+                self.__format].dump(f, ((key, self.__objects[key])
+                                        for key in keys)))
+        self.__opened(path, SERIALIZERS.get(self.__format))
+        if self.__mapped:
+            stat = os.stat(path)
+            self.__replace(path + ".index", "wb", lambda f: write_index(
+                f, entries, stat.st_size, stat.st_mtime_ns))
+
+        try:
+            os.remove(path + ".journal")
         except FileNotFoundError:
             pass
+
+    def __replace(self, path, mode, write):
+        """Returns write(f) called on a temporary file opened in mode,
+        which then replaces the file at path, so a failed write leaves
+        it intact."""
+        fd, tmp_path = _create_temporary(path)
+        try:
+            try:
+                os.chmod(tmp_path, os.stat(path).st_mode)
+            except FileNotFoundError:
+                pass
+            with os.fdopen(fd, mode) as f:
+                result = write(f)
+                f.flush()
+                if self.__fsync == "always":
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self.__synced(path, replaced=True)
+        return result
+
+    def __write_json(self, f, keys):
+        """Writes the JSON object of the objects at keys to f. Returns
+        the (key, offset, length) of each value in mapped mode."""
+        entries = [] if self.__mapped else None
+        offset = 0
+        separator = "{\n"
+        for key in keys:
+            head = "{}{}: ".format(separator, json.dumps(key))
+            fragment = self.__fragment(key)
+            f.write(head)
+            f.write(fragment)
+            if entries is not None:
+                # JSON is written in ASCII, one byte per character
+                offset += len(head)
+                entries.append((key, offset, len(fragment)))
+                offset += len(fragment)
+            separator = ",\n"
+        f.write("{}" if separator == "{\n" else "\n}\n")
+        return entries
+
+    def convert(self, format):
+        """Rewrites every file in format, which save() then keeps
+        writing, after reading the classes not loaded yet.
+        Raises ValueError while a transaction is open."""
+        self.__load()
+        if format != "json" and format not in SERIALIZERS:
+            raise ValueError("unknown format {!r}".format(format))
+        if self.__undo is not None:
+            raise ValueError("a transaction is open")
+        self.__format = format
+        if self.__shards is not None:
+            self.__load_missing(registry)
+            self.__dirty = {(cls_name, partition)
+                            for cls_name in registry
+                            for partition in range(self.__shards)}
+        self.compact()
+
+    def __opened(self, path, serializer):
+        """Keeps the Columns of the file at path, just read or written
+        by serializer, if it can open the file in place."""
+        if hasattr(serializer, "open"):
+            self.__snapshots[path] = serializer.open(path)
+        else:
+            self.__snapshots.pop(path, None)
+
+    def __shard(self, key):
+        """Returns the (class name, partition) shard holding the object
+        at key, or None without sharding."""
+        if self.__shards is None:
+            return None
+        cls_name, _, id = key.partition(".")
+        return cls_name, zlib.crc32(id.encode()) % self.__shards
+
+    def __path(self, shard):
+        """Returns the path of the file of shard."""
+        if shard is None:
+            return self.__file_path
+        root, ext = os.path.splitext(self.__file_path)
+        cls_name, partition = shard
+        if self.__shards == 1:
+            return "{}.{}{}".format(root, cls_name, ext)
+        return "{}.{}.{}{}".format(root, cls_name, partition, ext)
+
+    def __append_journal(self):
+        """Appends one record per pending mutation to the journal of
+        its file."""
+        if not self.__pending:
+            return
+        lines = {}
+        for key, op in self.__pending.items():
+            shard = self.__shard(key)
+            if op == "delete":
+                line = '{{"op": "delete", "key": {}}}\n'.format(
+                    json.dumps(key))
+            else:
+                line = '{{"op": "{}", "key": {}, "value": {}}}\n'.format(
+                    op, json.dumps(key), self.__fragment(key))
+            lines.setdefault(shard, []).append(line)
+
+        for shard, shard_lines in lines.items():
+            path = self.__path(shard) + ".journal"
+            with open(path, "a") as f:
+                f.writelines(shard_lines)
+                f.flush()
+                if self.__fsync == "always":
+                    os.fsync(f.fileno())
+            self.__synced(path)
+            self.__journal_size += len(shard_lines)
+        if self.__shards is not None:
+            self.__dirty.update(lines)
+
+        if self.__view is not None:
+            self.__tombstones.update(key for key, op in self.__pending.items()
+                                     if op == "delete")
+        self.__pending.clear()
+        if self.__journal_size >= self.__compact_every:
+            self.compact()
+
+    def sync(self):
+        """Syncs the files written since the last sync to disk."""
+        with self.__sync_lock:
+            paths, self.__unsynced = self.__unsynced, set()
+        for path in paths:
+            try:
+                _fsync_path(path)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        """Stops the background thread of the interval fsync policy,
+        then syncs the files written since the last sync. A later save
+        starts the thread again."""
+        with self.__sync_lock:
+            syncer, self.__syncer = self.__syncer, None
+        if syncer is not None:
+            self.__stop.set()
+            syncer.join()
+            atexit.unregister(self.sync)
+        self.sync()
+
+    def __synced(self, path, replaced=False):
+        """Syncs path as the fsync policy says, once it was written.
+        A replaced file also needs its directory entry synced."""
+        if self.__fsync == "always":
+            if replaced:
+                _fsync_path(os.path.dirname(path) or ".")
+            return
+        if self.__fsync == "never":
+            return
+        with self.__sync_lock:
+            self.__unsynced.add(path)
+            if replaced:
+                self.__unsynced.add(os.path.dirname(path) or ".")
+            if self.__syncer is None:
+                self.__stop = threading.Event()
+                self.__syncer = threading.Thread(
+                    target=self.__sync_loop, args=(self.__stop,),
+                    daemon=True)
+                self.__syncer.start()
+                atexit.register(self.sync)
+
+    def __sync_loop(self, stop):
+        """Syncs the written files every __fsync milliseconds, until
+        stop is set."""
+        while not stop.wait(self.__fsync / 1000):
+            self.sync()
+
+    def __fragment(self, key):
+        """Returns the serialized JSON of the object at key, encoding
+        it only if it changed since it was last written."""
+        fragment = self.__fragments.get(key)
+        if fragment is None:
+            value = self.__objects[key]
+            if type(value) is not dict:
+                value = value.to_dict()
+            fragment = json.dumps(value)
+            self.__fragments[key] = fragment
+        return fragment
+
+    def __load_parallel(self, paths):
+        """Returns the objects of the JSON files at paths, as written by
+        compact(), decoded and built by __workers processes that each
+        read one range of the lines of a file."""
+        tasks = []
+        for path in paths:
+            for start, end in _split(path,
+                                     max(1, self.__workers // len(paths))):
+                tasks.append((path, start, end, self.__lazy, self.__compact))
+        with ProcessPoolExecutor(min(self.__workers, len(tasks))) as pool:
+            obj = {}
+            for items in pool.map(_load_range, *zip(*tasks)):
+                obj.update(items)
+        if not self.__lazy:
+            for value in obj.values():
+                own(value, self)
+        return obj
+
+    def __read(self, names):
+        """Returns the objects of the files of the classes named names
+        (of the JSON file without sharding) with their journals
+        replayed, or None if there are no such files, the number of
+        journal records and the set of shards with a journal."""
+        def build(value):
+            if self.__lazy:
+                return value
+            return self.__build(value)
+
+        def stream(f):
+            text = io.TextIOWrapper(f, encoding="utf-8")
+            for key, value in iter_items(text, self.__chunk_size):
+                obj[key] = build(value)
+
+        if self.__shards is None:
+            shards = [None]
+        else:
+            shards = [(cls_name, partition) for cls_name in names
+                      for partition in range(self.__shards)]
+        paths = [self.__path(shard) for shard in shards]
+        obj = None
+        parallel = []
+        for path in paths:
+            try:
+                with open(path, "rb") as f:
+                    if obj is None:
+                        obj = {}
+                    head = f.read(16)
+                    f.seek(0)
+                    for serializer in SERIALIZERS.values():
+                        if head.startswith(serializer.magic):
+                            for key, value in serializer.load(f):
+                                obj[key] = build(value)
+                            self.__opened(path, serializer)
+                            break
+                    else:
+                        self.__opened(path, None)
+                        if self.__workers > 1 and _one_per_line(f):
+                            parallel.append(path)
+                            continue
+                        f.seek(0)
+                        stream(f)
+            except FileNotFoundError:
+                pass
+        if parallel:
+            try:
+                obj.update(self.__load_parallel(parallel))
+            except json.JSONDecodeError:
+                # a later line is not a whole entry after all
+                for path in parallel:
+                    with open(path, "rb") as f:
+                        stream(f)
+
+        size = 0
+        journaled = set()
+        for shard, path in zip(shards, paths):
+            try:
+                with open(path + ".journal", "rb+") as f:
+                    journaled.add(shard)
+                    if obj is None:
+                        obj = {}
+                    good = 0
+                    for line in f:
+                        record = _record(line)
+                        if record is None:
+                            if any(_record(rest) is not None
+                                   for rest in f):
+                                raise ValueError(
+                                    "corrupt record in {}.journal".format(
+                                        path))
+                            # torn write at the tail of the journal: cut
+                            # it so that new records follow the last
+                            # good one
+                            f.truncate(good)
+                            break
+                        good += len(line)
+                        if record["op"] == "delete":
+                            obj.pop(record["key"], None)
+                        else:
+                            obj[record["key"]] = build(record["value"])
+                        size += 1
+            except FileNotFoundError:
+                pass
+        return obj, size, journaled
+
+    def __rebuild(self, obj):
+        """Sets __objects to obj and the other views of it."""
+        by_class = {}
+        for key, value in obj.items():
+            cls_name, _, id = key.partition(".")
+            by_class.setdefault(cls_name, {})[id] = value
+        self.__objects = obj
+        self.__by_class = by_class
+        self.__attr_index = {}
+        self.__indexed = {}
+        for cls_name, objects in by_class.items():
+            for id, value in objects.items():
+                self.__index(cls_name, id, value)
+
+    def __touch(self, key):
+        """Returns the object (or dictionary in lazy mode) at key
+        decoded from the mapped JSON file, now held in __objects, or
+        None if there is none."""
+        if self.__pending.get(key) == "delete" or key in self.__tombstones:
+            return None
+        fragment = self.__view.fragment(key)
+        if fragment is None:
+            return None
+        value = json.loads(fragment)
+        if not self.__lazy:
+            value = self.__build(value)
+        cls_name, _, id = key.partition(".")
+        self.__objects[key] = value
+        self.__by_class.setdefault(cls_name, {})[id] = value
+        self.__index(cls_name, id, value)
+        self.__fragments[key] = fragment
+        return value
+
+    def __thaw(self):
+        """Reads the objects of the mapped JSON file not accessed yet,
+        in the order of the file, keeping the objects in memory and
+        their pending mutations over them. Runs a deferred reload()
+        first."""
+        self.__load()
+        if self.__view is None:
+            return
+        self.__view = None
+        self.__tombstones = set()
+        obj = self.__read(registry)[0] or {}
+        objects = {}
+        for key, value in obj.items():
+            if self.__pending.get(key) != "delete":
+                objects[key] = self.__objects.get(key, value)
+        for key, value in self.__objects.items():
+            objects.setdefault(key, value)
+        self.__rebuild(objects)
+
+    def __load_missing(self, names):
+        """Adds the stored objects of the classes named names that were
+        not read from their files yet, keeping the objects in memory
+        and their pending mutations over them."""
+        names = set(names) - self.__loaded
+        if not names:
+            return
+        obj, size, journaled = self.__read(names)
+        self.__loaded |= names
+        for key, value in (obj or {}).items():
+            if key in self.__objects or key in self.__pending:
+                continue
+            cls_name, _, id = key.partition(".")
+            self.__objects[key] = value
+            self.__by_class.setdefault(cls_name, {})[id] = value
+            self.__index(cls_name, id, value)
+        self.__journal_size += size
+        self.__dirty |= journaled
+
+    def reload(self, *, classes=None):
+        """Deserializes the JSON file, or a snapshot written by one of
+        SERIALIZERS, to __objects only if __file_path exists, then
+        replays the journal over it.
+        Objects are built as the file is read, one entry at a time,
+        or on first access in lazy mode. With several workers, a file
+        written by compact() is decoded in parallel processes.
+        In a sharded layout, classes (names or classes) limits the
+        reload to the objects of those classes; the others are left
+        as they are, and read from their files before these are
+        rewritten."""
+        if classes is None:
+            names = set(registry)
+        elif self.__shards is None:
+            raise ValueError("reloading some classes only needs shards")
+        else:
+            names = {cls if type(cls) is str else cls.__name__
+                     for cls in classes}
+
+        self.__deferred = False
+        self.__view = None
+        self.__tombstones = set()
+        if self.__mapped and \
+                not os.path.exists(self.__file_path + ".journal"):
+            view = MappedSnapshot.open(self.__file_path)
+            if view is not None:
+                self.__rebuild({})
+                self.__fragments.clear()
+                self.__pending.clear()
+                self.__journal_size = 0
+                self.__view = view
+                return
+
+        obj, size, journaled = self.__read(names)
+        if obj is None:
+            return
+        if classes is not None:
+            kept = {key: value
+                    for key, value in self.__objects.items()
+                    if key.partition(".")[0] not in names}
+            kept.update(obj)
+            obj = kept
+        self.__rebuild(obj)
+        if classes is None:
+            self.__fragments.clear()
+            self.__pending.clear()
+            self.__loaded = names
+            self.__journal_size = size
+        else:
+            for values in (self.__fragments, self.__pending):
+                for key in list(values):
+                    if key.partition(".")[0] in names:
+                        del values[key]
+            self.__loaded |= names
+            self.__journal_size += size
+        if self.__shards is not None:
+            self.__dirty = journaled | {
+                shard for shard in self.__dirty
+                if shard[0] not in names}
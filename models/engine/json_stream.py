@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+"""
+This module defines an incremental reader for the top-level JSON
+object written by FileStorage, decoding one entry at a time.
+"""
+import json
+import re
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+class _Buffer:
+    """
+    Holds a sliding window over a text file.
+    Attributes:
+    buf(str): text read but not consumed yet.
+    pos(int): index of the next character to consume in buf.
+    """
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+
+    def fill(self):
+        """Drops the consumed text and reads the next chunk.
+        Returns False at the end of the file."""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Returns the next non-whitespace character, or an empty
+        string at the end of the file."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        """Consumes char or raises JSONDecodeError."""
+        if self.peek() != char:
+            raise json.JSONDecodeError("Expecting '{}'".format(char),
+                                       self.buf, self.pos)
+        self.pos += 1
+
+    def decode(self):
+        """Decodes the next JSON value, reading more of the file
+        until the value is complete."""
+        self.peek()
+        while True:
+            try:
+                value, self.pos = _decoder.raw_decode(self.buf, self.pos)
+                return value
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+
+
+def iter_items(f, chunk_size=1 << 16):
+    """Yields the (key, value) pairs of the JSON object in the text
+    file f. At most one entry plus chunk_size characters are held in
+    memory at a time."""
+    reader = _Buffer(f, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.decode()
+        reader.expect(":")
+        yield key, reader.decode()
+        if reader.peek() == "}":
+            return
+        reader.expect(",")
@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+"""
+This module defines the queries of the console's where command:
+conditions on the attributes of one class, an order, a page and an
+optional aggregate, run over the select() method of a storage engine.
+"""
+import heapq
+import operator
+import re
+from ast import literal_eval
+from datetime import datetime
+from itertools import islice
+
+OPERATORS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge
+}
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')|
+    (?P<number>-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)|
+    (?P<name>[A-Za-z_]\w*)|
+    (?P<op>==|!=|<=|>=|[=<>(),.])
+    )""", re.VERBOSE)
+
+
+def matches(get, conditions):
+    """Returns whether the attribute values returned by get(<name>)
+    meet every (attribute, operator, value) condition. Values that
+    cannot be compared do not match."""
+    for attr, op, value in conditions:
+        try:
+            if not OPERATORS[op](get(attr), value):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+def _tokens(text):
+    """Returns the (kind, text) tokens of a query."""
+    tokens, pos = [], 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None or match.end() == pos:
+            raise ValueError("unexpected {!r}".format(text[pos:]))
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        pos = match.end()
+    return tokens
+
+
+def _literal(kind, text):
+    """Returns the value of a string, number, True, False or None."""
+    if kind in ("string", "number") or \
+            text in ("True", "False", "None"):
+        return literal_eval(text)
+    raise ValueError("expected a value, got {!r}".format(text))
+
+
+class Query:
+    """
+    Represents a query over the objects of one class.
+    Attributes:
+    cls(str): the class name.
+    conditions(list): (attribute, operator, value) tuples that every
+        result meets; operator is a key of OPERATORS.
+    order(list): (attribute, descending) pairs to sort the results by.
+    limit(int): the maximum number of results, or None.
+    offset(int): the number of results to skip.
+    aggregate(tuple): (function, attribute) computed over the results
+        instead of returning them, or None.
+    """
+
+    AGGREGATES = ("count", "sum", "avg", "min", "max")
+
+    def __init__(self, cls, conditions=()):
+        self.cls = cls
+        self.conditions = list(conditions)
+        self.order = []
+        self.limit = None
+        self.offset = 0
+        self.aggregate = None
+
+    @classmethod
+    def parse(cls, cls_name, text):
+        """Returns the query of cls_name described by text, either
+        conditions such as 'city_id="x", price_by_night<100' or a chain
+        such as '(city_id="x").order_by("-price_by_night").limit(20)'
+        where each call is where, order_by, limit, offset or one of
+        the AGGREGATES. Raises ValueError if text is not a query."""
+        tokens = _tokens(text)
+        query = cls(cls_name)
+        if not tokens or tokens[0][1] != "(":
+            tokens = [("op", "(")] + tokens + [("op", ")")]
+        method = "where"
+        while True:
+            args, tokens = query.__arguments(tokens)
+            query.__call(method, args)
+            if not tokens:
+                return query
+            if len(tokens) < 3 or tokens[0][1] != "." or \
+                    tokens[1][0] != "name":
+                raise ValueError("expected .<method>(...)")
+            method = tokens[1][1]
+            tokens = tokens[2:]
+
+    def __arguments(self, tokens):
+        """Splits the parenthesized arguments, separated by commas or
+        not, off tokens. Returns them as a list of (name, operator,
+        value) or (None, None, value) tuples, and the remaining
+        tokens."""
+        if not tokens or tokens[0][1] != "(":
+            raise ValueError("expected (")
+        args, pos = [], 1
+        while True:
+            if pos >= len(tokens):
+                raise ValueError("expected )")
+            if tokens[pos][1] == ")":
+                return args, tokens[pos + 1:]
+            if args and tokens[pos][1] == ",":
+                # commas between arguments are optional
+                pos += 1
+                continue
+            kind, text = tokens[pos]
+            op = tokens[pos + 1][1] if pos + 2 < len(tokens) else None
+            if kind == "name" and (op in OPERATORS or op == "=="):
+                args.append((text, "=" if op == "==" else op,
+                             _literal(*tokens[pos + 2])))
+                pos += 3
+            else:
+                args.append((None, None, _literal(kind, text)))
+                pos += 1
+
+    def __call(self, method, args):
+        """Applies one call of a query chain."""
+        values = [value for name, op, value in args if name is None]
+        if method == "where":
+            if len(values) != 0:
+                raise ValueError("where takes conditions")
+            for attr, op, value in args:
+                if attr in ("created_at", "updated_at") and \
+                        type(value) is str:
+                    value = datetime.fromisoformat(value)
+                self.conditions.append((attr, op, value))
+            return
+        if len(values) != len(args):
+            raise ValueError("{} takes values".format(method))
+        if method == "order_by" and values and \
+                all(type(value) is str for value in values):
+            self.order += [(value.lstrip("-"), value.startswith("-"))
+                           for value in values]
+        elif method in ("limit", "offset") and len(values) == 1 and \
+                type(values[0]) is int and values[0] >= 0:
+            setattr(self, method, values[0])
+        elif method == "count" and not values:
+            self.aggregate = (method, None)
+        elif method in self.AGGREGATES and len(values) == 1 and \
+                type(values[0]) is str:
+            self.aggregate = (method, values[0])
+        else:
+            raise ValueError("invalid call {}()".format(method))
+
+    def run(self, storage):
+        """Returns the list of objects of storage meeting the query,
+        or the value of its aggregate. Without an order, objects are
+        read from storage.select() only until the page is full. An
+        aggregate over every object of the class reads its attribute
+        from storage.scan() instead, without the objects."""
+        function, attr = self.aggregate or (None, None)
+        if attr is not None and not self.conditions and \
+                self.limit is None and not self.offset:
+            values = storage.scan(self.cls, [attr])[attr]
+            return self.__aggregate(function, values)
+        results = storage.select(self.cls, self.conditions)
+        end = None if self.limit is None else self.offset + self.limit
+        if len(self.order) == 1 and end is not None:
+            attr, descending = self.order[0]
+            pick = heapq.nlargest if descending else heapq.nsmallest
+            results = pick(end, results, key=self.__key(attr))
+        else:
+            for attr, descending in reversed(self.order):
+                results = sorted(results, key=self.__key(attr),
+                                 reverse=descending)
+        results = islice(results, self.offset, end)
+        if self.aggregate is None:
+            return list(results)
+
+        function, attr = self.aggregate
+        if function == "count":
+            return sum(1 for obj in results)
+        return self.__aggregate(function, (getattr(obj, attr, None)
+                                           for obj in results))
+
+    @staticmethod
+    def __aggregate(function, values):
+        """Returns function (sum, avg, min or max) of the values that
+        are not None."""
+        values = [value for value in values if value is not None]
+        if function == "avg":
+            return sum(values) / len(values) if values else None
+        if function == "sum":
+            return sum(values)
+        return (min if function == "min" else max)(values, default=None)
+
+    @staticmethod
+    def __key(attr):
+        """Returns the sort key on attr, which ranks missing values
+        above every other value."""
+        def key(obj):
+            value = getattr(obj, attr, None)
+            return (value is None, value)
+        return key
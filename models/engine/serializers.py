@@ -0,0 +1,523 @@
+#!/usr/bin/python3
+"""
+This module defines the snapshot formats FileStorage can write instead
+of its JSON file, by name in SERIALIZERS. Each serializer writes the
+(key, object or dictionary) entries of a snapshot to a binary file and
+reads them back as the dictionaries to_dict() returns.
+"""
+import mmap
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from models.base_model import registry
+
+_EPOCH = datetime(1970, 1, 1)
+_ABSENT = object()
+_UINT64 = struct.Struct(">Q").unpack_from
+
+_UINT = ((0xff, 0xcc, ">B"), (0xffff, 0xcd, ">H"),
+         (0xffffffff, 0xce, ">I"), (0xffffffffffffffff, 0xcf, ">Q"))
+_INT = ((0x7f, 0xd0, ">b"), (0x7fff, 0xd1, ">h"),
+        (0x7fffffff, 0xd2, ">i"), (0x7fffffffffffffff, 0xd3, ">q"))
+
+
+def _header(out, size, fix, fix_limit, codes):
+    """Appends the header of a string, array or map of size items."""
+    if size < fix_limit:
+        out.append(fix | size)
+    elif size <= 0xff and codes[0] is not None:
+        out += bytes((codes[0], size))
+    elif size <= 0xffff:
+        out.append(codes[1])
+        out += struct.pack(">H", size)
+    elif size <= 0xffffffff:
+        out.append(codes[2])
+        out += struct.pack(">I", size)
+    else:
+        raise ValueError("too many items: {}".format(size))
+
+
+def _pack(out, value):
+    """Appends the MessagePack encoding of a JSON-like value to the
+    bytearray out."""
+    kind = type(value)
+    if kind is str:
+        data = value.encode()
+        _header(out, len(data), 0xa0, 32, (0xd9, 0xda, 0xdb))
+        out += data
+    elif value is None:
+        out.append(0xc0)
+    elif kind is bool:
+        out.append(0xc3 if value else 0xc2)
+    elif kind is int:
+        if 0 <= value <= 0x7f:
+            out.append(value)
+        elif -32 <= value < 0:
+            out.append(value & 0xff)
+        else:
+            for limit, code, fmt in _UINT if value > 0 else _INT:
+                if -limit - 1 <= value <= limit:
+                    out.append(code)
+                    out += struct.pack(fmt, value)
+                    break
+            else:
+                raise ValueError("integer out of range: {}".format(value))
+    elif kind is float:
+        out.append(0xcb)
+        out += struct.pack(">d", value)
+    elif kind in (list, tuple):
+        _header(out, len(value), 0x90, 16, (None, 0xdc, 0xdd))
+        for item in value:
+            _pack(out, item)
+    elif kind is dict:
+        _header(out, len(value), 0x80, 16, (None, 0xde, 0xdf))
+        for name, item in value.items():
+            _pack(out, name if type(name) is str else _name(name))
+            _pack(out, item)
+    else:
+        raise TypeError("cannot serialize {!r}".format(value))
+
+
+def _name(name):
+    """Returns the string a JSON object would use as key name."""
+    if name is True or name is False or name is None:
+        return {True: "true", False: "false", None: "null"}[name]
+    if type(name) in (int, float):
+        return repr(name)
+    raise TypeError("keys must be str, not {}".format(type(name).__name__))
+
+
+def _timestamp(value):
+    """Returns the microseconds since 1970-01-01 of a naive datetime,
+    or of its isoformat() string; other values are returned as they
+    are."""
+    if type(value) is str:
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    if isinstance(value, datetime) and value.tzinfo is None:
+        delta = value - _EPOCH
+        return (delta.days * 86400 + delta.seconds) * 1000000 + \
+            delta.microseconds
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _fields(schema):
+    """Returns the names of the fields of a Schema, id and the
+    timestamps first."""
+    return ["id", "created_at", "updated_at"] + [
+        name for name in schema.defaults
+        if name not in ("id", "created_at", "updated_at")]
+
+
+def _unpack(data, pos):
+    """Returns the value encoded at pos in data and the position
+    after it."""
+    code = data[pos]
+    pos += 1
+    if code <= 0x7f:
+        return code, pos
+    if code >= 0xe0:
+        return code - 0x100, pos
+    if 0xa0 <= code <= 0xbf:
+        end = pos + (code & 0x1f)
+        return str(data[pos:end], "utf-8"), end
+    if 0x90 <= code <= 0x9f:
+        return _unpack_array(data, pos, code & 0x0f)
+    if 0x80 <= code <= 0x8f:
+        return _unpack_map(data, pos, code & 0x0f)
+    if code == 0xc0:
+        return None, pos
+    if code in (0xc2, 0xc3):
+        return code == 0xc3, pos
+    if code == 0xc1:
+        return _ABSENT, pos
+    if code == 0xcb:
+        return struct.unpack_from(">d", data, pos)[0], pos + 8
+    if code in _NUMBERS:
+        fmt = _NUMBERS[code]
+        return struct.unpack_from(fmt, data, pos)[0], pos + _SIZES[fmt]
+    if code in _SIZED:
+        fmt, unpack = _SIZED[code]
+        size = struct.unpack_from(fmt, data, pos)[0]
+        pos += _SIZES[fmt]
+        if unpack is not None:
+            return unpack(data, pos, size)
+        return str(data[pos:pos + size], "utf-8"), pos + size
+    raise ValueError("invalid byte 0x{:02x} at {}".format(code, pos - 1))
+
+
+def _unpack_array(data, pos, size):
+    """Returns the list of the size values at pos in data and the
+    position after them."""
+    items = []
+    append = items.append
+    for i in range(size):
+        code = data[pos]
+        # the values of most fields, inline
+        if 0xa0 <= code <= 0xbf:
+            end = pos + 1 + (code & 0x1f)
+            append(str(data[pos + 1:end], "utf-8"))
+            pos = end
+        elif code == 0xd9:
+            end = pos + 2 + data[pos + 1]
+            append(str(data[pos + 2:end], "utf-8"))
+            pos = end
+        elif code <= 0x7f:
+            append(code)
+            pos += 1
+        elif code == 0xc1:
+            append(_ABSENT)
+            pos += 1
+        elif code == 0xcf:
+            append(_UINT64(data, pos + 1)[0])
+            pos += 9
+        else:
+            item, pos = _unpack(data, pos)
+            append(item)
+    return items, pos
+
+
+def _unpack_map(data, pos, size):
+    """Returns the dictionary of the size pairs at pos in data and the
+    position after them."""
+    items = {}
+    for i in range(size):
+        name, pos = _unpack(data, pos)
+        items[name], pos = _unpack(data, pos)
+    return items, pos
+
+
+_NUMBERS = {code: fmt for limit, code, fmt in _UINT + _INT}
+_SIZED = {0xd9: (">B", None), 0xda: (">H", None), 0xdb: (">I", None),
+          0xdc: (">H", _unpack_array), 0xdd: (">I", _unpack_array),
+          0xde: (">H", _unpack_map), 0xdf: (">I", _unpack_map)}
+_SIZES = {fmt: struct.calcsize(fmt) for fmt in set(_NUMBERS.values())}
+
+
+class BinarySerializer:
+    """
+    Writes snapshots as a stream of MessagePack arrays after magic.
+    The first object of each class is preceded by the class name, its
+    fields and which of them hold a datetime; each object is then the
+    index of its class, the value of every field (0xc1 when it is not
+    set) and a map of its other attributes. Datetimes are stored as
+    microseconds since 1970-01-01.
+    """
+
+    name = "binary"
+    magic = b"HBNB\x00\x01"
+
+    def dump(self, f, entries):
+        """Writes the (key, object or to_dict() dictionary) entries to
+        the binary file f."""
+        out = bytearray(self.magic)
+        classes = {}
+        for key, value in entries:
+            cls_name = key.partition(".")[0]
+            if type(value) is dict:
+                attributes = value
+            else:
+                attributes = value._attributes()
+            if cls_name not in classes:
+                schema = registry[cls_name]._schema
+                fields = _fields(schema)
+                classes[cls_name] = (len(classes), fields,
+                                     frozenset(schema.datetimes))
+                _pack(out, [cls_name, fields, list(schema.datetimes)])
+            index, fields, datetimes = classes[cls_name]
+            _header(out, len(fields) + 2, 0x90, 16, (None, 0xdc, 0xdd))
+            _pack(out, index)
+            for name in fields:
+                if name not in attributes:
+                    out.append(0xc1)
+                elif name in datetimes:
+                    _pack(out, _timestamp(attributes[name]))
+                else:
+                    _pack(out, attributes[name])
+            _pack(out, {name: item for name, item in attributes.items()
+                        if name not in fields and name != "__class__"})
+            if len(out) >= 1 << 16:
+                f.write(out)
+                out.clear()
+        f.write(out)
+
+    def load(self, f):
+        """Yields the (key, to_dict() dictionary) entries of the binary
+        file f. Raises ValueError if f is not such a file."""
+        data = f.read()
+        if not data.startswith(self.magic):
+            raise ValueError("not a {} snapshot".format(self.name))
+        classes = []
+        pos = len(self.magic)
+        try:
+            while pos < len(data):
+                row, pos = _unpack(data, pos)
+                if pos > len(data):
+                    raise IndexError("unexpected end of file")
+                if type(row[0]) is str:
+                    cls_name, fields, datetimes = row
+                    classes.append((cls_name, fields, datetimes))
+                    continue
+                cls_name, fields, datetimes = classes[row[0]]
+                value = {name: item
+                         for name, item in zip(fields, row[1:-1])
+                         if item is not _ABSENT}
+                for name in datetimes:
+                    item = value.get(name)
+                    if type(item) is int:
+                        value[name] = (_EPOCH + timedelta(
+                            microseconds=item)).isoformat()
+                value.update(row[-1])
+                value["__class__"] = cls_name
+                yield "{}.{}".format(cls_name, value["id"]), value
+        except (IndexError, KeyError, TypeError, struct.error) as e:
+            raise ValueError("truncated or invalid snapshot: {}".format(e))
+
+
+def _table(items):
+    """Returns the block of a table of bytes items: their number and
+    the uint64 offsets of each of them in the bytes that follow."""
+    offsets = array("Q", [0])
+    for item in items:
+        offsets.append(offsets[-1] + len(item))
+    return struct.pack("=Q", len(items)) + offsets.tobytes() + \
+        b"".join(items)
+
+
+def _column(schema, name, values):
+    """Returns the kind and the blocks of the column of the values of
+    field name (_ABSENT where it is not set), and the block of the
+    flags telling which values are set, or None if all are."""
+    present = [value is not _ABSENT for value in values]
+    given = [value for value in values if value is not _ABSENT]
+    default = schema.defaults.get(name)
+    flags = None if all(present) else bytes(present)
+    kinds = {type(value) for value in given}
+    if name in schema.datetimes:
+        stamps = [_timestamp(value) for value in given]
+        if all(type(stamp) is int for stamp in stamps):
+            stamps = iter(stamps)
+            return "time", [array("q", [
+                next(stamps) if set else 0 for set in present]).tobytes()
+            ], flags
+    elif kinds <= {int, float, str} and len(kinds) == 1 and \
+            (flags is None or type(default) in kinds):
+        kind = kinds.pop()
+        filled = [value if set else default
+                  for value, set in zip(values, present)]
+        if kind is int and all(-1 << 63 <= value < 1 << 63
+                               for value in given):
+            return "int", [array("q", filled).tobytes()], flags
+        if kind is float:
+            return "float", [array("d", filled).tobytes()], flags
+        if kind is str:
+            codes = {}
+            for value in filled:
+                codes.setdefault(value, len(codes))
+            return "str", [
+                array("i", [codes[value] for value in filled]).tobytes(),
+                _table([value.encode() for value in codes])], flags
+    packed = []
+    for value in values:
+        out = bytearray()
+        if value is _ABSENT:
+            out.append(0xc1)
+        else:
+            _pack(out, value)
+        packed.append(bytes(out))
+    return "value", [_table(packed)], flags
+
+
+class Columns:
+    """
+    Reads the columns of a snapshot written by ColumnarSerializer from
+    a buffer, such as a memory-mapped file, without copying them.
+    Attributes:
+    classes(dict): the number of objects and the (kind, blocks, flags)
+        of each column of every class in the snapshot, by class name.
+    """
+
+    def __init__(self, data):
+        self.__data = memoryview(data)
+        magic = ColumnarSerializer.magic
+        if bytes(self.__data[:len(magic)]) != magic:
+            raise ValueError("not a columnar snapshot")
+        size, = struct.unpack_from("=I", self.__data, len(magic))
+        header = _unpack(self.__data, len(magic) + 4)[0]
+        self.__start = (len(magic) + 4 + size + 7) & ~7
+        self.__swap = header["byteorder"] != sys.byteorder
+        self.classes = header["classes"]
+
+    def count(self, cls_name):
+        """Returns the number of objects of the class named cls_name."""
+        return self.classes.get(cls_name, {"count": 0})["count"]
+
+    def column(self, cls_name, name):
+        """Returns the values of attribute name of the objects of the
+        class named cls_name, as getattr() would return them: the
+        class default (or None) for objects without it. Numbers are
+        returned as an array over the buffer."""
+        schema = registry[cls_name]._schema
+        default = schema.defaults.get(name)
+        if cls_name not in self.classes:
+            return []
+        columns = self.classes[cls_name]["columns"]
+        if name not in columns:
+            extras = self.__values(cls_name, "__extras__")
+            return [extra.get(name, default) for extra in extras]
+        kind, blocks, flags = columns[name]
+        if kind in ("int", "float"):
+            return self.__array(blocks[0], "q" if kind == "int" else "d")
+        if kind == "str":
+            strings = [str(item, "utf-8")
+                       for item in self.__items(blocks[1])]
+            return [strings[code] for code in self.__array(blocks[0], "i")]
+        if kind == "time":
+            stamps = self.__array(blocks[0], "q")
+            set = [True] * len(stamps) if flags is None else \
+                self.__block(flags)
+            return [_EPOCH + timedelta(microseconds=stamp) if is_set
+                    else None for stamp, is_set in zip(stamps, set)]
+        values = self.__values(cls_name, name)
+        return [default if value is _ABSENT else value for value in values]
+
+    def rows(self, cls_name):
+        """Yields the to_dict() dictionaries of the objects of the class
+        named cls_name."""
+        if cls_name not in self.classes:
+            return
+        names = list(self.classes[cls_name]["columns"])
+        columns = [self.__values(cls_name, name) for name in names]
+        for row in zip(*columns):
+            value = {name: item for name, item in zip(names, row)
+                     if item is not _ABSENT}
+            value.update(value.pop("__extras__"))
+            value["__class__"] = cls_name
+            yield value
+
+    def __values(self, cls_name, name):
+        """Returns the list of the values of a column, _ABSENT where
+        they are not set and datetimes as isoformat() strings."""
+        kind, blocks, flags = self.classes[cls_name]["columns"][name]
+        if kind == "value":
+            values = [_unpack(item, 0)[0] for item in self.__items(blocks[0])]
+        elif kind == "time":
+            values = [(_EPOCH + timedelta(microseconds=stamp)).isoformat()
+                      for stamp in self.__array(blocks[0], "q")]
+        else:
+            values = list(self.column(cls_name, name))
+        if flags is not None:
+            values = [value if set else _ABSENT
+                      for value, set in zip(values, self.__block(flags))]
+        return values
+
+    def __block(self, block):
+        """Returns the memoryview of an (offset, size) block."""
+        offset, size = block
+        return self.__data[self.__start + offset:
+                           self.__start + offset + size]
+
+    def __array(self, block, typecode):
+        """Returns the numbers of a block, in the byte order of this
+        machine."""
+        if not self.__swap:
+            return self.__block(block).cast(typecode)
+        numbers = array(typecode, self.__block(block))
+        numbers.byteswap()
+        return numbers
+
+    def __items(self, block):
+        """Returns the list of the bytes items of a table block."""
+        data = self.__block(block)
+        count, = struct.unpack_from("=Q", data)
+        offsets = data[8:8 * (count + 2)].cast("Q")
+        if self.__swap:
+            offsets = array("Q", offsets)
+            offsets.byteswap()
+        data = data[8 * (count + 2):]
+        return [data[offsets[i]:offsets[i + 1]] for i in range(count)]
+
+
+class ColumnarSerializer:
+    """
+    Writes snapshots as typed columns, class by class. The magic is
+    followed by a MessagePack header giving the number of objects of
+    each class and, for each of its fields, the kind of the column and
+    the (offset, size) of its blocks in the data that follows:
+    int, float: the int64 or float64 array of the values;
+    time: the int64 array of the microseconds since 1970-01-01;
+    str: the int32 array of the codes of the values in a table of the
+        distinct strings;
+    value: a table of the MessagePack encoding of each value.
+    Objects without a field get the class default, and the column a
+    block of flags with a byte per object telling whether it is set.
+    Other attributes are stored in an __extras__ value column of maps.
+    """
+
+    name = "columnar"
+    magic = b"HBNB\x00\x02"
+
+    def dump(self, f, entries):
+        """Writes the (key, object or to_dict() dictionary) entries to
+        the binary file f."""
+        objects = {}
+        for key, value in entries:
+            if type(value) is not dict:
+                value = value._attributes()
+            objects.setdefault(key.partition(".")[0], []).append(value)
+        blocks, classes = [], {}
+        size = 0
+
+        def add(block):
+            nonlocal size
+            blocks.append(block + bytes(-len(block) % 8))
+            size += len(blocks[-1])
+            return [size - len(blocks[-1]), len(block)]
+
+        for cls_name, values in objects.items():
+            schema = registry[cls_name]._schema
+            fields = _fields(schema)
+            columns = {}
+            for name in fields:
+                kind, data, flags = _column(schema, name, [
+                    value.get(name, _ABSENT) for value in values])
+                columns[name] = [kind, [add(block) for block in data],
+                                 None if flags is None else add(flags)]
+            extras = [{name: item for name, item in value.items()
+                       if name not in schema.types and name != "__class__"}
+                      for value in values]
+            kind, data, flags = _column(schema, "__extras__", extras)
+            columns["__extras__"] = [kind, [add(block) for block in data],
+                                     None]
+            classes[cls_name] = {"count": len(values), "columns": columns}
+        header = bytearray()
+        _pack(header, {"byteorder": sys.byteorder, "classes": classes})
+        head = self.magic + struct.pack("=I", len(header)) + header
+        f.write(head + bytes(-len(head) % 8))
+        for block in blocks:
+            f.write(block)
+
+    def load(self, f):
+        """Yields the (key, to_dict() dictionary) entries of the
+        columnar file f. Raises ValueError if f is not such a file."""
+        try:
+            columns = Columns(f.read())
+            for cls_name in columns.classes:
+                for value in columns.rows(cls_name):
+                    yield "{}.{}".format(cls_name, value["id"]), value
+        except (IndexError, KeyError, TypeError, struct.error) as e:
+            raise ValueError("truncated or invalid snapshot: {}".format(e))
+
+    def open(self, path):
+        """Returns the Columns of the file at path, memory-mapped."""
+        with open(path, "rb") as f:
+            return Columns(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+SERIALIZERS = {serializer.name: serializer
+               for serializer in (BinarySerializer(), ColumnarSerializer())}
@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+"""
+This module defines the offset index FileStorage writes next to its
+JSON file, and MappedSnapshot, a read-only view of the file mapped in
+memory that looks objects up by key through the index without reading
+the rest of the file.
+"""
+import json
+import mmap
+import os
+import struct
+from array import array
+
+_MAGIC = b"HBNBIDX\x01"
+_HEAD = struct.Struct("=8sQqQQ")
+
+
+def write_index(f, entries, size, mtime_ns):
+    """Writes to the binary file f the index of the (key, offset,
+    length) entries of the values of a JSON file of size bytes last
+    modified at mtime_ns: the number of objects of each class, then
+    the keys sorted with the byte range of their values."""
+    entries = sorted((key.encode(), offset, length)
+                     for key, offset, length in entries)
+    classes = {}
+    for key, offset, length in entries:
+        cls_name = key.partition(b".")[0].decode()
+        classes[cls_name] = classes.get(cls_name, 0) + 1
+    counts = json.dumps(classes).encode()
+    counts += b" " * (-len(counts) % 8)
+    key_offsets = array("Q", [0])
+    for key, offset, length in entries:
+        key_offsets.append(key_offsets[-1] + len(key))
+    f.write(_HEAD.pack(_MAGIC, size, mtime_ns, len(entries), len(counts)))
+    f.write(counts)
+    f.write(key_offsets.tobytes())
+    f.write(array("Q", [offset for key, offset, length in entries])
+            .tobytes())
+    f.write(array("Q", [length for key, offset, length in entries])
+            .tobytes())
+    f.write(b"".join(key for key, offset, length in entries))
+
+
+class MappedSnapshot:
+    """
+    Represents a JSON file written by FileStorage.compact(), mapped in
+    memory read-only with its offset index.
+    Attributes:
+    classes(dict): the number of objects of each class, by class name.
+    """
+
+    def __init__(self, data, index):
+        self.__data = data
+        view = memoryview(index)
+        magic, size, mtime_ns, count, length = _HEAD.unpack_from(view)
+        pos = _HEAD.size
+        self.classes = json.loads(bytes(view[pos:pos + length]))
+        pos += length
+        self.__key_offsets = view[pos:pos + 8 * (count + 1)].cast("Q")
+        pos += 8 * (count + 1)
+        self.__offsets = view[pos:pos + 8 * count].cast("Q")
+        pos += 8 * count
+        self.__lengths = view[pos:pos + 8 * count].cast("Q")
+        pos += 8 * count
+        self.__keys = view[pos:]
+        self.__count = count
+
+    @classmethod
+    def open(cls, path):
+        """Returns the MappedSnapshot of the JSON file at path, or None
+        if it has no index matching its current content."""
+        try:
+            with open(path + ".index", "rb") as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            with open(path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(index) < _HEAD.size:
+            return None
+        magic, size, mtime_ns, count, length = _HEAD.unpack_from(index)
+        if magic != _MAGIC or size != stat.st_size or \
+                mtime_ns != stat.st_mtime_ns:
+            return None
+        return cls(data, index)
+
+    def count(self, cls_name=None):
+        """Returns the number of objects, or of objects of the class
+        named cls_name only."""
+        if cls_name is None:
+            return self.__count
+        return self.classes.get(cls_name, 0)
+
+    def __key(self, i):
+        """Returns the i-th key, encoded."""
+        return bytes(self.__keys[self.__key_offsets[i]:
+                                 self.__key_offsets[i + 1]])
+
+    def __find(self, key):
+        """Returns the position of key in the index, or None."""
+        key = key.encode()
+        low, high = 0, self.__count
+        while low < high:
+            middle = (low + high) // 2
+            if self.__key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.__count and self.__key(low) == key:
+            return low
+        return None
+
+    def __contains__(self, key):
+        return self.__find(key) is not None
+
+    def fragment(self, key):
+        """Returns the JSON text of the object at key, or None."""
+        i = self.__find(key)
+        if i is None:
+            return None
+        offset = self.__offsets[i]
+        return self.__data[offset:offset + self.__lengths[i]].decode()
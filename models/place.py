@@ -9,6 +9,8 @@ class Place(BaseModel):
     """
     Public class attributes
     """
+    _indexes = ("city_id", "user_id")
+
     city_id = ""
     user_id = ""
     name = ""
@@ -9,6 +9,8 @@ class Review(BaseModel):
     """
     public attributes
     """
+    _indexes = ("place_id", "user_id")
+
     place_id = ""
     user_id = ""
     text = ""
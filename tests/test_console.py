@@ -1,10 +1,13 @@
 #!/usr/bin/python3
 """Defines unittests for all features of console.py."""
+import json
 import os
+import shlex
 import sys
 import unittest
 from models import storage
-from console import HBNBCommand
+from console import HBNBCommand, parse_call, parse_line, parse_literal
+from console import split_words
 from models.base_model import BaseModel
 from models.user import User
 from models.state import State
@@ -47,6 +50,38 @@ class TestHBNB_prompt_and_help(unittest.TestCase):
                                                 has no help documentation.')
 
 
+class TestHBNB_parsing(unittest.TestCase):
+    """Test cases for the parsing of command lines."""
+
+    # Tests that split_words splits like shlex.split
+    def test_split_words_like_shlex(self):
+        for line in ('User 1234', 'a"b c"d e\\ f', "x 'a b' \"c\\\"d\"",
+                     'x "a\\\\b" "c\\$d"', '  ', 'tab\tsep\nnl'):
+            self.assertEqual(split_words(line), shlex.split(line))
+        with self.assertRaises(ValueError):
+            split_words('show User "1234')
+
+    # Tests that parse_line keeps the trailing dictionary or list
+    def test_parse_line(self):
+        self.assertEqual(parse_line('User "id", "name", "Betty H"'),
+                         ('User', 'id', 'name', 'Betty H'))
+        self.assertEqual(parse_line('User "id", {"age": 8}'),
+                         ('User', 'id', '{"age": 8}'))
+        self.assertEqual(parse_line('Place id amenity_ids ["a"]'),
+                         ('Place', 'id', 'amenity_ids', '["a"]'))
+        self.assertIs(parse_line('count User'), parse_line('count User'))
+
+    # Tests that parse_call returns the shape of dot-syntax lines
+    def test_parse_call(self):
+        self.assertEqual(parse_call('User.show("1234")'),
+                         ('User', 'show', '"1234"'))
+        self.assertEqual(parse_call('User.count()'), ('User', 'count', ''))
+        self.assertEqual(parse_call('Place.where(a=1).limit(2)'),
+                         ('Place', 'where', '(a=1).limit(2)'))
+        self.assertIsNone(parse_call('User.show'))
+        self.assertIsNone(parse_call('show User'))
+
+
 class TestHBNB_create_command(unittest.TestCase):
     """Test cases for the create method of the console."""
 
@@ -223,6 +258,116 @@ class TestHBNB_all_command(unittest.TestCase):
             self.assertNotIn('[Review]', output)
 
 
+class TestHBNB_all_paging(unittest.TestCase):
+    """Test cases for the paging and streaming options of all."""
+
+    def setUp(self):
+        for i in range(3):
+            Amenity()
+        storage.save()
+        self.ids = [obj.id for obj in storage.all(Amenity).values()]
+
+    # Tests that --limit and --offset print one page as a list
+    def test_limit_offset(self):
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('all Amenity --limit 2 --offset 1')
+        page = eval(f.getvalue())
+        self.assertEqual(len(page), 2)
+        self.assertIn(self.ids[1], page[0])
+        self.assertIn(self.ids[2], page[1])
+
+    # Tests that --stream prints one instance per line
+    def test_stream(self):
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('all Amenity --stream')
+        lines = f.getvalue().splitlines()
+        self.assertEqual(len(lines), len(self.ids))
+        self.assertTrue(lines[0].startswith('[Amenity] (' + self.ids[0]))
+
+    # Tests that <class>.all(<limit>, <key>) pages with a cursor
+    def test_cursor(self):
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('Amenity.all(1, "Amenity.{}")'.format(
+                self.ids[-3]))
+        page, cursor = f.getvalue().splitlines()
+        self.assertIn(self.ids[-2], page)
+        self.assertEqual(cursor, '** next: Amenity.{} **'.format(
+            self.ids[-2]))
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('Amenity.all(5, "Amenity.{}")'.format(
+                self.ids[-2]))
+        self.assertEqual(len(f.getvalue().splitlines()), 1)
+        self.assertIn(self.ids[-1], f.getvalue())
+
+    # Tests the error messages of the paging options
+    def test_paging_errors(self):
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('all --limit many')
+            HBNBCommand().onecmd('all --page 2')
+            HBNBCommand().onecmd('all Amenity --limit -1')
+            HBNBCommand().onecmd('Amenity.all(0)')
+            HBNBCommand().onecmd('Amenity.all(-1)')
+        self.assertEqual(f.getvalue().splitlines(), [
+            '** limit and offset must be integers **',
+            '** unknown option --page **'] +
+            ['** limit and offset must be integers **'] * 3)
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('all Amenity --limit 0')
+        self.assertEqual(f.getvalue(), '[]\n')
+
+
+class TestHBNB_where_command(unittest.TestCase):
+    """Test cases for the where command."""
+
+    def setUp(self):
+        self.city_id = "where-" + City().id
+        self.places = [Place(), Place(), Place()]
+        for place, price in zip(self.places, (120, 80, 40)):
+            place.city_id = self.city_id
+            place.price_by_night = price
+
+    # Tests that where filters, sorts and limits the instances
+    def test_where_chain(self):
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('Place.where(city_id="{}", '
+                                 'price_by_night<100).order_by('
+                                 '"price_by_night").limit(20)'.format(
+                                     self.city_id))
+        self.assertEqual(eval(f.getvalue()), [
+            self.places[2].__str__(), self.places[1].__str__()])
+
+    # Tests the plain form of where
+    def test_where_plain(self):
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('where Place city_id="{}" '
+                                 'price_by_night>100'.format(self.city_id))
+        self.assertEqual(eval(f.getvalue()), [self.places[0].__str__()])
+
+    # Tests that aggregates print a single value
+    def test_where_aggregates(self):
+        with patch('sys.stdout', new=StringIO()) as f:
+            for aggregate in ('count()', 'sum("price_by_night")',
+                              'avg("price_by_night")',
+                              'max("price_by_night")'):
+                HBNBCommand().onecmd('Place.where(city_id="{}").{}'.format(
+                    self.city_id, aggregate))
+        self.assertEqual(f.getvalue().splitlines(),
+                         ['3', '240', '80.0', '120'])
+
+    # Tests the error messages of the where command
+    def test_where_errors(self):
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('where')
+            HBNBCommand().onecmd('where MyModel name="x"')
+            HBNBCommand().onecmd('Place.where(name=x)')
+            HBNBCommand().onecmd('Place.where().sum("name")')
+        lines = f.getvalue().splitlines()
+        self.assertEqual(lines[:2], ['** class name missing **',
+                                     "** class doesn't exist **"])
+        self.assertTrue(lines[2].startswith('** invalid query: '))
+        self.assertTrue(lines[3].startswith('** invalid query: '))
+
+
 class TestHBNB_update_command(unittest.TestCase):
     """Test cases for the update method of the console."""
 
@@ -294,6 +439,66 @@ class TestHBNB_update_command(unittest.TestCase):
                                  .format(testId)].__dict__.keys()
         self.assertIn("attr_name", testKeys)
 
+    # Tests that a dictionary is coerced to the class attribute types
+    #  without being evaluated as code.
+    def test_update_dictionary_is_a_literal(self):
+        place = Place()
+        testCmd = "Place.update(\"{}\", {{'max_guest': '3', 'tags': ['a'], " \
+            "'pet': True}})".format(place.id)
+        with patch("sys.stdout", new=StringIO()) as f:
+            HBNBCommand().onecmd(testCmd)
+            HBNBCommand().onecmd("update Place {} {{'x': __import__('os')}}"
+                                 .format(place.id))
+            HBNBCommand().onecmd("update Place {} max_guest"
+                                 .format(place.id))
+        self.assertEqual((place.max_guest, place.tags, place.pet),
+                         (3, ["a"], True))
+        self.assertNotIn("x", place.__dict__)
+        self.assertEqual(f.getvalue().splitlines(),
+                         ["** value missing **", "** value missing **"])
+
+    # Tests that arguments after the first name and value are ignored.
+    def test_update_extra_arguments(self):
+        user = User()
+        with patch("sys.stdout", new=StringIO()) as f:
+            HBNBCommand().onecmd('update User {} first_name "Betty" extra'
+                                 .format(user.id))
+            HBNBCommand().onecmd('User.update("{}", "last_name", "Holly", '
+                                 '"y")'.format(user.id))
+        self.assertEqual((user.first_name, user.last_name),
+                         ("Betty", "Holly"))
+        self.assertNotIn("extra", user.__dict__)
+        self.assertEqual(f.getvalue(), "")
+
+    # Tests that a list attribute is set from a list literal.
+    def test_update_list_attribute(self):
+        place = Place()
+        with patch("sys.stdout", new=StringIO()) as f:
+            HBNBCommand().onecmd('update Place {} amenity_ids ["a", "b"]'
+                                 .format(place.id))
+            HBNBCommand().onecmd('update Place {} number_rooms many'
+                                 .format(place.id))
+        self.assertEqual(place.amenity_ids, ["a", "b"])
+        self.assertEqual(place.number_rooms, 0)
+        self.assertEqual(f.getvalue().strip(), "** invalid value **")
+
+    # Tests that a dictionary with keys that are not strings is rejected.
+    def test_update_dict_non_string_key(self):
+        place = Place()
+        with patch("sys.stdout", new=StringIO()) as f:
+            HBNBCommand().onecmd('Place.update("{}", {{1: 2, "name": "x"}})'
+                                 .format(place.id))
+        self.assertEqual(f.getvalue().strip(), "** invalid value **")
+        self.assertEqual(place.name, "")
+
+    # Tests that parsed literals are not shared between updates.
+    def test_parse_literal_copies(self):
+        first = parse_literal('{"tags": ["a"]}')
+        first["tags"].append("b")
+        self.assertEqual(parse_literal('{"tags": ["a"]}'), {"tags": ["a"]})
+        with self.assertRaises(ValueError):
+            parse_literal("__import__('os')")
+
 
 class TestHBNB_count_command(unittest.TestCase):
     """Test cases for count method for the console."""
@@ -341,6 +546,17 @@ class TestHBNB_count_command(unittest.TestCase):
             self.assertEqual(f.getvalue().strip(),
                              '*** Unknown syntax: Amenity')
 
+    # Tests that count prints the number of instances of a class
+    def test_count_instances(self):
+        expected = str(storage.count("Amenity") + 1)
+        Amenity()
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('Amenity.count()')
+            self.assertEqual(f.getvalue().strip(), expected)
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('count Amenity')
+            self.assertEqual(f.getvalue().strip(), expected)
+
 
 class TestHBNB_quit_and_EOF(unittest.TestCase):
     """Test cases for quit and EOF methods."""
@@ -367,5 +583,213 @@ class TestHBNB_quit_and_EOF(unittest.TestCase):
             self.assertTrue(h.do_EOF(None))
 
 
+class TestHBNB_transaction_commands(unittest.TestCase):
+    """Test cases for the begin, commit and rollback commands."""
+
+    # Tests that rollback forgets objects created after begin
+    def test_begin_rollback(self):
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('begin')
+            HBNBCommand().onecmd('create User')
+            obj_id = f.getvalue().strip()
+            HBNBCommand().onecmd('rollback')
+        self.assertIsNone(storage.get('User', obj_id))
+
+    # Tests that commit saves objects created after begin
+    def test_begin_commit(self):
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('begin')
+            HBNBCommand().onecmd('create User')
+            obj_id = f.getvalue().strip()
+            with open('file.json', 'r') as file:
+                self.assertNotIn(obj_id, file.read())
+            HBNBCommand().onecmd('commit')
+        with open('file.json', 'r') as file:
+            self.assertIn(obj_id, file.read())
+
+    # Tests the error messages of unbalanced commands
+    def test_unbalanced_commands(self):
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('commit')
+            HBNBCommand().onecmd('rollback')
+            HBNBCommand().onecmd('begin')
+            HBNBCommand().onecmd('begin')
+            HBNBCommand().onecmd('rollback')
+        self.assertEqual(f.getvalue().splitlines(), [
+            '** no transaction open **', '** no transaction open **',
+            '** transaction already open **'])
+
+
+class TestHBNB_export_command(unittest.TestCase):
+    """Test cases for the export command."""
+
+    def tearDown(self):
+        if os.path.exists("export.csv"):
+            os.remove("export.csv")
+
+    # Tests that export writes one JSON line per object of the class
+    def test_export_jsonl(self):
+        state = State()
+        state.name = "Lagos"
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('export State -')
+        records = [json.loads(line) for line in f.getvalue().splitlines()]
+        self.assertIn(state.to_dict(), records)
+        self.assertEqual(len(records), storage.count(State))
+
+    # Tests that --fields keeps only the given attributes
+    def test_export_fields(self):
+        state = State()
+        state.name = "Lagos"
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('export State --fields id,name -')
+        self.assertIn('{"id": "' + state.id + '", "name": "Lagos"}',
+                      f.getvalue().splitlines())
+
+    # Tests that a CSV export can be imported back
+    def test_export_csv_round_trip(self):
+        place = Place()
+        place.number_rooms = 3
+        place.amenity_ids = ["a1"]
+        with patch('sys.stdout', new=StringIO()):
+            HBNBCommand().onecmd('export Place --format csv export.csv')
+        with open("export.csv", "r") as file:
+            self.assertTrue(file.readline().startswith(
+                '__class__,id,created_at,updated_at,city_id,'))
+        storage.delete(place)
+        with patch('sys.stdout', new=StringIO()):
+            HBNBCommand().onecmd('import Place export.csv')
+        imported = storage.get(Place, place.id)
+        self.assertEqual(imported.to_dict(), place.to_dict())
+
+    # Tests the error messages of the export command
+    def test_export_errors(self):
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('export')
+            HBNBCommand().onecmd('export User')
+            HBNBCommand().onecmd('export MyModel -')
+            HBNBCommand().onecmd('export --format xml -')
+            HBNBCommand().onecmd('export --limit 2 -')
+        self.assertEqual(f.getvalue().splitlines(), [
+            '** file path missing **', '** file path missing **',
+            "** class doesn't exist **", '** unknown file format **',
+            '** unknown option --limit **'])
+        self.assertFalse(os.path.exists('User'))
+
+
+class TestHBNB_import_command(unittest.TestCase):
+    """Test cases for the import command."""
+
+    def tearDown(self):
+        for path in ("import.jsonl", "import.csv"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    # Tests that a JSON Lines file is imported and saved
+    def test_import_jsonl(self):
+        with open("import.jsonl", "w") as f:
+            f.write('{"id": "jl1", "name": "Nest"}\n\n{"id": "jl2"}\n')
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('import Place import.jsonl')
+        self.assertTrue(f.getvalue().startswith('2 objects imported in '))
+        self.assertEqual(storage.get('Place', 'jl1').name, 'Nest')
+        with open('file.json', 'r') as file:
+            self.assertIn('Place.jl2', file.read())
+
+    # Tests that CSV values are converted to the attribute types
+    def test_import_csv(self):
+        with open("import.csv", "w") as f:
+            f.write('id,number_rooms,latitude\ncsv1,3,1.5\ncsv2,,\n')
+        with patch('sys.stdout', new=StringIO()):
+            HBNBCommand().onecmd('import Place import.csv')
+        self.assertEqual(storage.get('Place', 'csv1').number_rooms, 3)
+        self.assertEqual(storage.get('Place', 'csv1').latitude, 1.5)
+        self.assertNotIn('number_rooms', storage.get('Place', 'csv2').__dict__)
+
+    # Tests that nothing is kept from a file with an invalid record
+    def test_import_invalid_file(self):
+        with open("import.jsonl", "w") as f:
+            f.write('{"id": "bad1"}\nnot json\n')
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('import Place import.jsonl')
+        self.assertTrue(f.getvalue().startswith('** invalid file: '))
+        self.assertIsNone(storage.get('Place', 'bad1'))
+
+    # Tests that a record that is not an object is rejected and that no
+    # transaction is left open
+    def test_import_not_object(self):
+        with open("import.jsonl", "w") as f:
+            f.write('{"id": "bad2"}\n[1, 2]\n')
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('import Place import.jsonl')
+            HBNBCommand().onecmd('rollback')
+        self.assertEqual(f.getvalue().splitlines(), [
+            '** invalid file: record is not an object: [1, 2] **',
+            '** no transaction open **'])
+        self.assertIsNone(storage.get('Place', 'bad2'))
+
+    # Tests the error messages of the import command
+    def test_import_errors(self):
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('import')
+            HBNBCommand().onecmd('import MyModel a.csv')
+            HBNBCommand().onecmd('import Place')
+            HBNBCommand().onecmd('import Place a.txt')
+            HBNBCommand().onecmd('import Place missing.csv')
+        self.assertEqual(f.getvalue().splitlines(), [
+            '** class name missing **', "** class doesn't exist **",
+            '** file path missing **', '** unknown file format **',
+            "** file doesn't exist **"])
+
+
+class TestHBNB_convert_command(unittest.TestCase):
+    """Test cases for the convert command."""
+
+    def tearDown(self):
+        with patch('sys.stdout', new=StringIO()):
+            HBNBCommand().onecmd('convert json')
+
+    # Tests that the file is rewritten in binary and read back
+    def test_convert_binary(self):
+        user = User()
+        user.first_name = "Betty"
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('convert binary')
+        self.assertEqual(f.getvalue(), '')
+        with open('file.json', 'rb') as file:
+            self.assertTrue(file.read().startswith(b'HBNB'))
+        storage.reload()
+        self.assertEqual(storage.get('User', user.id).first_name, 'Betty')
+        with patch('sys.stdout', new=StringIO()):
+            HBNBCommand().onecmd('convert json')
+        with open('file.json', 'r') as file:
+            self.assertIn('User.' + user.id, json.load(file))
+
+    # Tests the error messages of the convert command
+    def test_convert_errors(self):
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('convert')
+            HBNBCommand().onecmd('convert xml')
+        self.assertEqual(f.getvalue().splitlines(), [
+            '** format missing **', '** unknown file format **'])
+
+    # Tests that convert is refused while a transaction is open
+    def test_convert_in_transaction(self):
+        user = User()
+        user.first_name = "Betty"
+        storage.save()
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('begin')
+            HBNBCommand().onecmd(
+                'update User {} first_name "tx"'.format(user.id))
+            HBNBCommand().onecmd('convert binary')
+            HBNBCommand().onecmd('rollback')
+        self.assertEqual(f.getvalue().splitlines(), ['** transaction open **'])
+        self.assertEqual(user.first_name, 'Betty')
+        with open('file.json', 'r') as file:
+            self.assertEqual(json.load(file)['User.' + user.id]['first_name'],
+                             'Betty')
+
+
 if __name__ == "__main__":
     unittest.main()
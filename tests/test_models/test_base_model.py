@@ -5,13 +5,16 @@ Unittest classes:
     TestBaseModel_instantiation
     TestBaseModel_save
     TestBaseModel_to_dict
+    TestBaseModel_compact
+    TestBaseModel_registry
 """
 import os
 import models
 import unittest
 from datetime import datetime
 from time import sleep
-from models.base_model import BaseModel
+from models.base_model import BaseModel, compact, registry
+from models.place import Place
 
 
 class TestBaseModel_instantiation(unittest.TestCase):
@@ -73,6 +76,18 @@ class TestBaseModel_instantiation(unittest.TestCase):
         self.assertEqual(bm.created_at, dt)
         self.assertEqual(bm.updated_at, dt)
 
+    def test_instantiation_with_kwargs_without_microseconds(self):
+        dt = datetime(2023, 5, 17, 10, 30, 0)
+        bm = BaseModel(id="345", created_at=dt.isoformat(),
+                       updated_at=dt.isoformat())
+        self.assertEqual(bm.created_at, dt)
+        self.assertEqual(bm.updated_at, dt)
+
+    def test_to_dict_round_trip(self):
+        bm = BaseModel()
+        bm.created_at = bm.created_at.replace(microsecond=0)
+        self.assertEqual(BaseModel(**bm.to_dict()).to_dict(), bm.to_dict())
+
     def test_instantiation_with_None_kwargs(self):
         with self.assertRaises(TypeError):
             BaseModel(id=None, created_at=None, updated_at=None)
@@ -188,5 +203,86 @@ class TestBaseModel_to_dict(unittest.TestCase):
             bm.to_dict(None)
 
 
+class TestBaseModel_compact(unittest.TestCase):
+    """Unittests for testing the slots-backed compact classes."""
+
+    def test_same_name_and_base(self):
+        self.assertEqual(compact(Place).__name__, "Place")
+        self.assertTrue(issubclass(compact(Place), Place))
+        self.assertIs(compact(Place), compact(Place))
+
+    def test_fields_use_slots(self):
+        pl = compact(Place)()
+        pl.name = "Nest"
+        self.assertIn("name", compact(Place).__slots__)
+        self.assertEqual(pl.name, "Nest")
+        self.assertEqual(pl.to_dict()["name"], "Nest")
+
+    def test_unset_field_reads_class_default(self):
+        pl = compact(Place)()
+        self.assertEqual(pl.number_rooms, 0)
+        self.assertNotIn("number_rooms", pl.to_dict())
+        with self.assertRaises(AttributeError):
+            pl.nope
+
+    def test_overflow_attribute(self):
+        pl = compact(Place)()
+        pl.wifi = True
+        self.assertTrue(pl.wifi)
+        self.assertEqual(pl.to_dict()["wifi"], True)
+
+    def test_matches_regular_instance(self):
+        pl = Place()
+        pl.name = "Nest"
+        pl.wifi = True
+        cpl = compact(Place)(**pl.to_dict())
+        self.assertEqual(cpl.to_dict(), pl.to_dict())
+        self.assertEqual(str(cpl), str(pl))
+
+    def test_new_instance_stored_in_objects(self):
+        pl = compact(Place)()
+        self.assertIs(models.storage.get("Place", pl.id), pl)
+
+
+class TestBaseModel_registry(unittest.TestCase):
+    """Unittests for testing the model registry and schemas."""
+
+    def test_model_classes_registered(self):
+        self.assertEqual(list(registry)[:7], [
+            "BaseModel", "User", "State", "City", "Amenity", "Place",
+            "Review"])
+        self.assertIs(registry["Place"], Place)
+
+    def test_subclass_registered(self):
+        class Widget(BaseModel):
+            size = 0
+        self.addCleanup(registry.pop, "Widget")
+        self.assertIs(registry["Widget"], Widget)
+        self.assertEqual(Widget._schema.defaults, {"size": 0})
+        self.assertIs(compact(Widget)._schema, Widget._schema)
+        self.assertIs(registry["Widget"], Widget)
+
+    def test_schema_fields(self):
+        schema = Place._schema
+        self.assertEqual(schema.name, "Place")
+        self.assertEqual(schema.types["number_rooms"], int)
+        self.assertEqual(schema.types["created_at"], datetime)
+        self.assertEqual(schema.datetimes, ("created_at", "updated_at"))
+        self.assertNotIn("created_at", schema.coercers)
+
+    def test_schema_coerce(self):
+        schema = Place._schema
+        self.assertEqual(schema.coerce("number_rooms", "3"), 3)
+        self.assertEqual(schema.coerce("latitude", 2), 2.0)
+        self.assertEqual(schema.coerce("name", 5), "5")
+        self.assertEqual(schema.coerce("amenity_ids", '["a"]'), ["a"])
+        self.assertEqual(schema.coerce("amenity_ids", "['a']"), ["a"])
+        self.assertEqual(schema.coerce("wifi", "yes"), "yes")
+        with self.assertRaises(ValueError):
+            schema.coerce("number_rooms", "many")
+        with self.assertRaises(ValueError):
+            schema.coerce("amenity_ids", "a")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,223 @@
+#!/usr/bin/python3
+"""Unittests for models/engine/db_storage.py."""
+import os
+import sqlite3
+import tempfile
+import unittest
+import models
+from models.engine.db_storage import DBStorage
+from models.user import User
+from models.city import City
+from models.place import Place
+from models.review import Review
+
+
+class TestDBStorage(unittest.TestCase):
+    """Defines unittests for the SQLite storage engine."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "hbnb.db")
+        self.shared = models.storage
+        self.storage = DBStorage(path=self.path)
+        self.storage.reload()
+        models.storage = self.storage
+
+    def tearDown(self):
+        models.storage = self.shared
+        self.storage.close()
+        self.tmp.cleanup()
+
+    def reopen(self):
+        """Returns a new engine on the same database."""
+        storage = DBStorage(path=self.path)
+        storage.reload()
+        self.addCleanup(storage.close)
+        return storage
+
+    # Tests that saved objects are read back with their attributes
+    def test_save_and_reload(self):
+        place = Place()
+        place.name = "Nest"
+        place.price_by_night = 80
+        place.amenity_ids = ["a", "b"]
+        place.wifi = True
+        self.storage.save()
+        loaded = self.reopen().get(Place, place.id)
+        self.assertEqual(loaded.to_dict(), place.to_dict())
+
+    # Tests that each class has its own table with indexed foreign keys
+    def test_tables_and_indexes(self):
+        conn = sqlite3.connect(self.path)
+        self.addCleanup(conn.close)
+        indexes = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertIn("ix_Review_place_id", indexes)
+        self.assertIn("ix_City_state_id", indexes)
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    # Tests that all and count see unsaved and saved objects
+    def test_all_and_count(self):
+        user = User()
+        self.storage.save()
+        city = City()
+        self.assertEqual(self.storage.count(), 2)
+        self.assertEqual(self.storage.count(User), 1)
+        self.assertEqual(set(self.storage.all()),
+                         {"User." + user.id, "City." + city.id})
+        self.assertEqual(list(self.storage.all("City")), ["City." + city.id])
+
+    # Tests that updates are written on save
+    def test_update(self):
+        user = User()
+        self.storage.save()
+        user.first_name = "Betty"
+        self.storage.save()
+        self.assertEqual(self.reopen().get(User, user.id).first_name,
+                         "Betty")
+
+    # Tests that deleted objects are removed from the database
+    def test_delete(self):
+        user = User()
+        self.storage.save()
+        self.storage.delete(user)
+        self.assertIsNone(self.storage.get(User, user.id))
+        self.assertEqual(self.storage.count(User), 0)
+        self.storage.save()
+        self.assertIsNone(self.reopen().get("User", user.id))
+
+    # Tests that find filters on columns and on extra attributes
+    def test_find(self):
+        reviews = [Review(), Review()]
+        reviews[0].place_id = "p1"
+        reviews[0].stars = 5
+        reviews[1].place_id = "p1"
+        self.storage.save()
+        storage = self.reopen()
+        self.assertEqual(len(storage.find(Review, place_id="p1")), 2)
+        self.assertEqual(list(storage.find(Review, place_id="p1", stars=5)),
+                         ["Review." + reviews[0].id])
+        self.assertEqual(len(storage.find(Review, user_id="")), 2)
+
+    # Tests that records yields stored rows and unsaved objects
+    def test_records(self):
+        place = Place()
+        place.amenity_ids = ["a1"]
+        place.color = "red"
+        self.storage.save()
+        storage = self.reopen()
+        models.storage = storage
+        user = User()
+        records = {r["id"]: r for r in storage.records()}
+        self.assertEqual(records[place.id], place.to_dict())
+        self.assertEqual(records[user.id], user.to_dict())
+        self.assertEqual(list(storage.records(User)), [user.to_dict()])
+        storage.close()
+
+    # Tests that scan returns columns of stored and unsaved objects
+    def test_scan(self):
+        place = Place()
+        place.price_by_night = 80
+        self.storage.save()
+        storage = self.reopen()
+        models.storage = storage
+        other = Place()
+        columns = storage.scan(Place, ["price_by_night", "created_at"])
+        self.assertEqual(columns["price_by_night"], [80, 0])
+        self.assertEqual(columns["created_at"],
+                         [place.created_at, other.created_at])
+        self.assertEqual(storage.scan("Nope", ["id"]), {"id": []})
+        storage.close()
+
+    # Tests that a loaded object is saved by the storage that loaded it
+    def test_owner(self):
+        place = Place()
+        self.storage.save()
+        storage = self.reopen()
+        loaded = storage.get(Place, place.id)
+        loaded.name = "Den"
+        loaded.save()
+        self.assertEqual(self.reopen().get(Place, place.id).name, "Den")
+
+    # Tests that defer opens the database on first use only
+    def test_defer(self):
+        place = Place()
+        self.storage.save()
+        other = os.path.join(self.tmp.name, "other.db")
+        self.storage.defer(other)
+        self.assertFalse(os.path.exists(other))
+        self.assertEqual(self.storage.count(), 0)
+        self.assertTrue(os.path.exists(other))
+        user = User()
+        self.storage.save()
+        self.storage.defer(self.path)
+        self.assertIsNotNone(self.storage.get(Place, place.id))
+        self.assertIsNone(self.storage.get(User, user.id))
+
+    # Tests that objects pages by id over stored and unsaved objects
+    def test_objects(self):
+        users = [User() for i in range(4)]
+        self.storage.save()
+        self.storage.delete(users[0])
+        extra = User()
+        ids = sorted(user.id for user in users[1:] + [extra])
+        self.assertEqual([user.id for user in self.storage.objects(User)],
+                         ids)
+        after = [user.id for user in
+                 self.storage.objects(after="User." + ids[1])]
+        self.assertEqual(after[:len(ids) - 2], ids[2:])
+
+    # Tests that select filters stored and unsaved objects once each
+    def test_select(self):
+        places = [Place(), Place(), Place()]
+        for i, place in enumerate(places):
+            place.price_by_night = 50 * i
+        places[2].color = "red"
+        self.storage.save()
+        storage = self.reopen()
+        models.storage = storage
+        extra = Place()
+        found = list(storage.select(Place, [("price_by_night", "<", 60)]))
+        self.assertEqual(sorted(obj.id for obj in found),
+                         sorted([places[0].id, places[1].id, extra.id]))
+        found = list(storage.select(Place, [("color", "=", "red"),
+                                            ("price_by_night", ">", 0)]))
+        self.assertEqual([obj.id for obj in found], [places[2].id])
+        storage.close()
+
+    # Tests that values of another type than their column are selected
+    def test_select_extra_values(self):
+        place = Place()
+        place.max_guest = 2.5
+        place.name = 7
+        other = Place()
+        other.max_guest = 1
+        other.name = "Nest"
+        self.storage.save()
+        storage = self.reopen()
+        for conditions in ([("max_guest", ">", 2)], [("max_guest", "!=", 1)],
+                           [("name", "!=", "Nest")],
+                           [("max_guest", "=", 2.5)]):
+            found = list(storage.select(Place, conditions))
+            self.assertEqual([obj.id for obj in found], [place.id])
+
+    # Tests that rollback drops the changes made since begin
+    def test_transaction(self):
+        user = User()
+        user.first_name = "Betty"
+        self.storage.begin()
+        user.first_name = "Holly"
+        city = City()
+        self.storage.save()
+        self.assertIsNone(self.reopen().get(City, city.id))
+        self.storage.rollback()
+        self.assertIsNone(self.storage.get(City, city.id))
+        self.assertEqual(self.storage.get(User, user.id).first_name, "Betty")
+        with self.storage.transaction():
+            city = City()
+        self.assertIsNotNone(self.reopen().get(City, city.id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,20 @@
 #!/usr/bin/python3
 """Unittests for models/engine/file_storage.py."""
 import unittest
+import copy
+import glob
 import json
 import models
 import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import threading
 from datetime import datetime
-from models.base_model import BaseModel
+from time import sleep
+from unittest.mock import patch
+from models.base_model import BaseModel, from_records
 from models.engine.file_storage import FileStorage
 from models.user import User
 from models.state import State
@@ -72,10 +81,9 @@ class TestFileStorage_Instantiantion_and_Methods(unittest.TestCase):
                           ['BaseModel', 'User', 'State', 'City', 'Amenity',
                            'Place', 'Review'])
 
-    # Tests that all raises an exception when a None argument is passed
+    # Tests that all with a None argument returns every object
     def test_all_with_None(self):
-        with self.assertRaises(TypeError):
-            models.storage.all(None)
+        self.assertIs(models.storage.all(None), models.storage.all())
 
     # Tests that new adds a new object to __objects with correct key
     def test_new_adds_object_to_objects_with_correct_key(self):
@@ -105,12 +113,14 @@ class TestFileStorage_Instantiantion_and_Methods(unittest.TestCase):
         self.assertEqual(storage.all()[key2], obj2)
         self.assertEqual(storage.all()[key3], obj3)
 
-    # Tests that nothing is saved when __file_path does not exist
+    # Tests that save writes to the path the storage was created with
     def test_save_nonexistent_file(self):
-        storage = FileStorage()
-        storage._FileStorage__file_path = 'nonexistent.json'
+        storage = FileStorage(path='nonexistent.json')
+        self.addCleanup(os.remove, 'nonexistent.json')
         storage.save()
-        self.assertFalse(os.path.exists(storage._FileStorage__file_path))
+        self.assertTrue(os.path.exists(storage._FileStorage__file_path))
+        with open('nonexistent.json', 'r') as f:
+            self.assertEqual(json.load(f), {})
 
     # Tests that new raises an exception when a None argument is passed
     def test_new_with_None(self):
@@ -150,5 +160,1232 @@ class TestFileStorage_Instantiantion_and_Methods(unittest.TestCase):
             models.storage.reload(None)
 
 
+class IsolatedStorageTestCase(unittest.TestCase):
+    """Makes the models use a new FileStorage backed by file_path,
+    self.storage, around each test."""
+
+    file_path = "test_storage.json"
+
+    def setUp(self):
+        self.shared = models.storage
+        self.storage = self.open()
+
+    def tearDown(self):
+        for path in (self.file_path, self.file_path + ".journal"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        models.storage = self.shared
+
+    def open(self, **options):
+        """Returns a new FileStorage on file_path with options, which
+        the models use from now on."""
+        models.storage = FileStorage(path=self.file_path, **options)
+        self.options = options
+        return models.storage
+
+    def reset(self):
+        """Replaces self.storage by a new FileStorage with the options
+        of the last one opened, as in a new process."""
+        self.storage = self.open(**self.options)
+
+
+class TestFileStorage_journal(IsolatedStorageTestCase):
+    """Defines unittests for the append-only journal mode."""
+
+    file_path = "test_journal.json"
+
+    def setUp(self):
+        super().setUp()
+        self.storage = self.open(journal=True, compact_every=3)
+
+    # Tests that save appends to the journal instead of the JSON file
+    def test_save_appends_journal(self):
+        user = User()
+        self.storage.new(user)
+        self.storage.save()
+        self.assertFalse(os.path.exists("test_journal.json"))
+        with open("test_journal.json.journal", "r") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["op"], "new")
+        self.assertEqual(records[0]["key"], "User." + user.id)
+
+    # Tests that reload replays updates and deletes from the journal
+    def test_reload_replays_journal(self):
+        user = User()
+        state = State()
+        self.storage.save()
+        user.first_name = "Betty"
+        self.storage.new(user)
+        self.storage.delete(state)
+        self.storage.save()
+        self.reset()
+        self.storage.reload()
+        objects = self.storage.all()
+        self.assertEqual(objects["User." + user.id].first_name, "Betty")
+        self.assertNotIn("State." + state.id, objects)
+
+    # Tests that the journal is folded into the JSON file when it grows
+    def test_journal_compaction(self):
+        for _ in range(3):
+            self.storage.new(City())
+            self.storage.save()
+        self.assertFalse(os.path.exists("test_journal.json.journal"))
+        with open("test_journal.json", "r") as f:
+            self.assertEqual(len(json.load(f)), 3)
+
+    # Tests that a torn record at the end of the journal is ignored
+    def test_reload_ignores_torn_record(self):
+        place = Place()
+        self.storage.save()
+        with open("test_journal.json.journal", "a") as f:
+            f.write('{"op": "delete", "key": "Pla')
+        self.reset()
+        self.storage.reload()
+        self.assertIn("Place." + place.id, self.storage.all())
+
+    # Tests that records saved after a torn one are reloaded
+    def test_save_after_torn_record(self):
+        place = Place()
+        self.storage.save()
+        with open("test_journal.json.journal", "a") as f:
+            f.write('{"op": "delete", "key": "Pla')
+        self.reset()
+        self.storage.reload()
+        user = User()
+        self.storage.save()
+        self.reset()
+        self.storage.reload()
+        self.assertIn("Place." + place.id, self.storage.all())
+        self.assertIn("User." + user.id, self.storage.all())
+
+    # Tests that a bad record followed by good ones is not cut
+    def test_reload_corrupt_record(self):
+        self.storage = self.open(journal=True)
+        Place()
+        self.storage.save()
+        with open("test_journal.json.journal", "a") as f:
+            f.write('{"op": "delete", "key": "Pla')
+        User()
+        self.storage.save()
+        User()
+        self.storage.save()
+        with open("test_journal.json.journal", "rb") as f:
+            before = f.read()
+        self.reset()
+        with self.assertRaises(ValueError):
+            self.storage.reload()
+        with open("test_journal.json.journal", "rb") as f:
+            self.assertEqual(f.read(), before)
+        self.assertEqual(len(before.splitlines()), 3)
+
+
+class TestFileStorage_dirty_tracking(IsolatedStorageTestCase):
+    """Defines unittests for dirty tracking and the fragment cache."""
+
+    file_path = "test_dirty.json"
+
+    def setUp(self):
+        super().setUp()
+
+    def read(self):
+        with open("test_dirty.json", "r") as f:
+            return json.load(f)
+
+    # Tests that attribute assignment flags the object as changed
+    def test_setattr_marks_dirty(self):
+        user = User()
+        self.storage.save()
+        user.first_name = "Betty"
+        key = "User." + user.id
+        self.assertEqual(self.storage._FileStorage__pending[key], "update")
+        self.storage.save()
+        self.assertEqual(self.read()[key]["first_name"], "Betty")
+
+    # Tests that clean objects are written from their cached fragment
+    def test_clean_objects_not_reencoded(self):
+        user = User()
+        self.storage.save()
+        user.__dict__["first_name"] = "Betty"
+        self.storage.save()
+        self.assertNotIn("first_name", self.read()["User." + user.id])
+
+    # Tests that a save after BaseModel.save re-encodes the object
+    def test_model_save_marks_dirty(self):
+        user = User()
+        self.storage.save()
+        user.__dict__["first_name"] = "Betty"
+        user.save()
+        self.assertEqual(self.read()["User." + user.id]["first_name"],
+                         "Betty")
+
+    # Tests that objects outside storage are not flagged
+    def test_unstored_object_not_marked(self):
+        user = User(**User().to_dict())
+        user.first_name = "Betty"
+        self.assertNotIn("User." + user.id,
+                         [k for k, v in
+                          self.storage._FileStorage__pending.items()
+                          if v == "update"])
+
+    # Tests that the spliced file round trips through reload
+    def test_spliced_file_reloads(self):
+        users = [User() for _ in range(3)]
+        self.storage.save()
+        self.reset()
+        self.storage.reload()
+        for user in users:
+            self.assertIn("User." + user.id, self.storage.all())
+
+
+class TestFileStorage_lazy(IsolatedStorageTestCase):
+    """Defines unittests for lazy object materialization."""
+
+    file_path = "test_lazy.json"
+
+    def setUp(self):
+        super().setUp()
+        self.storage = self.open(lazy=True)
+        self.user = User()
+        self.place = Place()
+        self.storage.save()
+        self.reset()
+        self.storage.reload()
+
+    # Tests that reload does not build objects in lazy mode
+    def test_reload_keeps_dictionaries(self):
+        raw = self.storage._FileStorage__objects["User." + self.user.id]
+        self.assertIs(type(raw), dict)
+
+    # Tests that get builds only the requested object
+    def test_get_materializes_one(self):
+        user = self.storage.get("User", self.user.id)
+        self.assertIsInstance(user, User)
+        self.assertEqual(user.created_at, self.user.created_at)
+        self.assertIs(self.storage.get(User, self.user.id), user)
+        raw = self.storage._FileStorage__objects["Place." + self.place.id]
+        self.assertIs(type(raw), dict)
+
+    # Tests that get returns None for an unknown id
+    def test_get_unknown_id(self):
+        self.assertIsNone(self.storage.get("User", "nope"))
+
+    # Tests that records yields dictionaries without building objects
+    def test_records_does_not_materialize(self):
+        records = list(self.storage.records("User"))
+        self.assertEqual(records, [self.user.to_dict()])
+        raw = self.storage._FileStorage__objects["User." + self.user.id]
+        self.assertIs(type(raw), dict)
+        self.assertEqual(len(list(self.storage.records())), 2)
+
+    # Tests that objects builds each object as it is yielded
+    def test_objects_materializes_one_at_a_time(self):
+        objects = self.storage.objects()
+        first = next(objects)
+        self.assertIsInstance(first, User)
+        raw = self.storage._FileStorage__objects["Place." + self.place.id]
+        self.assertIs(type(raw), dict)
+        self.assertEqual([obj.id for obj in objects], [self.place.id])
+
+    # Tests that objects starts after the given key
+    def test_objects_after(self):
+        self.assertEqual(
+            list(self.storage.objects(after="User." + self.user.id)),
+            [self.storage.get(Place, self.place.id)])
+        self.assertEqual(
+            list(self.storage.objects(User, "User." + self.user.id)), [])
+
+    # Tests that all builds every object
+    def test_all_materializes_all(self):
+        for obj in self.storage.all().values():
+            self.assertNotIsInstance(obj, dict)
+
+    # Tests that all with a class builds only the objects of that class
+    def test_all_with_class_materializes_class(self):
+        self.assertIsInstance(
+            self.storage.all(User)["User." + self.user.id], User)
+        raw = self.storage._FileStorage__objects["Place." + self.place.id]
+        self.assertIs(type(raw), dict)
+
+    # Tests that unloaded objects are saved without being built
+    def test_save_unloaded(self):
+        self.storage.save()
+        with open("test_lazy.json", "r") as f:
+            data = json.load(f)
+        self.assertEqual(data["User." + self.user.id], self.user.to_dict())
+        raw = self.storage._FileStorage__objects["User." + self.user.id]
+        self.assertIs(type(raw), dict)
+
+
+class TestFileStorage_class_index(IsolatedStorageTestCase):
+    """Defines unittests for class-filtered access through all and count."""
+
+    def setUp(self):
+        super().setUp()
+        self.users = [User(), User()]
+        self.review = Review()
+
+    # Tests that all with a class returns only its objects
+    def test_all_with_class(self):
+        users = self.storage.all(User)
+        self.assertEqual(set(users.keys()),
+                         {"User." + user.id for user in self.users})
+        self.assertEqual(self.storage.all("Review"),
+                         {"Review." + self.review.id: self.review})
+
+    # Tests that all with a class with no objects returns an empty dict
+    def test_all_with_empty_class(self):
+        self.assertEqual(self.storage.all(Place), {})
+
+    # Tests that count returns the number of objects per class
+    def test_count(self):
+        self.assertEqual(self.storage.count(), 3)
+        self.assertEqual(self.storage.count(User), 2)
+        self.assertEqual(self.storage.count("Review"), 1)
+        self.assertEqual(self.storage.count("Nope"), 0)
+
+    # Tests that delete removes the object from its class
+    def test_delete_updates_index(self):
+        self.storage.delete(self.users[0])
+        self.assertEqual(self.storage.count(User), 1)
+        self.assertNotIn("User." + self.users[0].id,
+                         self.storage.all(User))
+
+
+class TestFileStorage_find(IsolatedStorageTestCase):
+    """Defines unittests for find and the attribute indexes."""
+
+    file_path = "test_find.json"
+
+    def setUp(self):
+        super().setUp()
+        self.place = Place()
+        self.place.city_id = "c1"
+        self.place.user_id = "u1"
+        self.reviews = [Review(), Review(), Review()]
+        for review in self.reviews:
+            review.place_id = self.place.id
+        self.reviews[2].user_id = "u1"
+
+    # Tests that find returns the objects matching an indexed attribute
+    def test_find_indexed(self):
+        found = self.storage.find(Review, place_id=self.place.id)
+        self.assertEqual(set(found.values()), set(self.reviews))
+
+    # Tests that find combines several attributes
+    def test_find_several_attributes(self):
+        found = self.storage.find("Review", place_id=self.place.id,
+                                  user_id="u1")
+        self.assertEqual(list(found.values()), [self.reviews[2]])
+
+    # Tests that find filters on attributes without an index
+    def test_find_not_indexed(self):
+        self.place.name = "Nest"
+        self.assertEqual(self.storage.find(Place, name="Nest"),
+                         {"Place." + self.place.id: self.place})
+        self.assertEqual(self.storage.find(Place, name="Other"), {})
+
+    # Tests that updates and deletes are reflected in the index
+    def test_index_follows_changes(self):
+        self.reviews[0].place_id = "elsewhere"
+        self.storage.delete(self.reviews[1])
+        found = self.storage.find(Review, place_id=self.place.id)
+        self.assertEqual(list(found.values()), [self.reviews[2]])
+        self.assertEqual(list(self.storage.find(
+            Review, place_id="elsewhere").values()), [self.reviews[0]])
+
+    # Tests that the index is rebuilt by reload, also in lazy mode
+    def test_index_rebuilt_on_reload(self):
+        self.storage.save()
+        for options in ({}, {"lazy": True}):
+            storage = self.open(**options)
+            storage.reload()
+            found = storage.find(City, state_id="")
+            self.assertEqual(found, {})
+            found = storage.find(Place, city_id="c1", user_id="u1")
+            self.assertEqual(list(found), ["Place." + self.place.id])
+
+
+class TestFileStorage_select(IsolatedStorageTestCase):
+    """Defines unittests for select."""
+
+    file_path = "test_select.json"
+
+    def setUp(self):
+        super().setUp()
+        self.storage = self.open(lazy=True)
+        self.places = [Place(), Place(), Place()]
+        for i, place in enumerate(self.places):
+            place.city_id = "c1" if i < 2 else "c2"
+            place.price_by_night = 50 * i
+
+    # Tests that select applies every operator
+    def test_select_operators(self):
+        found = self.storage.select(Place, [("city_id", "=", "c1"),
+                                            ("price_by_night", ">=", 50)])
+        self.assertEqual(list(found), [self.places[1]])
+        found = self.storage.select("Place", [("price_by_night", "<", 60),
+                                              ("city_id", "!=", "c9")])
+        self.assertEqual(list(found), self.places[:2])
+
+    # Tests that an indexed equality only visits the indexed objects
+    def test_select_uses_index(self):
+        self.storage.save()
+        self.reset()
+        self.storage.reload()
+        found = list(self.storage.select(Place, [("city_id", "=", "c2")]))
+        self.assertEqual([obj.id for obj in found], [self.places[2].id])
+        objects = self.storage._FileStorage__objects
+        self.assertIs(type(objects["Place." + self.places[0].id]), dict)
+
+    # Tests that lazy objects not meeting the conditions are not built
+    def test_select_scan_does_not_materialize(self):
+        self.storage.save()
+        self.reset()
+        self.storage.reload()
+        found = list(self.storage.select(Place, [
+            ("price_by_night", ">", 60),
+            ("created_at", "<", datetime.now())]))
+        self.assertEqual([obj.id for obj in found], [self.places[2].id])
+        objects = self.storage._FileStorage__objects
+        self.assertIs(type(objects["Place." + self.places[1].id]), dict)
+
+
+class TestFileStorage_parallel_reload(IsolatedStorageTestCase):
+    """Defines unittests for reloading with several worker processes."""
+
+    file_path = "test_parallel_reload.json"
+
+    def setUp(self):
+        super().setUp()
+        self.storage = self.open(workers=3)
+        for i in range(20):
+            place = Place()
+            place.name = "line\n{},".format(i)
+            place.amenity_ids = ["a{}".format(i)]
+        User()
+        self.storage.save()
+        self.written = {key: obj.to_dict()
+                        for key, obj in self.storage.all().items()}
+
+    # Tests that every object is rebuilt, in the order of the file
+    def test_reload_parallel(self):
+        self.reset()
+        self.storage.reload()
+        reloaded = {key: obj.to_dict()
+                    for key, obj in self.storage.all().items()}
+        self.assertEqual(list(reloaded), list(self.written))
+        self.assertEqual(reloaded, self.written)
+        self.assertEqual(len(self.storage.find(Place, city_id="")), 20)
+
+    # Tests that workers return dictionaries in lazy mode
+    def test_reload_parallel_lazy(self):
+        storage = self.open(workers=2, lazy=True)
+        storage.reload()
+        objects = storage._FileStorage__objects
+        self.assertTrue(all(type(value) is dict
+                            for value in objects.values()))
+        self.assertEqual(len(objects), len(self.written))
+
+    # Tests that a file not written one entry per line is streamed
+    def test_reload_single_line_file(self):
+        with open(self.file_path, "w") as f:
+            json.dump(self.written, f)
+        self.reset()
+        self.storage.reload()
+        self.assertEqual(self.storage.count(), len(self.written))
+
+    # Tests that an indented file is streamed
+    def test_reload_indented_file(self):
+        for indent in (0, 4):
+            with open(self.file_path, "w") as f:
+                json.dump(self.written, f, indent=indent)
+            self.reset()
+            self.storage.reload()
+            self.assertEqual({key: obj.to_dict()
+                              for key, obj in self.storage.all().items()},
+                             self.written)
+
+    # Tests that an entry stored under another key is rejected
+    def test_reload_invalid_entry(self):
+        with open(self.file_path, "r") as f:
+            text = f.read()
+        with open(self.file_path, "w") as f:
+            f.write(text.replace('"User.', '"Place.', 1))
+        self.reset()
+        with self.assertRaises(ValueError):
+            self.storage.reload()
+
+
+class TestFileStorage_compact(IsolatedStorageTestCase):
+    """Defines unittests for reloading into compact classes."""
+
+    file_path = "test_compact.json"
+
+    # Tests that reload builds slots-backed instances with the same data
+    def test_reload_compact(self):
+        place = Place()
+        place.name = "Nest"
+        place.wifi = True
+        self.storage.save()
+        storage = self.open(compact=True)
+        storage.reload()
+        loaded = storage.get(Place, place.id)
+        self.assertIsInstance(loaded, Place)
+        self.assertIsNot(type(loaded), Place)
+        self.assertEqual(loaded.to_dict(), place.to_dict())
+        loaded.name = "Den"
+        storage.save()
+        with open(self.file_path, "r") as f:
+            self.assertEqual(json.load(f)["Place." + place.id]["name"],
+                             "Den")
+
+
+class TestFileStorage_atomic_save(IsolatedStorageTestCase):
+    """Defines unittests for crash-safe saves and the fsync policy."""
+
+    file_path = "test_atomic.json"
+
+    def setUp(self):
+        super().setUp()
+        self.user = User()
+        self.storage.save()
+        with open(self.file_path, "r") as f:
+            self.before = f.read()
+        User()
+
+    def leftovers(self):
+        return [name for name in os.listdir(".")
+                if name.startswith(self.file_path + ".")]
+
+    # Tests that a failure while writing leaves the previous file intact
+    def test_failed_write_keeps_file(self):
+        dumps = json.dumps
+
+        def crash(obj, *args, **kwargs):
+            if type(obj) is dict:
+                raise OSError("disk full")
+            return dumps(obj, *args, **kwargs)
+
+        with patch("models.engine.file_storage.json.dumps",
+                   side_effect=crash):
+            with self.assertRaises(OSError):
+                self.storage.save()
+        with open(self.file_path, "r") as f:
+            self.assertEqual(f.read(), self.before)
+        self.assertEqual(self.leftovers(), [])
+
+    # Tests that a crash before the rename leaves the previous file intact
+    def test_failed_replace_keeps_file(self):
+        with patch("models.engine.file_storage.os.replace",
+                   side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.storage.save()
+        with open(self.file_path, "r") as f:
+            self.assertEqual(f.read(), self.before)
+        self.assertEqual(self.leftovers(), [])
+
+    # Tests that the default policy syncs before save returns
+    def test_fsync_always(self):
+        with patch("models.engine.file_storage.os.fsync") as fsync:
+            self.storage.save()
+        self.assertTrue(fsync.called)
+
+    # Tests that the never policy does not sync
+    def test_fsync_never(self):
+        with patch("models.engine.file_storage.os.fsync") as fsync:
+            self.open(fsync="never").save()
+            storage = self.open(fsync="never", journal=True)
+            User()
+            storage.save()
+        self.assertFalse(fsync.called)
+
+    # Tests that the interval policy syncs in the background
+    def test_fsync_interval(self):
+        storage = self.open(fsync=10)
+        with patch("models.engine.file_storage.os.fsync") as fsync:
+            storage.save()
+            self.assertFalse(fsync.called)
+            for _ in range(100):
+                if fsync.called:
+                    break
+                sleep(0.01)
+        self.assertTrue(fsync.called)
+
+    # Tests that close stops the interval policy's thread after a sync
+    def test_fsync_close(self):
+        storage = self.open(fsync=60000)
+        storage.save()
+        syncer = storage._FileStorage__syncer
+        self.assertTrue(syncer.is_alive())
+        with patch("models.engine.file_storage.os.fsync") as fsync:
+            storage.close()
+        self.assertTrue(fsync.called)
+        self.assertFalse(syncer.is_alive())
+        storage.save()
+        self.assertTrue(storage._FileStorage__syncer.is_alive())
+        storage.close()
+
+    # Tests that new files get the permissions of the umask and replaced
+    # files keep theirs
+    def test_file_mode(self):
+        os.remove(self.file_path)
+        umask = os.umask(0o027)
+        try:
+            self.storage.save()
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(self.file_path).st_mode & 0o777, 0o640)
+        os.chmod(self.file_path, 0o600)
+        self.storage.save()
+        self.assertEqual(os.stat(self.file_path).st_mode & 0o777, 0o600)
+
+    # Tests that an unknown policy is refused
+    def test_fsync_invalid(self):
+        with self.assertRaises(ValueError):
+            FileStorage(fsync="sometimes")
+
+
+class TestFileStorage_transaction(IsolatedStorageTestCase):
+    """Defines unittests for begin, commit, rollback and transaction."""
+
+    file_path = "test_transaction.json"
+
+    def setUp(self):
+        super().setUp()
+        self.place = Place()
+        self.place.city_id = "c1"
+        self.place.amenity_ids = ["a1"]
+        self.storage.save()
+
+    def read(self):
+        with open(self.file_path, "r") as f:
+            return json.load(f)
+
+    # Tests that save is deferred until commit
+    def test_commit_saves(self):
+        self.storage.begin()
+        user = User()
+        self.storage.save()
+        self.assertNotIn("User." + user.id, self.read())
+        self.storage.commit()
+        self.assertIn("User." + user.id, self.read())
+
+    # Tests that rollback restores created, changed and deleted objects
+    def test_rollback_restores_state(self):
+        review = Review()
+        self.storage.save()
+        self.storage.begin()
+        user = User()
+        self.place.city_id = "c2"
+        self.place.name = "Nest"
+        self.place.amenity_ids.append("a2")
+        self.storage.delete(review)
+        self.storage.rollback()
+        objects = self.storage.all()
+        self.assertNotIn("User." + user.id, objects)
+        self.assertIs(objects["Review." + review.id], review)
+        self.assertEqual(self.place.city_id, "c1")
+        self.assertEqual(self.place.amenity_ids, ["a1"])
+        self.assertNotIn("name", self.place.to_dict())
+        self.assertEqual(list(self.storage.find(Place, city_id="c1")),
+                         ["Place." + self.place.id])
+        self.assertEqual(self.storage.find(Place, city_id="c2"), {})
+        self.storage.save()
+        self.assertEqual(self.read()["Place." + self.place.id],
+                         self.place.to_dict())
+
+    # Tests that changes made before begin survive a rollback
+    def test_rollback_keeps_earlier_changes(self):
+        self.place.name = "Nest"
+        self.storage.begin()
+        self.place.name = "Den"
+        self.storage.rollback()
+        self.assertEqual(self.place.name, "Nest")
+        self.storage.save()
+        self.assertEqual(self.read()["Place." + self.place.id]["name"],
+                         "Nest")
+
+    # Tests that the context manager commits or rolls back
+    def test_transaction_context(self):
+        with self.storage.transaction():
+            user = User()
+        self.assertIn("User." + user.id, self.read())
+        with self.assertRaises(KeyError):
+            with self.storage.transaction():
+                other = User()
+                raise KeyError
+        self.assertNotIn("User." + other.id, self.storage.all())
+
+    # Tests that compact and convert are refused in a transaction
+    def test_compact_in_transaction(self):
+        storage = self.open(journal=True)
+        storage.reload()
+        storage.begin()
+        storage.get(Place, self.place.id).city_id = "tx"
+        with self.assertRaises(ValueError):
+            storage.compact()
+        with self.assertRaises(ValueError):
+            storage.convert("binary")
+        storage.rollback()
+        self.assertEqual(self.read()["Place." + self.place.id]["city_id"],
+                         "c1")
+        storage.convert("binary")
+
+    # Tests that transactions do not nest
+    def test_begin_twice(self):
+        self.storage.begin()
+        with self.assertRaises(ValueError):
+            self.storage.begin()
+        self.storage.rollback()
+        with self.assertRaises(ValueError):
+            self.storage.commit()
+
+
 if __name__ == '__main__':
     unittest.main()
+
+
+class TestFileStorage_bulk_load(IsolatedStorageTestCase):
+    """Defines unittests for bulk_load and from_records."""
+
+    file_path = "test_bulk_load.json"
+
+    def setUp(self):
+        super().setUp()
+
+    # Tests that records are built, stored and saved
+    def test_bulk_load_saves(self):
+        records = [{"id": str(i), "name": "p{}".format(i),
+                    "price_by_night": str(i)} for i in range(5)]
+        self.assertEqual(self.storage.bulk_load("Place", records, 2), 5)
+        place = self.storage.get(Place, "3")
+        self.assertIs(type(place), Place)
+        self.assertEqual(place.price_by_night, 3)
+        with open(self.file_path, "r") as f:
+            self.assertEqual(len(json.load(f)), 5)
+
+    # Tests that missing ids and timestamps are filled in
+    def test_from_records_defaults(self):
+        obj, = from_records(User, [{"email": "a@b.c", "__class__": "User"}])
+        self.assertIsInstance(obj.id, str)
+        self.assertIsInstance(obj.created_at, datetime)
+        self.assertEqual(obj.created_at, obj.updated_at)
+        self.assertNotIn("__class__", obj.__dict__)
+        self.assertEqual(self.storage.count(), 0)
+
+    # Tests that string values are converted to the class default type
+    def test_from_records_converts_strings(self):
+        obj, = from_records(Place, [{
+            "created_at": "2023-01-01T00:00:00.000001", "latitude": "1.5",
+            "number_rooms": "2", "amenity_ids": '["a1"]', "name": ""}])
+        self.assertEqual(obj.created_at, datetime(2023, 1, 1, 0, 0, 0, 1))
+        self.assertEqual(obj.latitude, 1.5)
+        self.assertEqual(obj.number_rooms, 2)
+        self.assertEqual(obj.amenity_ids, ["a1"])
+        self.assertNotIn("name", obj.__dict__)
+
+    # Tests that a record that is not a dictionary raises ValueError
+    def test_from_records_not_dict(self):
+        with self.assertRaises(ValueError):
+            list(from_records(Place, [[1, 2]]))
+
+
+class TestFileStorage_shards(IsolatedStorageTestCase):
+    """Defines unittests for the sharded file layout."""
+
+    file_path = "test_shards.json"
+
+    def setUp(self):
+        super().setUp()
+        self.storage = self.open(shards=1)
+        self.user = User()
+        self.review = Review()
+        self.storage.save()
+
+    def tearDown(self):
+        for path in glob.glob("test_shards.*"):
+            os.remove(path)
+        super().tearDown()
+
+    def read(self, path):
+        """Returns the objects stored in the file at path."""
+        with open(path, "r") as f:
+            return json.load(f)
+
+    # Tests that each class is saved to its own file
+    def test_save_per_class(self):
+        self.assertFalse(os.path.exists(self.file_path))
+        self.assertEqual(list(self.read("test_shards.User.json")),
+                         ["User." + self.user.id])
+        self.assertEqual(list(self.read("test_shards.Review.json")),
+                         ["Review." + self.review.id])
+
+    # Tests that save rewrites only the files of changed objects
+    def test_save_rewrites_dirty_shards(self):
+        os.remove("test_shards.User.json")
+        self.review.text = "Great"
+        self.storage.new(self.review)
+        self.storage.save()
+        self.assertFalse(os.path.exists("test_shards.User.json"))
+        review = self.read("test_shards.Review.json")
+        self.assertEqual(review["Review." + self.review.id]["text"], "Great")
+
+    # Tests that ids are spread over the partitions of their class
+    def test_hash_partitions(self):
+        storage = self.open(shards=4)
+        places = [Place() for i in range(40)]
+        storage.save()
+        stored = {}
+        for path in glob.glob("test_shards.Place.*.json"):
+            stored.update(self.read(path))
+        self.assertEqual(len(glob.glob("test_shards.Place.*.json")), 4)
+        self.assertEqual(set(stored),
+                         {"Place." + place.id for place in places})
+        self.reset()
+        self.storage.reload()
+        self.assertEqual(self.storage.count(Place), 40)
+
+    # Tests that reloading some classes leaves the others as they are
+    def test_reload_classes(self):
+        state = State()
+        self.review.text = "Great"
+        self.storage.reload(classes=["Review"])
+        self.assertNotIn("text", self.storage.get(Review,
+                                                  self.review.id).__dict__)
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.reset()
+        self.storage.reload(classes=[User])
+        self.assertEqual(list(self.storage.all()), ["User." + self.user.id])
+
+    # Tests that a class is read before its file is rewritten
+    def test_save_loads_missing_class(self):
+        self.reset()
+        self.storage.reload(classes=["User"])
+        review = Review()
+        self.storage.save()
+        self.assertEqual(set(self.read("test_shards.Review.json")),
+                         {"Review." + self.review.id, "Review." + review.id})
+
+    # Tests that reloading some classes needs a sharded layout
+    def test_reload_classes_unsharded(self):
+        with self.assertRaises(ValueError):
+            FileStorage().reload(classes=["User"])
+
+    # Tests that each shard has its own journal
+    def test_journal(self):
+        storage = self.open(journal=True, shards=1)
+        storage.reload()
+        city = City()
+        storage.save()
+        self.assertEqual(glob.glob("test_shards.*.journal"),
+                         ["test_shards.City.json.journal"])
+        storage.delete(storage.get(User, self.user.id))
+        storage.save()
+        self.reset()
+        self.storage.reload()
+        self.assertEqual(list(self.storage.all()),
+                         ["Review." + self.review.id, "City." + city.id])
+        self.storage.compact()
+        self.assertEqual(glob.glob("test_shards.*.journal"), [])
+        self.assertEqual(self.read("test_shards.User.json"), {})
+
+
+class TestFileStorage_binary_format(IsolatedStorageTestCase):
+    """Defines unittests for saving in the binary format."""
+
+    file_path = "test_binary.json"
+
+    def setUp(self):
+        super().setUp()
+        self.storage = self.open(format="binary")
+        self.place = Place()
+        self.place.name = "Nest"
+        self.place.amenity_ids = ["a1", "a2"]
+        self.place.rating = 4.5
+        User()
+        self.storage.save()
+        self.written = {key: obj.to_dict()
+                        for key, obj in self.storage.all().items()}
+
+    # Tests that the file is binary and every object is read back
+    def test_reload(self):
+        with open(self.file_path, "rb") as f:
+            self.assertTrue(f.read().startswith(b"HBNB"))
+        storage = self.open()
+        storage.reload()
+        reloaded = {key: obj.to_dict()
+                    for key, obj in storage.all().items()}
+        self.assertEqual(reloaded, self.written)
+        self.assertNotIn("number_rooms", storage.get(
+            Place, self.place.id).__dict__)
+
+    # Tests that lazy mode keeps the to_dict() dictionaries
+    def test_reload_lazy(self):
+        storage = self.open(lazy=True)
+        storage.reload()
+        self.assertEqual(dict(storage._FileStorage__objects), self.written)
+
+    # Tests that the journal is replayed over a binary file
+    def test_reload_journal(self):
+        storage = self.open(format="binary", journal=True)
+        storage.reload()
+        storage.get(Place, self.place.id).name = "Den"
+        storage.save()
+        self.reset()
+        self.storage.reload()
+        self.assertEqual(self.storage.get(Place, self.place.id).name, "Den")
+
+    # Tests that convert rewrites the file as JSON
+    def test_convert(self):
+        self.storage.convert("json")
+        with open(self.file_path, "r") as f:
+            self.assertEqual(json.load(f), self.written)
+        with self.assertRaises(ValueError):
+            self.storage.convert("xml")
+
+    # Tests that an unknown format is rejected
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            FileStorage(format="xml")
+
+
+class TestFileStorage_scan(IsolatedStorageTestCase):
+    """Defines unittests for scanning columns of a class."""
+
+    file_path = "test_scan.json"
+
+    def setUp(self):
+        super().setUp()
+        self.storage = self.open(format="columnar")
+        self.places = [Place() for i in range(3)]
+        for i, place in enumerate(self.places):
+            place.price_by_night = 10 * i
+        User()
+        self.storage.save()
+
+    # Tests that a clean class is scanned from the memory-mapped file
+    def test_scan_snapshot(self):
+        columns = self.storage.scan(Place, ["price_by_night", "name"])
+        self.assertIsInstance(columns["price_by_night"], memoryview)
+        self.assertEqual(list(columns["price_by_night"]), [0, 10, 20])
+        self.assertEqual(columns["name"], ["", "", ""])
+        storage = self.open(lazy=True)
+        storage.reload()
+        self.assertEqual(list(storage.scan("Place", ["price_by_night"])
+                              ["price_by_night"]), [0, 10, 20])
+        self.assertIs(type(storage._FileStorage__objects[
+            "Place." + self.places[0].id]), dict)
+
+    # Tests that changed classes are scanned from memory
+    def test_scan_changed(self):
+        self.places[1].price_by_night = 99
+        self.assertEqual(self.storage.scan(Place, ["price_by_night"]),
+                         {"price_by_night": [0, 99, 20]})
+        self.storage.save()
+        self.assertEqual(list(self.storage.scan(
+            Place, ["price_by_night"])["price_by_night"]), [0, 99, 20])
+
+    # Tests scanning the objects of a JSON file
+    def test_scan_json(self):
+        self.storage.convert("json")
+        storage = self.open(lazy=True)
+        storage.reload()
+        columns = storage.scan(Place, ["price_by_night", "created_at"])
+        self.assertEqual(columns["price_by_night"], [0, 10, 20])
+        self.assertEqual(columns["created_at"],
+                         [place.created_at for place in self.places])
+        self.assertEqual(storage.scan(State, ["name"]), {"name": []})
+
+    # Tests that columnar files are read back
+    def test_reload(self):
+        written = {key: obj.to_dict()
+                   for key, obj in self.storage.all().items()}
+        self.reset()
+        self.storage.reload()
+        self.assertEqual({key: obj.to_dict()
+                          for key, obj in self.storage.all().items()},
+                         written)
+
+
+class TestFileStorage_mapped(IsolatedStorageTestCase):
+    """Defines unittests for the memory-mapped snapshot mode."""
+
+    file_path = "test_mapped.json"
+
+    def setUp(self):
+        super().setUp()
+        self.storage = self.open(mapped=True)
+        self.places = [Place() for i in range(4)]
+        self.user = User()
+        self.user.first_name = "Zoë"
+        self.storage.save()
+        self.reset()
+        self.storage.reload()
+
+    def tearDown(self):
+        if os.path.exists(self.file_path + ".index"):
+            os.remove(self.file_path + ".index")
+        super().tearDown()
+
+    # Tests that count and get read the index, decoding only one object
+    def test_get_and_count(self):
+        self.assertEqual(self.storage.count(), 5)
+        self.assertEqual(self.storage.count(Place), 4)
+        self.assertEqual(self.storage._FileStorage__objects, {})
+        user = self.storage.get(User, self.user.id)
+        self.assertEqual(user.first_name, "Zoë")
+        self.assertIs(self.storage.get("User", self.user.id), user)
+        self.assertIsNone(self.storage.get(User, "nope"))
+        self.assertEqual(list(self.storage._FileStorage__objects),
+                         ["User." + self.user.id])
+
+    # Tests that new and deleted objects are counted
+    def test_count_changes(self):
+        self.storage.delete(self.storage.get(Place, self.places[0].id))
+        Place()
+        State()
+        self.assertEqual(self.storage.count(Place), 4)
+        self.assertEqual(self.storage.count(), 6)
+        self.assertIsNone(self.storage.get(Place, self.places[0].id))
+
+    # Tests that the other objects are read in file order when needed
+    def test_all_reads_file(self):
+        user = self.storage.get(User, self.user.id)
+        keys = list(self.storage.all())
+        self.assertEqual(keys, ["Place." + place.id for place in self.places] +
+                         ["User." + self.user.id])
+        self.assertIs(self.storage.get(User, self.user.id), user)
+        self.assertEqual(len(self.storage.find(Place, city_id="")), 4)
+
+    # Tests that a saved change rewrites the file and its index
+    def test_save(self):
+        place = self.storage.get(Place, self.places[1].id)
+        place.name = "Nest"
+        self.storage.save()
+        self.reset()
+        self.storage.reload()
+        self.assertIsNotNone(self.storage._FileStorage__view)
+        self.assertEqual(self.storage.get(Place, place.id).name, "Nest")
+        self.assertEqual(self.storage.count(), 5)
+
+    # Tests that objects deleted in journal mode stay deleted once saved
+    def test_journal_delete(self):
+        storage = self.open(mapped=True, journal=True)
+        storage.reload()
+        self.assertIsNotNone(storage._FileStorage__view)
+        place = storage.get(Place, self.places[0].id)
+        storage.delete(place)
+        storage.save()
+        self.assertEqual(storage.count(Place), 3)
+        self.assertEqual(storage.count(), 4)
+        self.assertIsNone(storage.get(Place, place.id))
+        storage.new(place)
+        storage.save()
+        self.assertEqual(storage.count(Place), 4)
+        self.assertIs(storage.get(Place, place.id), place)
+        storage.delete(place)
+        storage.save()
+        self.reset()
+        self.storage.reload()
+        self.assertEqual(self.storage.count(Place), 3)
+        self.assertIsNone(self.storage.get(Place, place.id))
+
+    # Tests that an index not matching the file is not used
+    def test_stale_index(self):
+        storage = FileStorage(path=self.file_path)
+        storage.reload()
+        storage.save()
+        self.storage.reload()
+        self.assertIsNone(self.storage._FileStorage__view)
+        self.assertEqual(self.storage.count(), 5)
+
+    # Tests that mapped mode needs a single JSON file
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            FileStorage(mapped=True, shards=2)
+        with self.assertRaises(ValueError):
+            FileStorage(mapped=True, format="binary")
+
+
+class TestFileStorage_deferred(IsolatedStorageTestCase):
+    """Defines unittests for the reload deferred to first use."""
+
+    file_path = "test_deferred.json"
+
+    def setUp(self):
+        super().setUp()
+        self.place = Place()
+        self.storage.save()
+        self.reset()
+
+    def tearDown(self):
+        if os.path.exists("test_deferred_other.json"):
+            os.remove("test_deferred_other.json")
+        super().tearDown()
+
+    # Tests that defer forgets the objects until they are used
+    def test_all_loads(self):
+        self.storage.defer()
+        self.assertEqual(self.storage._FileStorage__objects, {})
+        self.assertTrue(self.storage._FileStorage__deferred)
+        self.assertIn("Place." + self.place.id, self.storage.all())
+        self.assertFalse(self.storage._FileStorage__deferred)
+
+    # Tests that new and save load the stored objects first
+    def test_new_and_save_load(self):
+        self.storage.defer()
+        user = User()
+        self.assertEqual(self.storage.count(), 2)
+        self.storage.save()
+        self.reset()
+        self.storage.reload()
+        self.assertEqual(set(self.storage.all()),
+                         {"Place." + self.place.id, "User." + user.id})
+
+    # Tests that defer sets the path of the JSON file
+    def test_path(self):
+        self.storage.defer("test_deferred_other.json")
+        self.assertEqual(self.storage.count(), 0)
+        State()
+        self.storage.save()
+        self.assertTrue(os.path.exists("test_deferred_other.json"))
+        self.storage.defer(self.file_path)
+        self.assertEqual(list(self.storage.all()), ["Place." + self.place.id])
+
+    # Tests that models.init loads the objects now only if eager
+    def test_models_init(self):
+        models.init(self.file_path)
+        self.assertEqual(self.storage._FileStorage__objects, {})
+        self.assertEqual(models.storage.count(Place), 1)
+        models.init(eager=True)
+        self.assertFalse(self.storage._FileStorage__deferred)
+        self.assertEqual(len(self.storage._FileStorage__objects), 1)
+
+    # Tests that importing models does not read the JSON file, whose
+    # path is taken from HBNB_FILE_PATH
+    def test_import(self):
+        with open(self.file_path, "w") as f:
+            f.write("not json")
+        code = ("import models; "
+                "print(models.storage._FileStorage__deferred, "
+                "models.storage._FileStorage__file_path)")
+        env = dict(os.environ, PYTHONPATH=os.getcwd(),
+                   HBNB_FILE_PATH="store.json")
+        env.pop("HBNB_TYPE_STORAGE", None)
+        with tempfile.TemporaryDirectory() as tmp:
+            os.replace(self.file_path, os.path.join(tmp, "store.json"))
+            out = subprocess.run([sys.executable, "-c", code], cwd=tmp,
+                                 env=env, check=True, capture_output=True,
+                                 text=True)
+        self.assertEqual(out.stdout, "True store.json\n")
+
+
+class TestFileStorage_stores(IsolatedStorageTestCase):
+    """Defines unittests for independent stores in one process."""
+
+    file_path = "test_stores.json"
+    other_path = "test_stores_other.json"
+
+    def setUp(self):
+        super().setUp()
+        self.other = FileStorage(path=self.other_path)
+
+    def tearDown(self):
+        if os.path.exists(self.other_path):
+            os.remove(self.other_path)
+        super().tearDown()
+
+    # Tests that each store has its own objects, indexes and file
+    def test_isolated(self):
+        place = Place()
+        place.city_id = "c1"
+        with models.using(self.other):
+            other = Place()
+            other.city_id = "c1"
+        self.storage.save()
+        self.other.save()
+        self.assertEqual(list(self.storage.find(Place, city_id="c1")),
+                         ["Place." + place.id])
+        self.assertEqual(list(self.other.find(Place, city_id="c1")),
+                         ["Place." + other.id])
+        reloaded = FileStorage(path=self.other_path)
+        reloaded.reload()
+        self.assertEqual(list(reloaded.all()), ["Place." + other.id])
+
+    # Tests that models changed and saved in using() go to its store
+    def test_using(self):
+        with models.using(self.other):
+            self.assertIs(models.current_storage(), self.other)
+            user = User()
+            self.other.save()
+            user.first_name = "Betty"
+            user.save()
+        self.assertIs(models.current_storage(), self.storage)
+        with open(self.other_path, "r") as f:
+            self.assertEqual(json.load(f)["User." + user.id]["first_name"],
+                             "Betty")
+        self.assertEqual(self.storage.count(), 0)
+
+    # Tests that objects of a store changed outside using() are saved
+    # by that store only
+    def test_owner(self):
+        with models.using(self.other):
+            user = User()
+        self.other.save()
+        user.first_name = "Betty"
+        user.save()
+        self.assertFalse(os.path.exists(self.file_path))
+        self.assertNotIn("_store", user.to_dict())
+        self.assertNotIn("_store", str(user))
+        for options in ({}, {"lazy": True}, {"compact": True}):
+            reloaded = FileStorage(path=self.other_path, **options)
+            reloaded.reload()
+            loaded = reloaded.get(User, user.id)
+            self.assertEqual(loaded.first_name, "Betty")
+            loaded.last_name = str(options)
+            reloaded.save()
+            with open(self.other_path, "r") as f:
+                self.assertEqual(json.load(f)["User." + user.id]
+                                 ["last_name"], str(options))
+        self.assertEqual(self.storage.count(), 0)
+
+    # Tests that copies of stored objects are not held by the store
+    def test_copy_and_pickle(self):
+        user = User()
+        user.first_name = "Betty"
+        self.storage.save()
+        compact_user = self.open(compact=True)
+        compact_user.reload()
+        for obj in (user, compact_user.get(User, user.id)):
+            for copied in (copy.deepcopy(obj),
+                           pickle.loads(pickle.dumps(obj))):
+                self.assertIs(type(copied), type(obj))
+                self.assertEqual(copied.to_dict(), obj.to_dict())
+                with self.assertRaises(AttributeError):
+                    copied._store
+                copied.first_name = "Holly"
+                self.assertEqual(obj.first_name, "Betty")
+
+    # Tests that threads using different stores do not share objects
+    def test_threads(self):
+        stores = [FileStorage(path=self.other_path) for i in range(4)]
+        barrier = threading.Barrier(len(stores))
+
+        def work(store):
+            with models.using(store):
+                barrier.wait()
+                for i in range(50):
+                    User().email = "a@b.c"
+
+        threads = [threading.Thread(target=work, args=(store,))
+                   for store in stores]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for store in stores:
+            self.assertEqual(len(store.find(User, email="a@b.c")), 50)
+        self.assertEqual(self.storage.count(), 0)
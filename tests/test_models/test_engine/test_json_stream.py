@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+"""Unittests for models/engine/json_stream.py."""
+import io
+import json
+import unittest
+from models.engine.json_stream import iter_items
+
+
+class TestJsonStream_iter_items(unittest.TestCase):
+    """Defines unittests for the incremental JSON reader."""
+
+    def setUp(self):
+        self.data = {
+            "User.1": {"id": "1", "first_name": "a}b, \"c\": {"},
+            "City.2": {"id": "2", "ids": [1, 2, {"x": None}]},
+            "Place.3": {"id": "3", "price_by_night": 10.5}
+        }
+
+    # Tests that entries of a single-line dump are read back
+    def test_single_line_dump(self):
+        f = io.StringIO(json.dumps(self.data))
+        self.assertEqual(dict(iter_items(f, chunk_size=4)), self.data)
+
+    # Tests that entries of an indented dump are read back in order
+    def test_indented_dump(self):
+        f = io.StringIO(json.dumps(self.data, indent=4))
+        self.assertEqual(list(iter_items(f, chunk_size=7)),
+                         list(self.data.items()))
+
+    # Tests that an empty object yields nothing
+    def test_empty_object(self):
+        self.assertEqual(list(iter_items(io.StringIO(" { } "))), [])
+
+    # Tests that an empty file raises like json.load
+    def test_empty_file(self):
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_items(io.StringIO("")))
+
+    # Tests that a truncated file raises like json.load
+    def test_truncated_file(self):
+        text = json.dumps(self.data)[:-10]
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_items(io.StringIO(text), chunk_size=8))
+
+    # Tests that entries are produced before the file is fully read
+    def test_reads_incrementally(self):
+        f = io.StringIO(json.dumps(self.data))
+        items = iter_items(f, chunk_size=16)
+        next(items)
+        self.assertLess(f.tell(), len(f.getvalue()))
+
+
+if __name__ == '__main__':
+    unittest.main()
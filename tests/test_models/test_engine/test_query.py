@@ -0,0 +1,124 @@
+#!/usr/bin/python3
+"""Unittests for models/engine/query.py."""
+import unittest
+from datetime import datetime
+from models.engine.query import Query, matches
+
+
+class Item:
+    """An object with the given attributes."""
+
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class ListStorage:
+    """A storage engine holding a list of objects."""
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def select(self, cls, conditions=()):
+        return (obj for obj in self.objects
+                if matches(lambda attr: getattr(obj, attr, None),
+                           conditions))
+
+    def scan(self, cls, attrs):
+        self.scanned = attrs
+        return {attr: [getattr(obj, attr, None) for obj in self.objects]
+                for attr in attrs}
+
+
+class TestQuery_parse(unittest.TestCase):
+    """Defines unittests for parsing queries."""
+
+    # Tests that bare conditions are parsed, with or without commas
+    def test_parse_conditions(self):
+        for text in ('city_id="c1", price_by_night<100',
+                     "city_id='c1' price_by_night < 100",
+                     '(city_id=="c1", price_by_night<100)'):
+            query = Query.parse("Place", text)
+            self.assertEqual(query.conditions, [
+                ("city_id", "=", "c1"), ("price_by_night", "<", 100)])
+
+    # Tests that a chain sets the order, page and aggregate
+    def test_parse_chain(self):
+        query = Query.parse("Place", '(number_rooms>=2).order_by('
+                            '"-price_by_night", "name").offset(5)'
+                            '.limit(10).avg("latitude")')
+        self.assertEqual(query.conditions, [("number_rooms", ">=", 2)])
+        self.assertEqual(query.order, [("price_by_night", True),
+                                       ("name", False)])
+        self.assertEqual((query.offset, query.limit), (5, 10))
+        self.assertEqual(query.aggregate, ("avg", "latitude"))
+
+    # Tests that timestamps are compared as datetimes
+    def test_parse_timestamp(self):
+        query = Query.parse("User", 'created_at>"2023-01-01T00:00:00"')
+        self.assertEqual(query.conditions, [
+            ("created_at", ">", datetime(2023, 1, 1))])
+
+    # Tests that malformed queries raise ValueError
+    def test_parse_invalid(self):
+        for text in ('(name="x"', 'name=x', '(a=1).drop()', '(a=1).limit(-1)',
+                     '(a=1).order_by(2)', '(a=1).sum()', 'a=1 $',
+                     '(a=1) limit(2)'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    Query.parse("Place", text)
+
+
+class TestQuery_run(unittest.TestCase):
+    """Defines unittests for running queries."""
+
+    def setUp(self):
+        self.items = [Item(name="a", price=30), Item(name="b", price=10),
+                      Item(name="c", price=20), Item(name="d")]
+        self.storage = ListStorage(self.items)
+
+    def names(self, text):
+        return [obj.name for obj in Query.parse("Item", text)
+                .run(self.storage)]
+
+    # Tests that conditions filter the objects
+    def test_run_filters(self):
+        self.assertEqual(self.names('price>=20'), ["a", "c"])
+        self.assertEqual(self.names('price!=10, name<"c"'), ["a"])
+
+    # Tests ordering, with missing values ranked above the others
+    def test_run_order(self):
+        self.assertEqual(self.names('().order_by("price")'),
+                         ["b", "c", "a", "d"])
+        self.assertEqual(self.names('().order_by("-price").limit(2)'),
+                         ["d", "a"])
+        self.assertEqual(self.names('().order_by("price").offset(1)'
+                                    '.limit(2)'), ["c", "a"])
+
+    # Tests that limit without an order stops reading early
+    def test_run_limit_streams(self):
+        self.items.append(None)
+        self.assertEqual(self.names('().limit(2)'), ["a", "b"])
+
+    # Tests the aggregates
+    def test_run_aggregates(self):
+        def run(text):
+            return Query.parse("Item", text).run(self.storage)
+        self.assertEqual(run('().count()'), 4)
+        self.assertEqual(run('().sum("price")'), 60)
+        self.assertEqual(run('().avg("price")'), 20)
+        self.assertEqual(run('(price<30).min("price")'), 10)
+        self.assertEqual(run('().max("price")'), 30)
+        self.assertIsNone(run('(price>99).avg("price")'))
+
+    # Tests that an aggregate over every object scans a column
+    def test_run_aggregate_scans(self):
+        self.assertEqual(Query.parse("Item", '().sum("price")')
+                         .run(self.storage), 60)
+        self.assertEqual(self.storage.scanned, ["price"])
+        del self.storage.scanned
+        Query.parse("Item", '(name="a").sum("price")').run(self.storage)
+        self.assertFalse(hasattr(self.storage, "scanned"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+"""Unittests for models/engine/serializers.py."""
+import io
+import unittest
+from datetime import datetime
+from models.engine.serializers import SERIALIZERS, BinarySerializer, Columns
+
+
+class TestBinarySerializer(unittest.TestCase):
+    """Defines unittests for the binary snapshot format."""
+
+    def setUp(self):
+        self.serializer = SERIALIZERS["binary"]
+
+    def round_trip(self, entries):
+        """Returns the entries read back from their dump."""
+        f = io.BytesIO()
+        self.serializer.dump(f, entries)
+        f.seek(0)
+        return list(self.serializer.load(f))
+
+    # Tests that values of every JSON type are read back
+    def test_values(self):
+        value = {"id": "1", "created_at": "2023-01-01T00:00:00.000001",
+                 "updated_at": "2023-01-01T00:00:00", "__class__": "Place",
+                 "name": "é" * 40, "number_rooms": -2 ** 40,
+                 "latitude": 0.5, "amenity_ids": ["a"] * 20,
+                 "extra": {"nested": [None, True, False, 300]}}
+        self.assertEqual(self.round_trip([("Place.1", value)]),
+                         [("Place.1", value)])
+
+    # Tests that timestamps are stored as integers
+    def test_datetimes(self):
+        value = {"id": "1", "created_at": "2023-01-01T00:00:00.000001",
+                 "updated_at": "not a date", "__class__": "User"}
+        f = io.BytesIO()
+        self.serializer.dump(f, [("User.1", value)])
+        self.assertNotIn(b"2023", f.getvalue())
+        f.seek(0)
+        self.assertEqual(list(self.serializer.load(f))[0][1], value)
+
+    # Tests that the fields of a class are stored once
+    def test_schema_once(self):
+        entries = [("City.{}".format(i), {
+            "id": str(i), "created_at": "2023-01-01T00:00:00",
+            "updated_at": "2023-01-01T00:00:00", "__class__": "City"})
+            for i in range(3)]
+        f = io.BytesIO()
+        self.serializer.dump(f, entries)
+        self.assertEqual(f.getvalue().count(b"state_id"), 1)
+        f.seek(0)
+        self.assertEqual(list(self.serializer.load(f)), entries)
+
+    # Tests that a file without the magic bytes is rejected
+    def test_invalid_file(self):
+        with self.assertRaises(ValueError):
+            list(self.serializer.load(io.BytesIO(b"{}")))
+        f = io.BytesIO()
+        self.serializer.dump(f, [("State.1", {
+            "id": "1", "created_at": datetime(2023, 1, 1),
+            "updated_at": datetime(2023, 1, 1), "name": "CA"})])
+        data = f.getvalue()[:-3]
+        with self.assertRaises(ValueError):
+            list(self.serializer.load(io.BytesIO(data)))
+
+    # Tests that values JSON cannot encode are rejected
+    def test_unsupported_value(self):
+        with self.assertRaises(TypeError):
+            BinarySerializer().dump(io.BytesIO(), [("State.1", {
+                "id": "1", "name": {1, 2}})])
+
+
+class TestColumnarSerializer(unittest.TestCase):
+    """Defines unittests for the columnar snapshot format."""
+
+    def setUp(self):
+        self.serializer = SERIALIZERS["columnar"]
+        stamp = "2023-01-01T00:00:00.000001"
+        self.entries = [
+            ("Place.1", {"id": "1", "created_at": stamp, "updated_at": stamp,
+                         "__class__": "Place", "name": "Nest",
+                         "number_rooms": 3, "latitude": 1.5,
+                         "amenity_ids": ["a"], "color": "red"}),
+            ("Place.2", {"id": "2", "created_at": stamp, "updated_at": "x",
+                         "__class__": "Place", "number_rooms": 4,
+                         "latitude": 2}),
+            ("User.3", {"id": "3", "created_at": stamp, "__class__": "User",
+                        "email": "a@b.c"})]
+        self.f = io.BytesIO()
+        self.serializer.dump(self.f, self.entries)
+
+    # Tests that every entry is read back as it was
+    def test_round_trip(self):
+        self.f.seek(0)
+        self.assertEqual(list(self.serializer.load(self.f)), self.entries)
+
+    # Tests that columns are typed and give the values getattr() would
+    def test_columns(self):
+        columns = Columns(self.f.getvalue())
+        rooms = columns.column("Place", "number_rooms")
+        self.assertIsInstance(rooms, memoryview)
+        self.assertEqual(list(rooms), [3, 4])
+        self.assertEqual(columns.column("Place", "name"), ["Nest", ""])
+        self.assertEqual(columns.column("Place", "latitude"), [1.5, 2])
+        self.assertEqual(columns.column("Place", "color"), ["red", None])
+        self.assertEqual(columns.column("User", "updated_at"), [None])
+        self.assertEqual(columns.column("User", "created_at"),
+                         [datetime(2023, 1, 1, 0, 0, 0, 1)])
+        self.assertEqual(columns.column("City", "name"), [])
+        self.assertEqual(columns.count("Place"), 2)
+
+    # Tests that repeated strings are stored once
+    def test_string_table(self):
+        f = io.BytesIO()
+        self.serializer.dump(f, [("City.{}".format(i), {
+            "id": str(i), "state_id": "state-of-the-union"})
+            for i in range(50)])
+        self.assertEqual(f.getvalue().count(b"state-of-the-union"), 1)
+
+    # Tests that a file without the magic bytes is rejected
+    def test_invalid_file(self):
+        with self.assertRaises(ValueError):
+            list(self.serializer.load(io.BytesIO(b"HBNB\x00\x01")))
+        with self.assertRaises(ValueError):
+            list(self.serializer.load(io.BytesIO(self.f.getvalue()[:40])))
+
+
+if __name__ == "__main__":
+    unittest.main()